@@ -7,6 +7,8 @@ import gc
 
 from src.multiego import ensemble
 from src.multiego import io
+from src.multiego import perf
+from src.multiego import checkpoint
 from tools.face_generator import generate_face
 from src.multiego.resources.type_definitions import parse_json
 from src.multiego.arguments import args_dict
@@ -80,8 +82,35 @@ for a contact pair.
         print("ERROR: --epsilon_min must be greater than 0.")
         sys.exit()
 
+    if args.prefetch_memory <= 0.0:
+        print("ERROR: --prefetch_memory must be greater than 0.")
+        sys.exit()
+
+    if args.no_cache:
+        args.cache_dir = None
+    elif not args.cache_dir:
+        args.cache_dir = f"{args.root_dir}/.mego_cache"
+
+    if (args.epsilon_sweep or args.p_to_learn_sweep or args.relative_c12d_sweep) and args.egos != "production":
+        print("ERROR: Sweeps over epsilon, p_to_learn and relative_c12d are only available with --egos production.")
+        sys.exit()
+
+    if args.stream_trainings and (args.epsilon_sweep or args.p_to_learn_sweep or args.relative_c12d_sweep):
+        print("ERROR: --stream_trainings learns the trainings with a single set of parameters and cannot be used with sweeps.")
+        sys.exit()
+
+    if any(p_to_learn < 0.9 for p_to_learn in args.p_to_learn_sweep):
+        print("WARNING: --p_to_learn_sweep values should be large enough (suggested value is 0.9995)")
+
+    if any(epsilon < args.epsilon_min for epsilon in args.epsilon_sweep):
+        print(f"ERROR: --epsilon_sweep values must be greater-equal than --epsilon_min ({args.epsilon_min})")
+        sys.exit()
+
     # controls that all reference entries contains correct arguments
     for ref in args.input_refs:
+        # when sweeping over epsilon the reference epsilon is not needed
+        if args.epsilon_sweep and ref.get("epsilon") is None:
+            ref["epsilon"] = args.epsilon_sweep[0]
 
         # Check for missing required keys (keys without a default)
         input_keys = set(ref)
@@ -116,8 +145,6 @@ for a contact pair.
             sys.exit()
 
     print(f"Running Multi-eGO: {args.egos}\n")
-    print("- Processing Multi-eGO topology")
-    mego_ensemble = ensemble.init_meGO_ensemble(args, custom_dict)
 
     if args.symmetry_file and args.symmetry:
         print("ERROR: Both symmetry file and symmetry list provided. Please provide only one.")
@@ -139,7 +166,164 @@ for a contact pair.
         parser.print_usage()
         sys.exit()
 
-    return args, mego_ensemble, custom_dict
+    if args.resume:
+        args.checkpoint = True
+    if args.checkpoint and args.egos != "production":
+        print("WARNING: --checkpoint and --resume are only used with --egos production.")
+
+    return args, custom_dict
+
+
+def init_ensemble(args, custom_dict):
+    """
+    Reads the topology of the system and generates its bonded interactions and 1-4 data.
+    """
+    print("- Processing Multi-eGO topology")
+    with perf.stage("topology") as record:
+        meGO_ensembles = ensemble.init_meGO_ensemble(args, custom_dict)
+        record["rows"] = len(meGO_ensembles["topology_dataframe"])
+    print("- Done in:", record["wall_time"], "seconds")
+
+    with perf.stage("bonded and 1-4") as record:
+        print("\t- Generating bonded interactions")
+        meGO_ensembles = ensemble.generate_bonded_interactions(meGO_ensembles)
+        print("\t- Generating 1-4 data")
+        pairs14, exclusion_bonds14 = ensemble.generate_14_data(meGO_ensembles)
+        record["rows"] = len(pairs14)
+    print("- Done in:", record["wall_time"], "seconds")
+
+    return meGO_ensembles, pairs14, exclusion_bonds14
+
+
+def write_meGO_model(meGO_ensembles, meGO_LJ, meGO_LJ_14, args, stat_str):
+    """
+    Finalizes the pairs and exclusions and writes the multi-eGO model.
+
+    Returns the folder the model was written to.
+    """
+    print("- Finalize pairs and exclusions")
+    with perf.stage("pairs and exclusions") as record:
+        meGO_LJ_14 = ensemble.make_pairs_exclusion_topology(meGO_ensembles, meGO_LJ_14, args)
+        record["rows"] = sum(len(pairs) for pairs in meGO_LJ_14.values())
+    print("- Done in:", record["wall_time"], "seconds")
+
+    print("- Writing Multi-eGO model")
+    with perf.stage("write") as record:
+        meGO_LJ = ensemble.sort_LJ(meGO_ensembles, meGO_LJ)
+        # the bonded interactions are copied because the pairs are overwritten while writing each model
+        model_ensemble = dict(meGO_ensembles)
+        model_ensemble["meGO_bonded_interactions"] = {
+            molecule: dict(interactions) for molecule, interactions in meGO_ensembles["meGO_bonded_interactions"].items()
+        }
+        output_dir = io.write_model(model_ensemble, meGO_LJ, meGO_LJ_14, args, stat_str)
+        record["rows"] = len(meGO_LJ)
+    print("- Done in:", record["wall_time"], "seconds")
+
+    return output_dir
+
+
+def run_production(args, custom_dict):
+    """
+    Learns the interactions from the training simulations and writes one model per sweep point.
+    With --stream_trainings each training is learned as soon as it is read, see ensemble.stream_LJ_datasets.
+    With --checkpoint the results of the ensemble, matrices and LJ dataset stages and of each model are saved,
+    with --resume the last stage saved by a previous run with the same inputs and parameters is loaded
+    and the models already written are skipped.
+    """
+    fingerprints = {}
+    fingerprint = checkpoint.get_inputs_fingerprint(args) if args.checkpoint else ""
+    for stage in ["ensemble", "matrices", "train_dataset"]:
+        fingerprint = checkpoint.get_fingerprint(fingerprint, stage, args)
+        fingerprints[stage] = fingerprint
+
+    meGO_ensembles, matrices, train_dataset = None, None, None
+    data = checkpoint.load_checkpoint(args, "train_dataset", fingerprints["train_dataset"])
+    if data is not None:
+        meGO_ensembles, train_dataset = data
+    else:
+        data = checkpoint.load_checkpoint(args, "matrices", fingerprints["matrices"])
+        if data is not None:
+            meGO_ensembles, pairs14, exclusion_bonds14, matrices = data
+        else:
+            data = checkpoint.load_checkpoint(args, "ensemble", fingerprints["ensemble"])
+            if data is not None:
+                meGO_ensembles, pairs14, exclusion_bonds14 = data
+
+    if meGO_ensembles is None:
+        meGO_ensembles, pairs14, exclusion_bonds14 = init_ensemble(args, custom_dict)
+        checkpoint.save_checkpoint(args, "ensemble", fingerprints["ensemble"], (meGO_ensembles, pairs14, exclusion_bonds14))
+
+    if args.stream_trainings and train_dataset is None:
+        # the train_dataset stage holds the best learned contacts, ready for merge_LJ
+        print("- Processing Multi-eGO contact matrices and learning them one at a time")
+        with perf.stage("matrices") as record:
+            meGO_ensembles, train_dataset = ensemble.stream_LJ_datasets(
+                meGO_ensembles, pairs14, exclusion_bonds14, args, custom_dict
+            )
+            record["rows"] = len(train_dataset)
+        print("- Done in:", record["wall_time"], "seconds")
+        checkpoint.save_checkpoint(args, "train_dataset", fingerprints["train_dataset"], (meGO_ensembles, train_dataset))
+
+    if matrices is None and train_dataset is None:
+        print("- Processing Multi-eGO contact matrices")
+        with perf.stage("matrices") as record:
+            meGO_ensembles, matrices = ensemble.init_meGO_matrices(meGO_ensembles, args, custom_dict)
+            record["rows"] = sum(int(grid["learned"].sum()) for grid in matrices["train_matrices"].values())
+        print("- Done in:", record["wall_time"], "seconds")
+        checkpoint.save_checkpoint(
+            args, "matrices", fingerprints["matrices"], (meGO_ensembles, pairs14, exclusion_bonds14, matrices)
+        )
+
+    if train_dataset is None:
+        print("- Initializing LJ dataset")
+        with perf.stage("LJ dataset") as record:
+            train_dataset = ensemble.init_LJ_datasets(meGO_ensembles, matrices, pairs14, exclusion_bonds14, args)
+            # force memory cleaning to decrease footprint in case of large dataset
+            del matrices
+            gc.collect()
+            record["rows"] = len(train_dataset)
+        print("- Done in:", record["wall_time"], "seconds")
+        checkpoint.save_checkpoint(args, "train_dataset", fingerprints["train_dataset"], (meGO_ensembles, train_dataset))
+
+    sweep_args = io.get_sweep_arguments(args)
+    # a sweep of a single value still differs from the parameters the dataset was built with
+    sweep = bool(args.epsilon_sweep or args.p_to_learn_sweep or args.relative_c12d_sweep)
+    for sweep_point in sweep_args:
+        # the checkpoints of the models are identified by the fingerprint of their parameters
+        model_fingerprint = checkpoint.get_fingerprint(fingerprints["train_dataset"], "model", sweep_point)
+        model_stage = f"model_{model_fingerprint[:16]}"
+        output_dir = checkpoint.load_checkpoint(args, f"{model_stage}_written", model_fingerprint)
+        if output_dir is not None and os.path.isdir(output_dir):
+            print(f"- Model already written to {output_dir}")
+            continue
+
+        with perf.stage(f"model {sweep_point.explicit_name or sweep_point.egos}"):
+            if sweep:
+                print(f"- Sweep point: {sweep_point.explicit_name}")
+            data = checkpoint.load_checkpoint(args, model_stage, model_fingerprint)
+            if data is not None:
+                meGO_LJ, meGO_LJ_14, stat_str = data
+            else:
+                if sweep:
+                    ensemble.set_learning_thresholds(meGO_ensembles, train_dataset, sweep_point)
+                print("- Generate LJ dataset")
+                with perf.stage("generate LJ") as record:
+                    if args.stream_trainings:
+                        meGO_LJ, meGO_LJ_14, stat_str = ensemble.merge_LJ(meGO_ensembles, train_dataset, sweep_point)
+                    else:
+                        meGO_LJ, meGO_LJ_14, stat_str = ensemble.generate_LJ(meGO_ensembles, train_dataset, sweep_point)
+                    record["rows"] = len(meGO_LJ)
+                print("- Done in:", record["wall_time"], "seconds")
+                checkpoint.save_checkpoint(args, model_stage, model_fingerprint, (meGO_LJ, meGO_LJ_14, stat_str))
+            output_dir = write_meGO_model(meGO_ensembles, meGO_LJ, meGO_LJ_14, sweep_point, stat_str)
+            checkpoint.save_checkpoint(args, f"{model_stage}_written", model_fingerprint, output_dir)
+        # the report of each model covers all the stages run so far
+        if args.perf_report:
+            perf.write_report(f"{output_dir}/perf_report.json")
+
+    # force memory cleaning to decrease footprint in case of large dataset
+    del train_dataset
+    gc.collect()
 
 
 def main():
@@ -150,74 +334,27 @@ def main():
 
     bt = time.time()
     generate_face.print_welcome()
-    args, meGO_ensembles, custom_dict = meGO_parsing()
+    args, custom_dict = meGO_parsing()
 
-    st = time.time()
-    elapsed_time = st - bt
-    print("- Done in:", elapsed_time, "seconds")
     print("- Checking for input files and folders")
     io.check_files_existence(args)
     if args.egos == "production":
         io.check_matrix_format(args)
-
-    print("\t- Generating bonded interactions")
-    meGO_ensembles = ensemble.generate_bonded_interactions(meGO_ensembles)
-    print("\t- Generating 1-4 data")
-    pairs14, exclusion_bonds14 = ensemble.generate_14_data(meGO_ensembles)
-    et = time.time()
-    elapsed_time = et - st
-    st = et
-    print("- Done in:", elapsed_time, "seconds")
-
-    if args.egos == "production":
-        print("- Processing Multi-eGO contact matrices")
-        meGO_ensembles, matrices = ensemble.init_meGO_matrices(meGO_ensembles, args, custom_dict)
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("- Done in:", elapsed_time, "seconds")
-        print("- Initializing LJ dataset")
-        train_dataset = ensemble.init_LJ_datasets(meGO_ensembles, matrices, pairs14, exclusion_bonds14, args)
-        # force memory cleaning to decrease footprint in case of large dataset
-        del matrices
-        gc.collect()
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("- Done in:", elapsed_time, "seconds")
-        print("- Generate LJ dataset")
-        meGO_LJ, meGO_LJ_14, stat_str = ensemble.generate_LJ(meGO_ensembles, train_dataset, args)
-        # force memory cleaning to decrease footprint in case of large dataset
-        del train_dataset
-        gc.collect()
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("- Done in:", elapsed_time, "seconds")
+        run_production(args, custom_dict)
     elif args.egos == "mg":
+        meGO_ensembles, pairs14, _ = init_ensemble(args, custom_dict)
         print("- Generate the LJ dataset")
-        meGO_LJ = ensemble.generate_MG_LJ(meGO_ensembles)
-        stat_str = io.print_stats(meGO_LJ)
-        meGO_LJ_14 = pairs14
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("- Done in:", elapsed_time, "seconds")
-
-    print("- Finalize pairs and exclusions")
-    meGO_LJ_14 = ensemble.make_pairs_exclusion_topology(meGO_ensembles, meGO_LJ_14, args)
-    et = time.time()
-    elapsed_time = et - st
-    st = et
-    print("- Done in:", elapsed_time, "seconds")
-
-    print("- Writing Multi-eGO model")
-    meGO_LJ = ensemble.sort_LJ(meGO_ensembles, meGO_LJ)
-    io.write_model(meGO_ensembles, meGO_LJ, meGO_LJ_14, args, stat_str)
-    et = time.time()
-    elapsed_time = et - st
-    print("- Done in:", elapsed_time, "seconds")
-    print("- Ran in:", et - bt, "seconds")
+        with perf.stage("generate MG LJ") as record:
+            meGO_LJ = ensemble.generate_MG_LJ(meGO_ensembles)
+            stat_str = io.print_stats(meGO_LJ)
+            meGO_LJ_14 = pairs14
+            record["rows"] = len(meGO_LJ)
+        print("- Done in:", record["wall_time"], "seconds")
+        output_dir = write_meGO_model(meGO_ensembles, meGO_LJ, meGO_LJ_14, args, stat_str)
+        if args.perf_report:
+            perf.write_report(f"{output_dir}/perf_report.json")
+
+    print("- Ran in:", time.time() - bt, "seconds")
 
     generate_face.print_goodbye()
 
@@ -1,3 +1,14 @@
+def float_list(value):
+    """
+    Parses a comma separated string (command line) or a list (configuration file) into a list of floats.
+    """
+    if isinstance(value, str):
+        value = value.split(",")
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    return [float(x) for x in value]
+
+
 args_dict = {
     "--system": {
         "type": str,
@@ -82,6 +93,73 @@ args_dict = {
         "type": float,
         "help": "Relative deviation from default to set new replulsive c12",
     },
+    "--epsilon_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of epsilon values. The training data are processed once and one model "
+        "is written for each value (the value replaces the epsilon of every reference).",
+    },
+    "--p_to_learn_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of p_to_learn values to sweep over reusing the same training data.",
+    },
+    "--relative_c12d_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of relative_c12d values to sweep over reusing the same training data.",
+    },
+    "--cache_dir": {
+        "default": "",
+        "type": str,
+        "help": "Folder where the parsed topologies and contact matrices are cached (default: .mego_cache in the multi-eGO folder).",
+    },
+    "--no_cache": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Do not read or write the topology and contact matrix cache.",
+    },
+    "--prefetch_workers": {
+        "default": 2,
+        "type": int,
+        "help": "Number of threads reading the contact matrices ahead of their processing (1 reads them one at a time).",
+    },
+    "--prefetch_memory": {
+        "default": 4.0,
+        "type": float,
+        "help": "Approximate memory (GB) that the matrices read ahead can take.",
+    },
+    "--stream_trainings": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Learn each training as soon as it is read and keep only the best contacts, so that a single training matrix is in memory at a time (not available with sweeps).",
+    },
+    "--precision": {
+        "default": "float64",
+        "type": str,
+        "choices": ["float64", "float32"],
+        "help": "Precision of the contact data and of the LJ parameters before they are written, float32 halves their memory.",
+    },
+    "--perf_report": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Write perf_report.json next to meGO.log, with the wall time, CPU time, memory and number of rows of each stage.",
+    },
+    "--checkpoint": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Save the results of each stage of a production run in outputs/system/checkpoint_<name>, to resume it with --resume.",
+    },
+    "--resume": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Resume a production run from the checkpoints whose inputs and parameters did not change (implies --checkpoint).",
+    },
     "--explicit_name": {
         "default": "",
         "type": str,
@@ -163,6 +241,73 @@ args_dict_global = {
         "type": float,
         "help": "Relative deviation from default to set new replulsive c12",
     },
+    "--epsilon_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of epsilon values. The training data are processed once and one model "
+        "is written for each value (the value replaces the epsilon of every reference).",
+    },
+    "--p_to_learn_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of p_to_learn values to sweep over reusing the same training data.",
+    },
+    "--relative_c12d_sweep": {
+        "type": float_list,
+        "default": [],
+        "help": "Comma separated list of relative_c12d values to sweep over reusing the same training data.",
+    },
+    "--cache_dir": {
+        "default": "",
+        "type": str,
+        "help": "Folder where the parsed topologies and contact matrices are cached (default: .mego_cache in the multi-eGO folder).",
+    },
+    "--no_cache": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Do not read or write the topology and contact matrix cache.",
+    },
+    "--prefetch_workers": {
+        "default": 2,
+        "type": int,
+        "help": "Number of threads reading the contact matrices ahead of their processing (1 reads them one at a time).",
+    },
+    "--prefetch_memory": {
+        "default": 4.0,
+        "type": float,
+        "help": "Approximate memory (GB) that the matrices read ahead can take.",
+    },
+    "--stream_trainings": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Learn each training as soon as it is read and keep only the best contacts, so that a single training matrix is in memory at a time (not available with sweeps).",
+    },
+    "--precision": {
+        "default": "float64",
+        "type": str,
+        "choices": ["float64", "float32"],
+        "help": "Precision of the contact data and of the LJ parameters before they are written, float32 halves their memory.",
+    },
+    "--perf_report": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Write perf_report.json next to meGO.log, with the wall time, CPU time, memory and number of rows of each stage.",
+    },
+    "--checkpoint": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Save the results of each stage of a production run in outputs/system/checkpoint_<name>, to resume it with --resume.",
+    },
+    "--resume": {
+        "type": bool,
+        "default": False,
+        "action": "store_true",
+        "help": "Resume a production run from the checkpoints whose inputs and parameters did not change (implies --checkpoint).",
+    },
     "--explicit_name": {
         "default": "",
         "type": str,
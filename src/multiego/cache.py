@@ -0,0 +1,321 @@
+from . import topology
+
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+import parmed
+import pickle
+import re
+import warnings
+
+# bump this when the content of the cached sections changes
+CACHE_VERSION = 3
+
+# what is extracted from a parmed topology and stored on disk, one file per section
+TOPOLOGY_SECTIONS = {
+    "molecules": topology.get_molecules,
+    "bonded": topology.get_bonded_interactions,
+    "lj": topology.get_lj_data,
+}
+
+include_pattern = re.compile(r'^\s*#\s*include\s+["<]([^">]+)[">]')
+
+
+def find_include(include, current_dir, topology_dir):
+    """
+    Resolves an #include directive the way GROMACS does: relative to the including file,
+    relative to the topology, then in the GMXLIB folders and in the GROMACS installation.
+
+    Returns
+    -------
+    path : str or None
+        The path of the included file, None if it can not be found
+    """
+    search_dirs = [current_dir, topology_dir]
+    search_dirs += [d for d in os.environ.get("GMXLIB", "").split(":") if d]
+    search_dirs.append(parmed.gromacs.GROMACS_TOPDIR)
+    for search_dir in search_dirs:
+        path = os.path.join(search_dir, include)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def get_topology_key(topology_path, defines=None):
+    """
+    Computes the content hash of a topology: the file itself, all the files it includes
+    (recursively) and the preprocessor defines. Files are hashed by content so that identical
+    topologies stored in different folders share the same key.
+
+    Parameters
+    ----------
+    topology_path : str
+        Path to the .top file
+    defines : dict, optional
+        The defines passed to the preprocessor
+
+    Returns
+    -------
+    key : str
+        The sha256 hex digest identifying the topology
+    """
+    sha = hashlib.sha256()
+    sha.update(f"{CACHE_VERSION}\n{parmed.__version__}\n".encode())
+    sha.update(repr(sorted((str(k), str(v)) for k, v in (defines or {}).items())).encode())
+
+    topology_dir = os.path.dirname(os.path.abspath(topology_path))
+    to_visit = [os.path.abspath(topology_path)]
+    visited = set()
+    while to_visit:
+        path = to_visit.pop(0)
+        if path in visited:
+            continue
+        visited.add(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        sha.update(content)
+        for line in content.decode(errors="ignore").splitlines():
+            match = include_pattern.match(line)
+            if not match:
+                continue
+            include = match.group(1)
+            include_path = find_include(include, os.path.dirname(path), topology_dir)
+            sha.update(include.encode())
+            # files from the GROMACS installation that we can not find are identified by name only
+            if include_path is not None:
+                to_visit.append(include_path)
+
+    return sha.hexdigest()
+
+
+def read_topology(topology_path, defines=None, sections=("molecules",), cache_dir=None):
+    """
+    Reads a topology returning the requested sections of extracted data (see TOPOLOGY_SECTIONS).
+    When cache_dir is set the sections are stored in cache_dir/topologies/<content hash>/ and
+    following reads of the same topology (or of an identical one) do not go through parmed.
+
+    Parameters
+    ----------
+    topology_path : str
+        Path to the .top file
+    defines : dict, optional
+        The defines passed to the preprocessor
+    sections : iterable of str
+        The sections to return
+    cache_dir : str, optional
+        The cache folder, no cache is used if None
+
+    Returns
+    -------
+    topology_data : dict
+        {section: extracted data}
+    """
+    topology_data = {}
+    cache_path = None
+    if cache_dir:
+        cache_path = f"{cache_dir}/topologies/{get_topology_key(topology_path, defines)}"
+        for section in sections:
+            try:
+                with open(f"{cache_path}/{section}.pkl", "rb") as f:
+                    topology_data[section] = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                # missing or unreadable entry, it is regenerated below
+                pass
+
+    missing = [section for section in sections if section not in topology_data]
+    if not missing:
+        print("\t\t-", "Topology loaded from cache")
+        return topology_data
+
+    # ignore the dihedral type overriding in parmed
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parmed_topology = parmed.load_file(topology_path, defines)
+
+    for section in missing:
+        topology_data[section] = TOPOLOGY_SECTIONS[section](parmed_topology)
+        if cache_path is not None:
+            write_cache_entry(f"{cache_path}/{section}.pkl", topology_data[section])
+
+    return topology_data
+
+
+def write_cache_entry(path, data):
+    """
+    Pickles data to path. The file is written to a temporary name and then renamed so that
+    concurrent runs never read a partially written entry. Failing to write the cache is not an error.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("\t\t-", f"WARNING: could not write the topology cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_file_hash(path):
+    """
+    Returns the sha256 hex digest of the content of a file, read in blocks.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def get_matrix_sidecar_path(path, cache_dir, key=""):
+    """
+    Returns the path of the binary sidecar of a contact matrix, identified by the absolute path of the matrix
+    and by the key of the selection of rows it contains (empty for the whole matrix).
+    """
+    path_key = hashlib.sha256((os.path.abspath(path) + key).encode()).hexdigest()
+    return f"{cache_dir}/matrices/{path_key}.npz"
+
+
+def get_matrix_stat_path(sidecar_path):
+    """
+    Returns the path of the size and mtime of the source matrix, stored next to the sidecar when the source
+    was found unchanged by its hash after its size or mtime changed (e.g. after a copy or a touch).
+    """
+    return f"{sidecar_path[:-4]}.stat.npy"
+
+
+def write_source_stat(sidecar_path, source_stat):
+    """
+    Stores the size and mtime of the source matrix of a sidecar, so that the next reads skip the hash.
+    Failing to write it is not an error.
+    """
+    stat_path = get_matrix_stat_path(sidecar_path)
+    # np.save appends .npy to names not ending with it
+    tmp_path = f"{stat_path[:-4]}.{os.getpid()}.tmp.npy"
+    try:
+        np.save(tmp_path, np.array([source_stat.st_size, source_stat.st_mtime_ns], dtype=np.int64))
+        os.replace(tmp_path, stat_path)
+    except OSError as e:
+        print("\t\t-", f"WARNING: could not write the matrix cache {stat_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def is_source_stat(sidecar_path, source_stat):
+    """
+    Whether the size and mtime stored by write_source_stat are the ones of source_stat.
+    """
+    try:
+        size, mtime = np.load(get_matrix_stat_path(sidecar_path), allow_pickle=False)
+    except (OSError, ValueError):
+        return False
+    return int(size) == source_stat.st_size and int(mtime) == source_stat.st_mtime_ns
+
+
+def read_contact_matrix(path, cache_dir, key=""):
+    """
+    Loads the binary sidecar of a contact matrix written by write_contact_matrix.
+    The sidecar is used if the size and mtime of the source matrix did not change, or,
+    if they did, when the content of the source matrix still has the same hash. In that case the new
+    size and mtime are stored (see write_source_stat), so that the following reads do not hash the source again.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source contact matrix (.ndx, .ndx.gz or .ndx.h5)
+    cache_dir : str
+        The cache folder
+    key : str
+        The key of the selection of rows (see io.ContactMatrixFilter)
+
+    Returns
+    -------
+    contact_matrix : pd.DataFrame or None
+        The contact matrix as read from the source file, None if there is no valid sidecar
+    """
+    sidecar_path = get_matrix_sidecar_path(path, cache_dir, key)
+    if not os.path.isfile(sidecar_path):
+        return None
+
+    try:
+        with np.load(sidecar_path, allow_pickle=False) as sidecar:
+            if int(sidecar["version"]) != CACHE_VERSION:
+                return None
+            source_stat = os.stat(path)
+            if int(sidecar["source_size"]) != source_stat.st_size or int(sidecar["source_mtime"]) != source_stat.st_mtime_ns:
+                if not is_source_stat(sidecar_path, source_stat):
+                    if str(sidecar["source_hash"]) != get_file_hash(path):
+                        return None
+                    write_source_stat(sidecar_path, source_stat)
+            contact_matrix = pd.DataFrame(
+                {
+                    col: (
+                        pd.Categorical.from_codes(
+                            sidecar[f"{col}_codes"], categories=sidecar[f"{col}_categories"].astype(object)
+                        )
+                        if f"{col}_codes" in sidecar.files
+                        else sidecar[col]
+                    )
+                    for col in sidecar["columns"]
+                }
+            )
+            if "source_rows" in sidecar.files:
+                contact_matrix.attrs["source_rows"] = int(sidecar["source_rows"])
+    except (OSError, ValueError, KeyError) as e:
+        print("\t\t-", f"WARNING: could not read the matrix cache {sidecar_path}: {e}")
+        return None
+
+    print("\t\t-", "Matrix loaded from cache")
+    return contact_matrix
+
+
+def write_contact_matrix(path, contact_matrix, cache_dir, key=""):
+    """
+    Writes the binary sidecar of a contact matrix: one raw array per column, categorical columns
+    (molecules and atom indices) are stored as integer codes plus their categories.
+    Failing to write the sidecar is not an error.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source contact matrix
+    contact_matrix : pd.DataFrame
+        The contact matrix as read from the source file
+    cache_dir : str
+        The cache folder
+    key : str
+        The key of the selection of rows (see io.ContactMatrixFilter)
+    """
+    sidecar_path = get_matrix_sidecar_path(path, cache_dir, key)
+    source_stat = os.stat(path)
+    arrays = {
+        "version": np.array(CACHE_VERSION),
+        "source_size": np.array(source_stat.st_size),
+        "source_mtime": np.array(source_stat.st_mtime_ns),
+        "source_hash": np.array(get_file_hash(path)),
+        "columns": np.array(contact_matrix.columns, dtype=str),
+    }
+    if "source_rows" in contact_matrix.attrs:
+        arrays["source_rows"] = np.array(contact_matrix.attrs["source_rows"])
+    for col in contact_matrix.columns:
+        if isinstance(contact_matrix[col].dtype, pd.CategoricalDtype):
+            arrays[f"{col}_codes"] = contact_matrix[col].cat.codes.to_numpy()
+            arrays[f"{col}_categories"] = np.array(contact_matrix[col].cat.categories, dtype=str)
+        else:
+            arrays[col] = contact_matrix[col].to_numpy()
+
+    # np.savez appends .npz to names not ending with it
+    tmp_path = f"{sidecar_path[:-4]}.{os.getpid()}.tmp.npz"
+    try:
+        os.makedirs(os.path.dirname(sidecar_path), exist_ok=True)
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, sidecar_path)
+        # the stat stored for the previous sidecar does not apply to this one
+        if os.path.exists(get_matrix_stat_path(sidecar_path)):
+            os.remove(get_matrix_stat_path(sidecar_path))
+    except OSError as e:
+        print("\t\t-", f"WARNING: could not write the matrix cache {sidecar_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,133 @@
+from . import cache
+from . import perf
+
+import hashlib
+import os
+import pickle
+
+# bump this when the content of the checkpoints changes
+CHECKPOINT_VERSION = 2
+
+# parameters that do not change the results of the stages
+IGNORED_PARAMETERS = {
+    "explicit_name",
+    "config",
+    "root_dir",
+    "cache_dir",
+    "no_cache",
+    "prefetch_workers",
+    "prefetch_memory",
+    "perf_report",
+    "checkpoint",
+    "resume",
+}
+
+
+def get_checkpoint_dir(args):
+    """
+    Returns the folder of the checkpoints of a run, outputs/<system>/checkpoint_<explicit_name or egos>,
+    so that a run restarted with the same name finds the checkpoints of the previous one.
+    """
+    name = args.explicit_name if args.explicit_name else args.egos
+    return f"{args.root_dir}/outputs/{args.system}/checkpoint_{name}"
+
+
+def get_inputs_fingerprint(args):
+    """
+    Returns a fingerprint of the input files of a production run: the content of the topology of the system
+    (including the #included files), of the custom dictionaries and of the symmetry file, and the size and
+    modification time of every file in the reference and training folders.
+    """
+    sha = hashlib.sha256()
+    sha.update(cache.get_topology_key(f"{args.root_dir}/inputs/{args.system}/topol.top", {"DISULFIDE": 1}).encode())
+    for path in [args.custom_dict, args.custom_c12, args.symmetry_file]:
+        if path:
+            sha.update(cache.get_file_hash(path).encode())
+
+    folders = sorted({folder for ref in args.input_refs for folder in [ref["reference"], *ref["train"]]})
+    for folder in folders:
+        for dirpath, dirnames, filenames in os.walk(f"{args.root_dir}/inputs/{args.system}/{folder}"):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                sha.update(f"{os.path.relpath(path, args.root_dir)} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+    return sha.hexdigest()
+
+
+def get_fingerprint(parent, stage, args):
+    """
+    Returns the fingerprint of a stage, computed from the fingerprint of the stage it depends on
+    and from the parameters of the run (except IGNORED_PARAMETERS).
+    """
+    sha = hashlib.sha256()
+    sha.update(f"{CHECKPOINT_VERSION}\n{parent}\n{stage}\n".encode())
+    for key, value in sorted(vars(args).items()):
+        if key not in IGNORED_PARAMETERS:
+            sha.update(f"{key}={value!r}\n".encode())
+    return sha.hexdigest()
+
+
+def save_checkpoint(args, stage, fingerprint, data):
+    """
+    Pickles the results of a stage to the checkpoint folder, preceded by a header with its fingerprint.
+    The file is written to a temporary name and then renamed, so that a run killed while writing
+    leaves the previous checkpoint. Failing to write a checkpoint is not an error.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        The parameters of the run, nothing is written unless args.checkpoint is set
+    stage : str
+        The name of the stage
+    fingerprint : str
+        The fingerprint of the stage, see get_fingerprint
+    data : object
+        The results of the stage
+    """
+    if not args.checkpoint:
+        return
+    path = f"{get_checkpoint_dir(args)}/{stage}.pkl"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with perf.stage(f"save checkpoint {stage}"):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": CHECKPOINT_VERSION, "fingerprint": fingerprint}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("\t-", f"WARNING: could not write the checkpoint {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_checkpoint(args, stage, fingerprint):
+    """
+    Loads the results of a stage saved by save_checkpoint if its fingerprint matches.
+
+    Returns
+    -------
+    data : object or None
+        The results of the stage, None if args.resume is not set or if there is no valid checkpoint
+    """
+    if not args.resume:
+        return None
+    path = f"{get_checkpoint_dir(args)}/{stage}.pkl"
+    if not os.path.isfile(path):
+        return None
+
+    with perf.stage(f"load checkpoint {stage}"):
+        try:
+            with open(path, "rb") as f:
+                header = pickle.load(f)
+                if header.get("version") != CHECKPOINT_VERSION or header.get("fingerprint") != fingerprint:
+                    print("\t-", f"Checkpoint {stage} is outdated, the inputs or the parameters changed")
+                    return None
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print("\t-", f"WARNING: could not read the checkpoint {path}: {e}")
+            return None
+
+    print("\t-", f"Resuming from checkpoint {stage}")
+    return data
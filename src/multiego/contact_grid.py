@@ -0,0 +1,191 @@
+import numpy as np
+
+
+def locate(axis, atom_ids):
+    """
+    Returns the position of atom_ids along a sorted axis of atom_ids, and the mask of the atoms found on it.
+    """
+    atom_ids = np.asarray(atom_ids)
+    positions = np.searchsorted(axis, atom_ids)
+    found = np.zeros(len(atom_ids), dtype=bool)
+    in_range = positions < len(axis)
+    found[in_range] = axis[positions[in_range]] == atom_ids[in_range]
+    return np.where(found, positions, 0), found
+
+
+class ContactGrid:
+    """
+    Dense storage of the contacts between the atoms of two molecules: every field is either a scalar or an
+    array of shape (len(atoms_ai), len(atoms_aj)) whose element [i, j] refers to the pair atoms_ai[i], atoms_aj[j].
+    The axes are all the atoms of the two molecules in topology order, so that grids of the same pair of molecules
+    (e.g. a training and its reference) are aligned by position. Fields are accessed as grid["probability"].
+
+    Parameters
+    ----------
+    molecule_name_ai, molecule_name_aj : str
+        The molecules along the rows and the columns (e.g. 1_ABETA)
+    atoms_ai, atoms_aj : np.ndarray
+        The atom_id of the atoms along the rows and the columns
+    same_chain : bool
+        Whether the grid describes intramolecular contacts
+    source : str
+        The simulation the contacts come from
+    """
+
+    def __init__(self, molecule_name_ai, atoms_ai, molecule_name_aj, atoms_aj, same_chain, source):
+        self.molecule_name_ai = molecule_name_ai
+        self.molecule_name_aj = molecule_name_aj
+        self.atoms_ai = np.asarray(atoms_ai)
+        self.atoms_aj = np.asarray(atoms_aj)
+        self.same_chain = bool(same_chain)
+        self.source = source
+        self.fields = {}
+
+    @property
+    def shape(self):
+        return (len(self.atoms_ai), len(self.atoms_aj))
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def __setitem__(self, field, values):
+        self.fields[field] = values
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def copy(self):
+        """
+        Returns a grid sharing the arrays of this one, fields can then be set on either of them independently.
+        """
+        grid = ContactGrid(
+            self.molecule_name_ai, self.atoms_ai, self.molecule_name_aj, self.atoms_aj, self.same_chain, self.source
+        )
+        grid.fields = dict(self.fields)
+        return grid
+
+    def positions(self, atom_ids_ai, atom_ids_aj):
+        """
+        Returns the rows and the columns of pairs of atoms given by atom_id, and the mask of the pairs that are part of the grid.
+        """
+        rows, valid_ai = locate(self.atoms_ai, atom_ids_ai)
+        cols, valid_aj = locate(self.atoms_aj, atom_ids_aj)
+        return rows, cols, valid_ai & valid_aj
+
+    @classmethod
+    def from_contact_matrix(cls, contact_matrix, topology_dataframe, fields=("distance", "probability", "cutoff", "learned")):
+        """
+        Scatters a contact matrix, as returned by io.read_molecular_contacts, into a grid over all the atoms of its
+        two molecules. The cells without a row in the matrix are flagged by the "present" field.
+
+        Parameters
+        ----------
+        contact_matrix : pd.DataFrame
+            The contact matrix, with ai/aj of dtype meGO_ensemble["sbtype_dtype"]
+        topology_dataframe : pd.DataFrame
+            The topology the atom_ids refer to
+        fields : iterable of str
+            The columns to copy in the grid
+
+        Returns
+        -------
+        grid : ContactGrid
+            The grid with the requested fields, missing cells are 0 (False for boolean fields)
+        """
+        molecule_name_ai = str(contact_matrix["molecule_name_ai"].iloc[0])
+        molecule_name_aj = str(contact_matrix["molecule_name_aj"].iloc[0])
+        grid = cls(
+            molecule_name_ai,
+            topology_dataframe.loc[topology_dataframe["molecule"] == molecule_name_ai, "atom_id"].to_numpy(),
+            molecule_name_aj,
+            topology_dataframe.loc[topology_dataframe["molecule"] == molecule_name_aj, "atom_id"].to_numpy(),
+            contact_matrix["same_chain"].iloc[0],
+            str(contact_matrix["source"].iloc[0]),
+        )
+        rows, cols, valid = grid.positions(
+            contact_matrix["ai"].cat.codes.to_numpy(), contact_matrix["aj"].cat.codes.to_numpy()
+        )
+        if not valid.all():
+            raise ValueError(
+                f"The contacts of {grid.source} involve atoms that are not part of {molecule_name_ai} and {molecule_name_aj}"
+            )
+
+        grid["present"] = np.zeros(grid.shape, dtype=bool)
+        grid["present"][rows, cols] = True
+        for field in fields:
+            values = contact_matrix[field].to_numpy()
+            grid[field] = np.zeros(grid.shape, dtype=values.dtype)
+            grid[field][rows, cols] = values
+
+        return grid
+
+    @classmethod
+    def from_dense_arrays(
+        cls, molecule_name_ai, atoms_ai, molecule_name_aj, atoms_aj, arrays, topology_dataframe, same_chain, source
+    ):
+        """
+        Builds a grid over all the atoms of two molecules from the arrays of a dense contact matrix (see io.open_dense_contact_matrix).
+        When the atoms of the arrays are already the axes of the grid the arrays are used as they are (e.g. the memory maps
+        of the file), otherwise they are gathered once on the axes. The cells of atoms missing from the arrays are 0 and
+        are flagged by the "present" field.
+
+        Parameters
+        ----------
+        molecule_name_ai, molecule_name_aj : str
+            The molecules along the rows and the columns (e.g. 1_ABETA)
+        atoms_ai, atoms_aj : np.ndarray
+            The atom_id of the rows and of the columns of the arrays, -1 for the atoms that are not part of multi-eGO
+        arrays : dict
+            {field: np.ndarray of shape (len(atoms_ai), len(atoms_aj))}
+        topology_dataframe : pd.DataFrame
+            The topology the atom_ids refer to
+        same_chain : bool
+            Whether the grid describes intramolecular contacts
+        source : str
+            The simulation the contacts come from
+
+        Returns
+        -------
+        grid : ContactGrid
+            The grid with the given fields
+        """
+        grid = cls(
+            molecule_name_ai,
+            topology_dataframe.loc[topology_dataframe["molecule"] == molecule_name_ai, "atom_id"].to_numpy(),
+            molecule_name_aj,
+            topology_dataframe.loc[topology_dataframe["molecule"] == molecule_name_aj, "atom_id"].to_numpy(),
+            same_chain,
+            source,
+        )
+
+        def array_positions(axis, atom_ids):
+            # the position in the arrays of each atom of the axis, -1 if missing
+            atom_ids = np.asarray(atom_ids)
+            kept = atom_ids >= 0
+            lookup = np.full(max(axis.max(initial=-1), atom_ids.max(initial=-1)) + 1, -1)
+            lookup[atom_ids[kept]] = np.flatnonzero(kept)
+            return lookup[axis]
+
+        rows = array_positions(grid.atoms_ai, atoms_ai)
+        cols = array_positions(grid.atoms_aj, atoms_aj)
+        if np.array_equal(rows, np.arange(len(atoms_ai))) and np.array_equal(cols, np.arange(len(atoms_aj))):
+            grid.fields.update(arrays)
+        else:
+            index = np.ix_(np.maximum(rows, 0), np.maximum(cols, 0))
+            valid = np.outer(rows >= 0, cols >= 0)
+            for field, values in arrays.items():
+                grid[field] = values[index]
+                if not valid.all():
+                    grid[field][~valid] = 0
+            if not valid.all():
+                grid["present"] = valid
+        if "present" not in grid:
+            grid["present"] = np.broadcast_to(np.True_, grid.shape)
+
+        return grid
+
+    def take(self, fields, rows, cols):
+        """
+        Returns {field: values} of the cells (rows, cols), scalar fields are returned as they are.
+        """
+        return {field: self[field][rows, cols] if np.ndim(self[field]) == 2 else self[field] for field in fields}
@@ -1,16 +1,41 @@
 from .resources import type_definitions
 from . import io
 from . import topology
+from . import cache
 from .util import masking
+from .util import pair_keys
+from . import contact_grid
+from . import perf
 
 # import glob
 import numpy as np
 import pandas as pd
-import parmed
 import os
-import warnings
 import itertools
-import time
+
+# the fields of the learned contacts
+LEARNED_LJ_FIELDS = [
+    "molecule_name_ai",
+    "ai",
+    "molecule_name_aj",
+    "aj",
+    "probability",
+    "same_chain",
+    "source",
+    "reference",
+    "rc_probability",
+    "sigma",
+    "epsilon",
+    "1-4",
+    "rep",
+    "sigma_prior",
+    "epsilon_prior",
+    "mg_sigma",
+    "mg_epsilon",
+    "md_threshold",
+    "rc_threshold",
+    "learned",
+]
 
 
 def assign_molecule_type(molecule_type_dict, molecule_name, molecule_topology):
@@ -24,8 +49,8 @@ def assign_molecule_type(molecule_type_dict, molecule_name, molecule_topology):
         Contains the molecule type information per system
     molecule_name : str
         The name of system
-    molecule_topology : parmed.Topology
-        The topology of the molecule, which will be used to figure out the molecule_type
+    molecule_topology : pd.DataFrame
+        The atom table of the molecule, which will be used to figure out the molecule_type
 
     Returns
     -------
@@ -33,7 +58,7 @@ def assign_molecule_type(molecule_type_dict, molecule_name, molecule_topology):
         Updated molecule_type_dict with the added new system name
     """
 
-    first_aminoacid = molecule_topology.residues[0].name
+    first_aminoacid = molecule_topology["resname"].iloc[0]
 
     if first_aminoacid in type_definitions.aminoacids_list:
         molecule_type_dict[molecule_name] = "protein"
@@ -60,14 +85,14 @@ def initialize_topology(topology, custom_dict, args):
 
     molecule_type_dict = {}
 
-    for molecule_number, (molecule_name, molecule_topology) in enumerate(topology.molecules.items(), 1):
-        molecule_type_dict = assign_molecule_type(molecule_type_dict, molecule_name, molecule_topology[0])
+    for molecule_number, (molecule_name, molecule) in enumerate(topology["molecules"].items(), 1):
+        molecule_atoms = molecule["atoms"]
+        molecule_type_dict = assign_molecule_type(molecule_type_dict, molecule_name, molecule_atoms)
         ensemble_molecules_idx_sbtype_dictionary[f"{str(molecule_number)}_{molecule_name}"] = {}
-        ensemble_topology_dataframe = pd.concat([ensemble_topology_dataframe, molecule_topology[0].to_dataframe()], axis=0)
-        for atom in molecule_topology[0].atoms:
-            new_number.append(str(atom.idx + 1))
-            col_molecule.append(f"{molecule_number}_{molecule_name}")
-            new_resnum.append(str(atom.residue.number))
+        ensemble_topology_dataframe = pd.concat([ensemble_topology_dataframe, molecule_atoms], axis=0)
+        new_number += [str(idx + 1) for idx in range(len(molecule_atoms))]
+        col_molecule += [f"{molecule_number}_{molecule_name}"] * len(molecule_atoms)
+        new_resnum += molecule_atoms["resnum"].astype(str).to_list()
 
     ensemble_topology_dataframe["number"] = new_number
     ensemble_topology_dataframe["molecule"] = col_molecule
@@ -92,6 +117,11 @@ def initialize_topology(topology, custom_dict, args):
         + "_"
         + ensemble_topology_dataframe["resnum"].astype(str)
     )
+    # integer identity of atoms (position in the topology) and molecules (position in [ molecules ])
+    ensemble_topology_dataframe["atom_id"] = np.arange(len(ensemble_topology_dataframe), dtype=np.int32)
+    ensemble_topology_dataframe["molecule_id"] = ensemble_topology_dataframe["molecule_number"].astype(np.int32)
+    # integer residue number, the last field of the sb_type
+    ensemble_topology_dataframe["residue_number"] = ensemble_topology_dataframe["resnum"].astype(np.int32)
 
     atp_c12_map = {k: v for k, v in zip(type_definitions.gromos_atp["name"], type_definitions.gromos_atp["rc_c12"])}
     atp_mg_c6_map = {k: v for k, v in zip(type_definitions.gromos_atp["name"], type_definitions.gromos_atp["mg_c6"])}
@@ -135,36 +165,109 @@ def initialize_topology(topology, custom_dict, args):
     )
 
 
-def initialize_molecular_contacts(contact_matrix, prior_matrix, args, reference):
+def get_sbtype_dtype(topology_dataframe):
     """
-    This function initializes a contact matrix for a given simulation.
+    Returns the categorical dtype of the sb_types of a topology, with the categories in topology order
+    so that the codes of a column with this dtype are the atom_id of the atoms.
+
+    Parameters
+    ----------
+    topology_dataframe : pd.DataFrame
+        The topology as returned by initialize_topology
+
+    Returns
+    -------
+    sbtype_dtype : pd.CategoricalDtype
+        The dtype of the ai/aj columns
     """
+    sbtypes = topology_dataframe["sb_type"]
+    if sbtypes.duplicated().any():
+        raise ValueError(f"Duplicated atoms in the topology: {sbtypes[sbtypes.duplicated()].to_list()}")
+    return pd.CategoricalDtype(categories=sbtypes.to_list())
 
-    # remove un-learned contacts (intra-inter domain)
-    contact_matrix["learned"] = prior_matrix["rc_learned"].to_numpy()
-    contact_matrix["reference"] = reference["reference"]
-    # calculate adaptive rc/md threshold
+
+def get_atom_ids(atoms):
+    """
+    Returns the atom_id of each atom of a ai/aj column, that is its categorical code, to be used
+    as position in per-atom arrays built from the topology_dataframe.
+
+    Parameters
+    ----------
+    atoms : pd.Series
+        A categorical column with dtype meGO_ensemble["sbtype_dtype"]
+
+    Returns
+    -------
+    atom_ids : np.ndarray
+        The integer atom_id of each element of atoms
+    """
+    atom_ids = atoms.cat.codes.to_numpy()
+    if len(atom_ids) and atom_ids.min() < 0:
+        raise ValueError("Found atoms that are not part of the system topology")
+    return atom_ids
+
+
+def get_residue_distance(meGO_ensemble, meGO_LJ):
+    """
+    Returns the distance between the residue numbers of ai and aj of each contact,
+    which is meaningful only for atoms of the same molecule.
+
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        The meGO ensemble, with the residue_number of the topology_dataframe
+    meGO_LJ : pd.DataFrame
+        The contacts, with ai and aj categorical with the sbtype_dtype
+
+    Returns
+    -------
+    residue_distance : np.ndarray
+        The absolute difference of the residue numbers of ai and aj
+    """
+    residue_number = meGO_ensemble["topology_dataframe"]["residue_number"].to_numpy()
+    return np.abs(residue_number[get_atom_ids(meGO_LJ["ai"])] - residue_number[get_atom_ids(meGO_LJ["aj"])])
+
+
+def get_md_thresholds(contact_matrix, p_to_learn_values):
+    """
+    Calculates the adaptive md threshold of a training matrix for one or more p_to_learn values.
+
+    Parameters
+    ----------
+    contact_matrix : ContactGrid or pd.DataFrame
+        The training contacts with the learned flag already set
+    p_to_learn_values : list
+        The fractions of the training probability to be learned
+
+    Returns
+    -------
+    md_thresholds : dict
+        The md threshold for each p_to_learn value
+    """
     # sort probabilities, and calculate the normalized cumulative distribution
-    p_sort = np.sort(contact_matrix["probability"].loc[(contact_matrix["learned"])].to_numpy())[::-1]
-    norm = np.sum(p_sort)
+    p_sort = np.sort(np.asarray(contact_matrix["probability"])[np.asarray(contact_matrix["learned"], dtype=bool)])[::-1]
+    norm = np.sum(p_sort, dtype=np.float64)
     if norm == 0:
-        p_sort_normalized = 0
-        md_threshold = 1
-    else:
-        # find md threshold
-        p_sort_normalized = np.cumsum(p_sort) / norm
-        md_threshold = p_sort[np.min(np.where(p_sort_normalized > args.p_to_learn)[0])]
+        return {p_to_learn: 1 for p_to_learn in p_to_learn_values}
 
-    contact_matrix["epsilon_0"] = reference["epsilon"]
-    # add the columns for rc, md threshold
-    contact_matrix["md_threshold"] = md_threshold
-    contact_matrix["rc_threshold"] = contact_matrix["md_threshold"] ** (
-        (contact_matrix["epsilon_0"] - np.maximum(0, prior_matrix["epsilon_prior"]))
-        / (contact_matrix["epsilon_0"] - args.epsilon_min)
+    # find md threshold, accumulating in float64 also for float32 probabilities
+    p_sort_normalized = np.cumsum(p_sort, dtype=np.float64) / norm
+    return {p_to_learn: p_sort[np.min(np.where(p_sort_normalized > p_to_learn)[0])] for p_to_learn in p_to_learn_values}
+
+
+def set_epsilon_thresholds(contact_matrix, epsilon_prior, epsilon_min):
+    """
+    Sets the rc threshold and the attractive limit from the epsilon_0 and md_threshold fields,
+    either the columns of a DataFrame or the arrays of a ContactGrid.
+    The powers are computed in float64 and stored with the precision of epsilon_prior.
+    """
+    dtype = np.asarray(epsilon_prior).dtype
+    epsilon_prior = np.asarray(epsilon_prior, dtype=np.float64)
+    rc_threshold = np.asarray(contact_matrix["md_threshold"], dtype=np.float64) ** (
+        (contact_matrix["epsilon_0"] - np.maximum(0, epsilon_prior)) / (contact_matrix["epsilon_0"] - epsilon_min)
     )
-    contact_matrix["limit_rc_att"] = contact_matrix["rc_threshold"] ** (
-        (np.maximum(0, prior_matrix["epsilon_prior"]) - args.epsilon_min)
-        / (contact_matrix["epsilon_0"] - np.maximum(0, prior_matrix["epsilon_prior"]))
+    limit_rc_att = rc_threshold ** (
+        (np.maximum(0, epsilon_prior) - epsilon_min) / (contact_matrix["epsilon_0"] - np.maximum(0, epsilon_prior))
     )
     # this is for 0 : + eps
     # contact_matrix["limit_rc_rep"] = contact_matrix["rc_threshold"] ** (
@@ -178,11 +281,79 @@ def initialize_molecular_contacts(contact_matrix, prior_matrix, args, reference)
     # )
 
     # modify limit_rc_att in the cases where epsilon_prior is negative and limit_rc_att is below 1 == epsilon_0 < epsilon_min)
-    contact_matrix.loc[(contact_matrix["limit_rc_att"] < 1) & (prior_matrix["epsilon_prior"] < 0), "limit_rc_att"] = 1
+    limit_rc_att = np.where((limit_rc_att < 1) & (epsilon_prior < 0), 1.0, limit_rc_att)
+
+    contact_matrix["rc_threshold"] = np.asarray(rc_threshold, dtype=dtype)
+    contact_matrix["limit_rc_att"] = limit_rc_att.astype(dtype)
+    return contact_matrix
+
+
+def initialize_molecular_contacts(contact_matrix, prior_matrix, args, reference):
+    """
+    This function initializes a contact matrix for a given simulation.
+
+    Parameters
+    ----------
+    contact_matrix : ContactGrid
+        The training contacts
+    prior_matrix : ContactGrid
+        The reference contacts of the same pair of molecules, aligned by position with contact_matrix
+    args : argparse.Namespace
+        The parameters, p_to_learn and epsilon_min are used
+    reference : dict
+        The input reference the training belongs to
+
+    Returns
+    -------
+    contact_matrix : ContactGrid
+        The training contacts with the learned flag and the thresholds set
+    """
+
+    # only the contacts learned in the reference are learned (un-learned contacts, intra-inter domain,
+    # are already missing from the reference matrix)
+    contact_matrix["learned"] = contact_matrix["present"] & prior_matrix["present"] & prior_matrix["learned"]
+    contact_matrix["reference"] = reference["reference"]
+    # calculate adaptive rc/md threshold
+    md_threshold = get_md_thresholds(contact_matrix, [args.p_to_learn])[args.p_to_learn]
+
+    contact_matrix["epsilon_0"] = reference["epsilon"]
+    # add the columns for rc, md threshold
+    contact_matrix["md_threshold"] = md_threshold
+    contact_matrix = set_epsilon_thresholds(contact_matrix, prior_matrix["epsilon_prior"], args.epsilon_min)
 
     return contact_matrix
 
 
+def set_learning_thresholds(meGO_ensemble, train_dataset, args):
+    """
+    Recomputes in place the epsilon dependent thresholds of an already initialized LJ dataset.
+
+    This allows to sweep over epsilon, p_to_learn and relative_c12d values reusing the same
+    training dataset instead of re-reading topologies and contact matrices for each value.
+
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        The meGO_ensemble object containing the md thresholds of each training matrix
+    train_dataset : pd.DataFrame
+        The dataset generated by init_LJ_datasets
+    args : argparse.Namespace
+        The parameters of the current sweep point
+
+    Returns
+    -------
+    train_dataset : pd.DataFrame
+        The dataset with updated epsilon_0, md_threshold, rc_threshold and limit_rc_att
+    """
+    if meGO_ensemble["md_thresholds"]:
+        md_thresholds = {name: values[args.p_to_learn] for name, values in meGO_ensemble["md_thresholds"].items()}
+        train_dataset["md_threshold"] = train_dataset["train_matrix"].map(md_thresholds).astype(args.precision)
+    epsilons = {name: args.input_refs[i]["epsilon"] for name, i in meGO_ensemble["train_matrix_references"].items()}
+    train_dataset["epsilon_0"] = train_dataset["train_matrix"].map(epsilons).astype(args.precision)
+
+    return set_epsilon_thresholds(train_dataset, train_dataset["epsilon_prior"], args.epsilon_min)
+
+
 def init_meGO_ensemble(args, custom_dict):
     print("\t-", "Initializing system topology")
     base_topology_path = f"{args.root_dir}/inputs/{args.system}/topol.top"
@@ -191,11 +362,10 @@ def init_meGO_ensemble(args, custom_dict):
         raise FileNotFoundError(f"{base_topology_path} not found.")
 
     print("\t\t-", f"Reading {base_topology_path}")
-    # ignore the dihedral type overriding in parmed
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        defines = {"DISULFIDE": 1}
-        base_reference_topology = parmed.load_file(base_topology_path, defines)
+    defines = {"DISULFIDE": 1}
+    base_reference_topology = cache.read_topology(
+        base_topology_path, defines, sections=("molecules", "bonded"), cache_dir=args.cache_dir
+    )
     (
         topology_dataframe,
         molecules_idx_sbtype_dictionary,
@@ -210,6 +380,9 @@ def init_meGO_ensemble(args, custom_dict):
     ensemble = {}
     ensemble["topology"] = base_reference_topology
     ensemble["topology_dataframe"] = topology_dataframe
+    # ai/aj columns use this dtype everywhere: the categorical codes are the atom_id of the topology,
+    # so that merges, sorts and lookups work on integers and strings are only needed when writing
+    ensemble["sbtype_dtype"] = get_sbtype_dtype(topology_dataframe)
     ensemble["molecules_idx_sbtype_dictionary"] = (
         molecules_idx_sbtype_dictionary  # molecule, {index, mego_type} -> 1: N_mol_resnum
     )
@@ -226,6 +399,8 @@ def init_meGO_ensemble(args, custom_dict):
     # {molecule: moltype} mol: protein
     ensemble["molecule_type_dict"] = molecule_type_dict
     ensemble["train_matrix_tuples"] = []
+    ensemble["train_matrix_references"] = {}
+    ensemble["md_thresholds"] = {}
 
     return ensemble
 
@@ -245,19 +420,79 @@ def check_intra_domain_complementarity(matrices):
     for check in to_check:
         intra_flags = []
         for key in check:
-            intra_flags.append(matrices[key]["rc_learned"].to_numpy())
+            intra_flags.append(matrices[key]["present"] & matrices[key]["learned"])
         if np.any(np.sum(intra_flags, axis=0) > 1):
             raise ValueError(f"Learning flag complementarity not satisfied for {check} (e.g. intra-inter domain splitting)")
 
 
+def get_matrix_path(simulation_path, matrix):
+    """
+    Returns the path of the contact matrix of a simulation folder.
+
+    Parameters
+    ----------
+    simulation_path : str
+        The reference or training folder
+    matrix : str
+        The matrix name (e.g. intramat_1_1), matched against the names of the files in the folder
+
+    Returns
+    -------
+    path : str
+        The path of the only file matching the matrix name
+    """
+    matrix_paths = [f"{simulation_path}/{a}" for a in os.listdir(simulation_path) if matrix in a]
+    # if matrix path is more than 1 raise error
+    if len(matrix_paths) > 1:
+        raise ValueError(f"More than 1 matrix found in {simulation_path}: {matrix_paths}")
+
+    if matrix_paths == []:
+        raise FileNotFoundError(
+            f"Contact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5/.mm) or intermat_X_Y.ndx(.gz/.h5/.mm). Found instead: {matrix}"
+        )
+
+    return matrix_paths[0]
+
+
+def read_contact_grid(path, ensemble, simulation, prefetcher, args):
+    """
+    Returns the contacts of a matrix file as a ContactGrid over the atoms of the ensemble topology.
+    Dense (.ndx.mm) matrices are mapped from disk, the other formats are read through the prefetcher.
+    """
+    if path.endswith(".mm"):
+        return io.read_dense_molecular_contacts(
+            path,
+            ensemble["molecules_idx_sbtype_dictionary"],
+            simulation,
+            ensemble["sbtype_dtype"],
+            ensemble["topology_dataframe"],
+            float_dtype=args.precision,
+        )
+    return contact_grid.ContactGrid.from_contact_matrix(
+        io.read_molecular_contacts(
+            path,
+            ensemble["molecules_idx_sbtype_dictionary"],
+            simulation,
+            path.endswith(".h5"),
+            prefetcher=prefetcher,
+            sbtype_dtype=ensemble["sbtype_dtype"],
+            float_dtype=args.precision,
+        ),
+        ensemble["topology_dataframe"],
+    )
+
+
 # TODO this hole function should iterate over references and than internally over the trainings keeping stored the already processed training by path name
 # Even though in this way the check consinstency between reference matrices is faster
-def init_meGO_matrices(ensemble, args, custom_dict):
+def init_meGO_matrices(ensemble, args, custom_dict, learn_training=None):
     """
     Initializes meGO.
 
     Args:
     - args (object): Object containing arguments for initializing the ensemble.
+    - learn_training (callable, optional): Called as learn_training(matrices, name, ref_name) as soon as each training
+      matrix is initialized, with matrices containing only that training. The training matrices are then released
+      instead of being returned, see stream_LJ_datasets.
 
     Returns:
     - ensemble (dict): A dictionary containing the initialized ensemble with various molecular attributes and contact matrices.
@@ -274,133 +509,135 @@ def init_meGO_matrices(ensemble, args, custom_dict):
     the need to add missing atom types to the conversion dictionary for proper contact merging.
 
     Note:
-    - This function assumes the availability of various directories, files, and modules (e.g., 'parmed', 'io').
+    - This function assumes the availability of various directories, files, and modules (e.g., 'cache', 'io').
     - The 'args' object should contain necessary arguments for setting up the ensemble.
     - The returned 'ensemble' dictionary encapsulates crucial details of the initialized ensemble for further analysis or processing.
     """
 
-    st = time.time()
     reference_contact_matrices = {}
     matrices = {}
 
+    # the topologies of the trainings are needed to select the rows of their matrices while reading them
+    train_topologies = {}
+    with perf.stage("training topologies") as record:
+        for reference in args.input_refs:
+            for simulation in reference["train"]:
+                topology_path = f"{args.root_dir}/inputs/{args.system}/{simulation}/topol.top"
+                if topology_path in train_topologies:
+                    continue
+                if not os.path.isfile(topology_path):
+                    raise FileNotFoundError(f"{topology_path} not found.")
+                print("\t-", f"Reading {topology_path}")
+                topol = cache.read_topology(topology_path, cache_dir=args.cache_dir)
+                train_topologies[topology_path] = initialize_topology(topol, custom_dict, args)[:2]
+        record["rows"] = sum(len(topology_dataframe) for topology_dataframe, _ in train_topologies.values())
+
+    # the matrices are read in the background, in the same order in which they are processed below,
+    # keeping only the rows involving multi-eGO atoms and, for the references, the learned ones
+    row_filters = {}
+    # number of trainings using each matrix, to release it after its last use when learning while reading
+    train_uses = {}
+    reference_filter = io.ContactMatrixFilter(ensemble["molecules_idx_sbtype_dictionary"], learned_only=True)
+    for reference in args.input_refs:
+        path = get_matrix_path(f"{args.root_dir}/inputs/{args.system}/{reference['reference']}", reference["matrix"])
+        row_filters[path] = reference_filter
+    for reference in args.input_refs:
+        for simulation in reference["train"]:
+            simulation_path = f"{args.root_dir}/inputs/{args.system}/{simulation}"
+            path = get_matrix_path(simulation_path, reference["matrix"])
+            row_filters[path] = io.ContactMatrixFilter(train_topologies[f"{simulation_path}/topol.top"][1])
+            train_uses[path] = train_uses.get(path, 0) + 1
+    # dense matrices are mapped when they are used
+    prefetcher = io.ContactMatrixPrefetcher(
+        [path for path in row_filters if not path.endswith(".mm")],
+        args.cache_dir,
+        max_workers=args.prefetch_workers,
+        max_memory=args.prefetch_memory * 1e9,
+        row_filters=row_filters,
+    )
+
     # if there are more than 1 reference associated to the same
     # check if reference are associated to the same molecule pair
     # if intramat> check for intra domain complementarity
     for reference in args.input_refs:  # reference_paths:
         print("\t-", f"Initializing {reference['reference']} ensemble data")
-        reference_path = f"{args.root_dir}/inputs/{args.system}/{reference['reference']}"
-        topol_files = [f for f in os.listdir(reference_path) if ".top" in f]
-        if len(topol_files) > 1:
-            raise RuntimeError(f"More than 1 topology file found in {reference_path}. Only one should be used")
-
-        topology_path = f"{reference_path}/{topol_files[0]}"
-        if not os.path.isfile(topology_path):
-            raise FileNotFoundError(f"{topology_path} not found.")
-
-        print("\t\t-", f"Reading {topology_path}")
-        # ignore the dihedral type overriding in parmed
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            topol = parmed.load_file(topology_path)
-
-        # these are the atom type c6_i,c12_j
-        lj_data = topology.get_lj_params(topol)
-        # these are the combined cases (c6_ij, c12_ij)
-        lj_pairs = topology.get_lj_pairs(topol)
-        # Create reversed pairs
-        reversed_lj_pairs = lj_pairs.rename(columns={"ai": "aj", "aj": "ai"})
-        # Combine original and reversed
-        symmetric_lj_pairs = pd.concat([lj_pairs, reversed_lj_pairs])
-        # Remove duplicates to avoid duplication of symmetric pairs
-        # This step ensures that if a pair already exists in both directions, it's not duplicated
-        symmetric_lj_pairs = symmetric_lj_pairs.drop_duplicates(subset=["ai", "aj"]).reset_index(drop=True)
-
-        # these are the combined cases in the [pairs] section (c6_ij, c12_ij)
-        lj14_pairs = topology.get_lj14_pairs(topol)
-        # Create reversed pairs
-        reversed_lj14_pairs = lj14_pairs.rename(columns={"ai": "aj", "aj": "ai"})
-        # Combine original and reversed
-        symmetric_lj14_pairs = pd.concat([lj14_pairs, reversed_lj14_pairs])
-        # Remove duplicates to avoid duplication of symmetric pairs
-        # This step ensures that if a pair already exists in both directions, it's not duplicated
-        symmetric_lj14_pairs = symmetric_lj14_pairs.drop_duplicates(subset=["ai", "aj"]).reset_index(drop=True)
-
-        lj_data_dict = {str(key): val for key, val in zip(lj_data["ai"], lj_data[["c6", "c12"]].values)}
-
-        ensemble["topology_dataframe"]["c6"] = lj_data["c6"].to_numpy()
-        ensemble["topology_dataframe"]["c12"] = lj_data["c12"].to_numpy()
-
-        matrix_paths = [f"{reference_path}/{a}" for a in os.listdir(reference_path) if reference["matrix"] in a]
-
-        # if matrix path is more than 1 raise error
-        if len(matrix_paths) > 1:
-            raise ValueError(f"More than 1 matrix found in {reference_path}: {matrix_paths}")
-
-        if matrix_paths == []:
-            raise FileNotFoundError(
-                f"Contact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5) or intermat_X_Y.ndx(.gz/.h5). Found instead: {reference['matrix']}"
-            )
-
-        path = matrix_paths[0]
-        name = path.replace(f"{args.root_dir}/inputs/", "")
-        name = name.replace("/", "_")
-        name = name.replace(".ndx", "")
-        name = name.replace(".gz", "")
-        name = name.replace(".h5", "")
-        reference_contact_matrices[name] = io.read_molecular_contacts(
-            path, ensemble["molecules_idx_sbtype_dictionary"], reference["reference"], path.endswith(".h5")
-        )
-        reference_contact_matrices[name] = reference_contact_matrices[name].add_prefix("rc_")
-        reference_contact_matrices[name]["c6_i"] = [lj_data_dict[x][0] for x in reference_contact_matrices[name]["rc_ai"]]
-        reference_contact_matrices[name]["c6_j"] = [lj_data_dict[x][0] for x in reference_contact_matrices[name]["rc_aj"]]
-        reference_contact_matrices[name]["c6"] = np.sqrt(
-            reference_contact_matrices[name]["c6_i"] * reference_contact_matrices[name]["c6_j"]
-        )
-        reference_contact_matrices[name]["c12_i"] = [lj_data_dict[x][1] for x in reference_contact_matrices[name]["rc_ai"]]
-        reference_contact_matrices[name]["c12_j"] = [lj_data_dict[x][1] for x in reference_contact_matrices[name]["rc_aj"]]
-        reference_contact_matrices[name]["c12"] = np.sqrt(
-            reference_contact_matrices[name]["c12_i"] * reference_contact_matrices[name]["c12_j"]
-        )
-        reference_contact_matrices[name]["sigma_prior"] = np.where(
-            reference_contact_matrices[name]["c6"] > 0,
-            (reference_contact_matrices[name]["c12"] / reference_contact_matrices[name]["c6"]) ** (1 / 6),
-            reference_contact_matrices[name]["c12"] ** (1 / 12) / (2.0 ** (1.0 / 6.0)),
-        )
-        reference_contact_matrices[name]["epsilon_prior"] = np.where(
-            reference_contact_matrices[name]["c6"] > 0,
-            reference_contact_matrices[name]["c6"] ** 2 / (4 * reference_contact_matrices[name]["c12"]),
-            -reference_contact_matrices[name]["c12"],
-        )
-
-        # Create a mapping from lj_pairs for sigma and epsilon
-        lj_sigma_map = symmetric_lj_pairs.set_index(["ai", "aj"])["sigma"]
-        lj_epsilon_map = symmetric_lj_pairs.set_index(["ai", "aj"])["epsilon"]
-        lj14_sigma_map = symmetric_lj14_pairs.set_index(["ai", "aj"])["sigma"]
-        lj14_epsilon_map = symmetric_lj14_pairs.set_index(["ai", "aj"])["epsilon"]
-
-        # Filter lj_sigma_map to include only indices that exist in reference_contact_matrices[name]
-        common_indices = lj_sigma_map.index.intersection(reference_contact_matrices[name].set_index(["rc_ai", "rc_aj"]).index)
-        # in this case we want to apply it only for intramolecular contacts
-        common_indices_14 = lj14_sigma_map.index.intersection(
-            reference_contact_matrices[name][reference_contact_matrices[name]["rc_same_chain"]]
-            .set_index(["rc_ai", "rc_aj"])
-            .index
-        )
+        with perf.stage(f"reference {reference['reference']} {reference['matrix']}") as record:
+            reference_path = f"{args.root_dir}/inputs/{args.system}/{reference['reference']}"
+            topol_files = [f for f in os.listdir(reference_path) if ".top" in f]
+            if len(topol_files) > 1:
+                raise RuntimeError(f"More than 1 topology file found in {reference_path}. Only one should be used")
 
-        # Update sigma values where they exist in lj_pairs
-        reference_contact_matrices[name].loc[common_indices, "sigma_prior"] = lj_sigma_map.astype("float64")
-        reference_contact_matrices[name].loc[common_indices_14, "sigma_prior"] = lj14_sigma_map.astype("float64")
+            topology_path = f"{reference_path}/{topol_files[0]}"
+            if not os.path.isfile(topology_path):
+                raise FileNotFoundError(f"{topology_path} not found.")
 
-        # Update epsilon values where they exist in lj_pairs
-        reference_contact_matrices[name].loc[common_indices, "epsilon_prior"] = lj_epsilon_map.astype("float64")
-        reference_contact_matrices[name].loc[common_indices_14, "epsilon_prior"] = lj14_epsilon_map.astype("float64")
+            print("\t\t-", f"Reading {topology_path}")
+            topol = cache.read_topology(topology_path, sections=("lj",), cache_dir=args.cache_dir)
+
+            # these are the atom type c6_i,c12_j
+            lj_data = topol["lj"]["lj_params"]
+            # these are the combined cases (c6_ij, c12_ij)
+            lj_pairs = topol["lj"]["lj_pairs"]
+            # Create reversed pairs
+            reversed_lj_pairs = lj_pairs.rename(columns={"ai": "aj", "aj": "ai"})
+            # Combine original and reversed
+            symmetric_lj_pairs = pd.concat([lj_pairs, reversed_lj_pairs])
+            # Remove duplicates to avoid duplication of symmetric pairs
+            # This step ensures that if a pair already exists in both directions, it's not duplicated
+            symmetric_lj_pairs = symmetric_lj_pairs.drop_duplicates(subset=["ai", "aj"]).reset_index(drop=True)
+
+            # these are the combined cases in the [pairs] section (c6_ij, c12_ij)
+            lj14_pairs = topol["lj"]["lj14_pairs"]
+            # Create reversed pairs
+            reversed_lj14_pairs = lj14_pairs.rename(columns={"ai": "aj", "aj": "ai"})
+            # Combine original and reversed
+            symmetric_lj14_pairs = pd.concat([lj14_pairs, reversed_lj14_pairs])
+            # Remove duplicates to avoid duplication of symmetric pairs
+            # This step ensures that if a pair already exists in both directions, it's not duplicated
+            symmetric_lj14_pairs = symmetric_lj14_pairs.drop_duplicates(subset=["ai", "aj"]).reset_index(drop=True)
+
+            lj_data_dict = {str(key): val for key, val in zip(lj_data["ai"], lj_data[["c6", "c12"]].values)}
+
+            ensemble["topology_dataframe"]["c6"] = lj_data["c6"].to_numpy()
+            ensemble["topology_dataframe"]["c12"] = lj_data["c12"].to_numpy()
+
+            path = get_matrix_path(reference_path, reference["matrix"])
+            name = path.replace(f"{args.root_dir}/inputs/", "")
+            name = name.replace("/", "_")
+            name = name.replace(".ndx", "")
+            name = name.replace(".gz", "")
+            name = name.replace(".h5", "")
+            name = name.replace(".mm", "")
+            reference_grid = read_contact_grid(path, ensemble, reference["reference"], prefetcher, args)
+            record["rows"] = int(np.count_nonzero(reference_grid["present"] & reference_grid["learned"]))
+
+            # c6/c12 of each atom along the two axes, combined by broadcasting
+            atom_lj = np.array([lj_data_dict[sbtype] for sbtype in ensemble["sbtype_dtype"].categories], dtype=float)
+            c6 = np.sqrt(atom_lj[reference_grid.atoms_ai, 0][:, None] * atom_lj[reference_grid.atoms_aj, 0][None, :])
+            c12 = np.sqrt(atom_lj[reference_grid.atoms_ai, 1][:, None] * atom_lj[reference_grid.atoms_aj, 1][None, :])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                reference_grid["sigma_prior"] = np.where(
+                    c6 > 0, (c12 / c6) ** (1 / 6), c12 ** (1 / 12) / (2.0 ** (1.0 / 6.0))
+                ).astype(args.precision)
+                reference_grid["epsilon_prior"] = np.where(c6 > 0, c6**2 / (4 * c12), -c12).astype(args.precision)
+            del c6, c12
+
+            # Update sigma and epsilon values where they exist in lj_pairs,
+            # the [pairs] ones only for intramolecular contacts
+            lj_pairs_to_apply = [symmetric_lj_pairs]
+            if reference_grid.same_chain:
+                lj_pairs_to_apply.append(symmetric_lj14_pairs)
+            for pairs in lj_pairs_to_apply:
+                rows, cols, valid = reference_grid.positions(
+                    ensemble["sbtype_dtype"].categories.get_indexer(pairs["ai"]),
+                    ensemble["sbtype_dtype"].categories.get_indexer(pairs["aj"]),
+                )
+                reference_grid["sigma_prior"][rows[valid], cols[valid]] = pairs["sigma"].to_numpy(dtype="float64")[valid]
+                reference_grid["epsilon_prior"][rows[valid], cols[valid]] = pairs["epsilon"].to_numpy(dtype="float64")[valid]
 
-        reference_contact_matrices[name].drop(columns=["c6_i", "c6_j", "c12_i", "c12_j", "c6", "c12"], inplace=True)
+            reference_contact_matrices[name] = reference_grid
 
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("\t- Done in:", elapsed_time, "seconds")
+        print("\t- Done in:", record["wall_time"], "seconds")
 
     matrices["reference_matrices"] = reference_contact_matrices
     reference_set = set(ensemble["topology_dataframe"]["name"].to_list())
@@ -417,91 +654,82 @@ def init_meGO_matrices(ensemble, args, custom_dict):
     train_contact_matrices = {}
     train_topology_dataframe = pd.DataFrame()
 
-    for reference in args.input_refs:
+    for ref_index, reference in enumerate(args.input_refs):
         trainings = reference["train"]
         for simulation in trainings:
             print("\t-", f"Initializing {simulation} ensemble data")
-            simulation_path = f"{args.root_dir}/inputs/{args.system}/{simulation}"
-            topology_path = f"{simulation_path}/topol.top"
-            if not os.path.isfile(topology_path):
-                raise FileNotFoundError(f"{topology_path} not found.")
-
-            print("\t\t-", f"Reading {topology_path}")
-            # ignore the dihedral type overriding in parmed
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                topol = parmed.load_file(topology_path)
-
-            (
-                temp_topology_dataframe,
-                ensemble["molecules_idx_sbtype_dictionary"],
-                _,
-                _,
-                _,
-                _,
-                _,
-                _,
-            ) = initialize_topology(topol, custom_dict, args)
-
-            train_topology_dataframe = pd.concat(
-                [train_topology_dataframe, temp_topology_dataframe],
-                axis=0,
-                ignore_index=True,
-            )
-            matrix_paths = [f"{simulation_path}/{a}" for a in os.listdir(simulation_path) if reference["matrix"] in a]
-            # if matrix path is more than 1 raise error
-            if len(matrix_paths) > 1:
-                raise ValueError(f"More than 1 matrix found in {reference_path}: {matrix_paths}")
-
-            if matrix_paths == []:
-                raise FileNotFoundError(
-                    f"Contact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5) or intermat_X_Y.ndx(.gz/.h5). Found instead {reference['matrix']}"
+            with perf.stage(f"training {simulation} {reference['matrix']}") as record:
+                simulation_path = f"{args.root_dir}/inputs/{args.system}/{simulation}"
+                topology_path = f"{simulation_path}/topol.top"
+                temp_topology_dataframe, ensemble["molecules_idx_sbtype_dictionary"] = train_topologies[topology_path]
+
+                train_topology_dataframe = pd.concat(
+                    [train_topology_dataframe, temp_topology_dataframe],
+                    axis=0,
+                    ignore_index=True,
                 )
-
-            path = matrix_paths[0]
-            # needed to check if training wa already read to avoid reading it multiple times
-            train_name = path.replace(f"{args.root_dir}/inputs/", "")
-            train_name = train_name.replace("/", "_")
-            train_name = train_name.replace(".ndx", "")
-            train_name = train_name.replace(".gz", "")
-            train_name = train_name.replace(".h5", "")
-            # Use the name containing both the reference and the training in order to have a unique training name for each training and reference
-            name = f"{args.system}/{reference['reference']}/{simulation}/{reference['matrix']}"
-            name = name.replace("/", "_")
-            # if the training was already read just copy it instead of re-reading it
-            if train_name not in computed_contact_matrices:
-                train_contact_matrices_general[train_name] = io.read_molecular_contacts(
-                    path, ensemble["molecules_idx_sbtype_dictionary"], simulation, path.endswith(".h5")
+                path = get_matrix_path(simulation_path, reference["matrix"])
+                # needed to check if training wa already read to avoid reading it multiple times
+                train_name = path.replace(f"{args.root_dir}/inputs/", "")
+                train_name = train_name.replace("/", "_")
+                train_name = train_name.replace(".ndx", "")
+                train_name = train_name.replace(".gz", "")
+                train_name = train_name.replace(".h5", "")
+                train_name = train_name.replace(".mm", "")
+                # Use the name containing both the reference and the training in order to have a unique training name for each training and reference
+                name = f"{args.system}/{reference['reference']}/{simulation}/{reference['matrix']}"
+                name = name.replace("/", "_")
+                # if the training was already read just copy it instead of re-reading it
+                if train_name not in computed_contact_matrices:
+                    train_contact_matrices_general[train_name] = read_contact_grid(
+                        path, ensemble, simulation, prefetcher, args
+                    )
+                    computed_contact_matrices.append(train_name)
+                    record["rows"] = int(train_contact_matrices_general[train_name]["present"].sum())
+                    train_contact_matrices[name] = train_contact_matrices_general[train_name]
+                else:
+                    train_contact_matrices[name] = train_contact_matrices_general[train_name].copy()
+
+                # reference name is already uniquely associated to the training
+                ref_name = f"{args.system}/{reference['reference']}/{reference['matrix']}".replace("/", "_")
+
+                if ref_name == []:
+                    raise FileNotFoundError(f"No corresponding reference matrix found for {path}")
+                ensemble["train_matrix_tuples"].append((name, ref_name))
+                train_contact_matrices[name] = initialize_molecular_contacts(
+                    train_contact_matrices[name],
+                    reference_contact_matrices[ref_name],
+                    args,
+                    reference,
                 )
-                computed_contact_matrices.append(train_name)
-                train_contact_matrices[name] = train_contact_matrices_general[train_name]
-            else:
-                train_contact_matrices[name] = train_contact_matrices_general[train_name].copy()
-
-            # reference name is already uniquely associated to the training
-            ref_name = f"{args.system}/{reference['reference']}/{reference['matrix']}".replace("/", "_")
-
-            if ref_name == []:
-                raise FileNotFoundError(f"No corresponding reference matrix found for {path}")
-            ensemble["train_matrix_tuples"].append((name, ref_name))
-            train_contact_matrices[name] = initialize_molecular_contacts(
-                train_contact_matrices[name],
-                reference_contact_matrices[ref_name],
-                args,
-                reference,
-            )
+                ensemble["train_matrix_references"][name] = ref_index
+                # the md thresholds of all the swept p_to_learn are stored to re-threshold without re-reading
+                if args.p_to_learn_sweep:
+                    ensemble["md_thresholds"][name] = get_md_thresholds(train_contact_matrices[name], args.p_to_learn_sweep)
+
+                if learn_training is not None:
+                    learn_training(
+                        {
+                            "train_matrices": {name: train_contact_matrices.pop(name)},
+                            "reference_matrices": reference_contact_matrices,
+                        },
+                        name,
+                        ref_name,
+                    )
+                    train_uses[path] -= 1
+                    if not train_uses[path]:
+                        del train_contact_matrices_general[train_name]
 
-            et = time.time()
-            elapsed_time = et - st
-            st = et
-            print("\t- Done in:", elapsed_time, "seconds")
+            print("\t- Done in:", record["wall_time"], "seconds")
+
+    prefetcher.close()
 
     # force memory cleaning to decrease footprint in case of large dataset
     del train_contact_matrices_general
     matrices["train_matrices"] = train_contact_matrices
 
     comparison_set = set()
-    for number, molecule in enumerate(ensemble["topology"].molecules, 1):
+    for number, molecule in enumerate(ensemble["topology"]["molecules"], 1):
         comparison_dataframe = train_topology_dataframe.loc[train_topology_dataframe["molecule"] == f"{number}_{molecule}"]
         if not comparison_dataframe.empty:
             comparison_set = set(
@@ -544,18 +772,22 @@ def generate_bonded_interactions(meGO_ensemble):
         meGO_ensemble["bond_pairs"] = {}
     if "user_pairs" not in meGO_ensemble.keys():
         meGO_ensemble["user_pairs"] = {}
+    if "bonded_exclusions" not in meGO_ensemble.keys():
+        meGO_ensemble["bonded_exclusions"] = {}
 
-    for molecule, topol in meGO_ensemble["topology"].molecules.items():
+    for molecule, bonded in meGO_ensemble["topology"]["bonded"].items():
         meGO_ensemble["meGO_bonded_interactions"][molecule] = {
-            "bonds": topology.get_bonds(topol[0].bonds),
-            "angles": topology.get_angles(topol[0].angles),
-            "dihedrals": topology.get_dihedrals(topol[0].dihedrals),
-            "impropers": topology.get_impropers(topol[0].impropers),
-            "pairs": topology.get_pairs(topol[0].adjusts),
+            "bonds": bonded["bonds"].copy(),
+            "angles": bonded["angles"].copy(),
+            "dihedrals": bonded["dihedrals"].copy(),
+            "impropers": bonded["impropers"].copy(),
+            "pairs": bonded["pairs"].copy(),
         }
         # The following bonds are used in the parametrization of LJ 1-4
-        meGO_ensemble["bond_pairs"][molecule] = topology.get_bond_pairs(topol[0].bonds)
-        meGO_ensemble["user_pairs"][molecule] = topology.get_pairs(topol[0].adjusts)
+        meGO_ensemble["bond_pairs"][molecule] = bonded["bond_pairs"]
+        meGO_ensemble["user_pairs"][molecule] = bonded["pairs"]
+        # atoms within 3 bonds, computed once and used both for the 1-4 data and the exclusions
+        meGO_ensemble["bonded_exclusions"][molecule] = topology.get_bonded_exclusions(bonded["bond_pairs"])
 
     return meGO_ensemble
 
@@ -612,20 +844,18 @@ def generate_14_data(meGO_ensemble):
         # Dictionaries definitions to map values
         type_atnum_dict = reduced_topology.set_index("number")["sb_type"].to_dict()
 
-        # Building the exclusion bonded list
-        # exclusion_bonds are all the interactions within 3 bonds
-        # p14 are specifically the interactions at exactly 3 bonds
-        exclusion_bonds, tmp_p14 = topology.get_14_interaction_list(reduced_topology, bond_pair)
-        # split->convert->remerge:
-        tmp_ex = pd.DataFrame(columns=["ai", "aj", "exclusion_bonds"])
-        tmp_ex["exclusion_bonds"] = pd.Series(exclusion_bonds).astype("category")
-        tmp_ex[["ai", "aj"]] = tmp_ex["exclusion_bonds"].str.split("_", expand=True)
-        tmp_ex["ai"] = tmp_ex["ai"].map(type_atnum_dict).astype("category")
-        tmp_ex["aj"] = tmp_ex["aj"].map(type_atnum_dict).astype("category")
-        tmp_ex["same_chain"] = True
-        tmp_ex["1-4"] = "1_2_3"
-        tmp_ex.loc[(tmp_ex["exclusion_bonds"].isin(tmp_p14)), "1-4"] = "1_4"
-        tmp_ex["1-4"] = tmp_ex["1-4"].astype("category")
+        # The exclusion bonded list contains all the interactions within 3 bonds,
+        # those at exactly 3 bonds are marked as 1_4
+        exclusions = meGO_ensemble["bonded_exclusions"][molecule]
+        number_to_type = pd.Series(reduced_topology["sb_type"].to_numpy(), index=reduced_topology["number"].astype(int))
+        tmp_ex = pd.DataFrame(
+            {
+                "ai": number_to_type.reindex(exclusions["ai"]).astype(meGO_ensemble["sbtype_dtype"]).array,
+                "aj": number_to_type.reindex(exclusions["aj"]).astype(meGO_ensemble["sbtype_dtype"]).array,
+                "same_chain": True,
+                "1-4": pd.Categorical(exclusions["1-4"]),
+            }
+        )
         exclusion_bonds14 = pd.concat([exclusion_bonds14, tmp_ex], axis=0, sort=False, ignore_index=True)
 
         # Adding the c12 for 1-4 interactions
@@ -634,8 +864,8 @@ def generate_14_data(meGO_ensemble):
         pairs = pd.DataFrame()
         if meGO_ensemble["molecule_type_dict"][molecule] == "protein":
             pairs = topology.protein_LJ14(reduced_topology)
-            pairs["ai"] = pairs["ai"].map(type_atnum_dict).astype("category")
-            pairs["aj"] = pairs["aj"].map(type_atnum_dict).astype("category")
+            pairs["ai"] = pairs["ai"].map(type_atnum_dict).astype(meGO_ensemble["sbtype_dtype"])
+            pairs["aj"] = pairs["aj"].map(type_atnum_dict).astype(meGO_ensemble["sbtype_dtype"])
             pairs["rep"] = pairs["c12"]
             pairs["source"] = pairs["source"].astype("category")
             pairs["same_chain"] = True
@@ -643,20 +873,15 @@ def generate_14_data(meGO_ensemble):
         else:
             pairs["ai"] = meGO_ensemble["user_pairs"][molecule].ai.astype(str)
             pairs["aj"] = meGO_ensemble["user_pairs"][molecule].aj.astype(str)
-            pairs["ai"] = pairs["ai"].map(type_atnum_dict).astype("category")
-            pairs["aj"] = pairs["aj"].map(type_atnum_dict).astype("category")
-            nonprotein_c12 = []
-            for test in meGO_ensemble["user_pairs"][molecule].type:
-                if test is None:
-                    print(
-                        "\nERROR: you have 1-4 pairs defined in your reference topology without the associated C6/C12 values"
-                    )
-                    print("       user provided 1-4 pairs need to define also the C6/C12\n")
-                    exit()
-                nonprotein_c12.append(float(test.epsilon) * 4.184)
+            pairs["ai"] = pairs["ai"].map(type_atnum_dict).astype(meGO_ensemble["sbtype_dtype"])
+            pairs["aj"] = pairs["aj"].map(type_atnum_dict).astype(meGO_ensemble["sbtype_dtype"])
+            if meGO_ensemble["user_pairs"][molecule]["c12"].isna().any():
+                print("\nERROR: you have 1-4 pairs defined in your reference topology without the associated C6/C12 values")
+                print("       user provided 1-4 pairs need to define also the C6/C12\n")
+                exit()
             pairs["func"] = 1
             pairs["c6"] = 0.0
-            pairs["c12"] = nonprotein_c12
+            pairs["c12"] = meGO_ensemble["user_pairs"][molecule]["c12"].to_numpy()
             pairs["probability"] = 1.0
             pairs["rc_probability"] = 1.0
             pairs["source"] = pd.Series(["1-4"] * len(pairs), dtype="category")
@@ -677,9 +902,11 @@ def generate_14_data(meGO_ensemble):
     return pairs14, exclusion_bonds14
 
 
-def init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args):
-    # we cycle over train matrices to pair them with reference matrices and
-    # then we add 1-4 assignments and defaults c12s and concatenate everything
+def init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args, train_matrix_tuples=None):
+    # we cycle over train matrices (all of them unless a subset of train_matrix_tuples is given)
+    # to pair them with reference matrices and then we add 1-4 assignments and defaults c12s and concatenate everything
+    if train_matrix_tuples is None:
+        train_matrix_tuples = meGO_ensemble["train_matrix_tuples"]
     train_dataset = pd.DataFrame()
 
     td_fields = [
@@ -704,59 +931,102 @@ def init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args):
         "learned",
     ]
 
-    for name, ref_name in meGO_ensemble["train_matrix_tuples"]:
+    for name, ref_name in train_matrix_tuples:
         # sysname_train_intramat_1_1 <-> sysname_reference_intramat_1_1
         if ref_name not in matrices["reference_matrices"].keys():
             raise RuntimeError(
                 f'Encountered error while trying to find {ref_name} in reference matrices {matrices["reference_matrices"].keys()}'
             )
 
-        temp_merged = pd.merge(
-            matrices["train_matrices"][name],
-            matrices["reference_matrices"][ref_name],
-            left_index=True,
-            right_index=True,
-            how="outer",
-        )
+        train_grid = matrices["train_matrices"][name]
+        reference_grid = matrices["reference_matrices"][ref_name]
+        # training and reference grids of the same molecules share the axes, the learned cells are aligned by position
+        rows, cols = np.nonzero(train_grid["learned"])
 
         # This is a debug check to avoid data inconsistencies
-        if (np.abs(temp_merged["rc_cutoff"] - temp_merged["cutoff"])).max() > 0:
+        cutoff_difference = np.abs(reference_grid["cutoff"][rows, cols] - train_grid["cutoff"][rows, cols])
+        if len(cutoff_difference) and cutoff_difference.max() > 0:
+            inconsistent = cutoff_difference > 0
             print(
-                temp_merged[["ai", "aj", "rc_ai", "rc_aj", "source", "rc_source", "cutoff", "rc_cutoff"]]
-                .loc[(np.abs(temp_merged["rc_cutoff"] - temp_merged["cutoff"]) > 0)]
-                .to_string()
+                pd.DataFrame(
+                    {
+                        "ai": meGO_ensemble["sbtype_dtype"].categories[train_grid.atoms_ai[rows[inconsistent]]],
+                        "aj": meGO_ensemble["sbtype_dtype"].categories[train_grid.atoms_aj[cols[inconsistent]]],
+                        "source": train_grid.source,
+                        "rc_source": reference_grid.source,
+                        "cutoff": train_grid["cutoff"][rows, cols][inconsistent],
+                        "rc_cutoff": reference_grid["cutoff"][rows, cols][inconsistent],
+                    }
+                ).to_string()
             )
             exit(
                 "HERE SOMETHING BAD HAPPEND: There are inconsistent cutoff values between the MD and corresponding RC input data"
             )
 
         # This is a debug check to avoid data inconsistencies
-        if not temp_merged["rc_same_chain"].equals(temp_merged["rc_same_chain"]):
-            diff_indices = temp_merged.index[temp_merged["same_chain"] != temp_merged["rc_same_chain"]].tolist()
-            print(f"Difference found at indices: {diff_indices}")
+        if train_grid.same_chain != reference_grid.same_chain:
+            print(f"Difference found between {train_grid.source} and {reference_grid.source}")
             exit("HERE SOMETHING BAD HAPPEND: You are pairing intra and inter molecular training and reference data")
 
-        temp_merged = temp_merged[td_fields]
+        temp_merged = pd.DataFrame(
+            {
+                "molecule_name_ai": train_grid.molecule_name_ai,
+                "ai": pd.Categorical.from_codes(train_grid.atoms_ai[rows], dtype=meGO_ensemble["sbtype_dtype"]),
+                "molecule_name_aj": train_grid.molecule_name_aj,
+                "aj": pd.Categorical.from_codes(train_grid.atoms_aj[cols], dtype=meGO_ensemble["sbtype_dtype"]),
+                "same_chain": train_grid.same_chain,
+                "source": train_grid.source,
+                **train_grid.take(
+                    [
+                        "distance",
+                        "probability",
+                        "cutoff",
+                        "reference",
+                        "epsilon_0",
+                        "md_threshold",
+                        "rc_threshold",
+                        "limit_rc_att",
+                    ],
+                    rows,
+                    cols,
+                ),
+                **reference_grid.take(["epsilon_prior", "sigma_prior"], rows, cols),
+                "rc_distance": reference_grid["distance"][rows, cols],
+                "rc_probability": reference_grid["probability"][rows, cols],
+                "learned": True,
+            }
+        )
+        temp_merged = io.set_precision(temp_merged[td_fields], args.precision)
+        temp_merged["train_matrix"] = name
         train_dataset = pd.concat([train_dataset, temp_merged], axis=0, sort=False, ignore_index=True)
 
     train_dataset["molecule_name_ai"] = train_dataset["molecule_name_ai"].astype("category")
     train_dataset["molecule_name_aj"] = train_dataset["molecule_name_aj"].astype("category")
     train_dataset["source"] = train_dataset["source"].astype("category")
+    train_dataset["train_matrix"] = train_dataset["train_matrix"].astype("category")
 
     train_dataset = pd.merge(
-        pd.merge(
-            train_dataset,
-            pairs14[["ai", "aj", "same_chain", "rep"]],
-            how="left",
-            on=["ai", "aj", "same_chain"],
-        ),
-        exclusion_bonds14[["ai", "aj", "same_chain", "1-4"]],
+        train_dataset,
+        pairs14[["ai", "aj", "same_chain", "rep"]],
         how="left",
         on=["ai", "aj", "same_chain"],
     )
 
-    train_dataset["ai"] = train_dataset["ai"].astype("category")
-    train_dataset["aj"] = train_dataset["aj"].astype("category")
+    train_dataset["ai"] = train_dataset["ai"].astype(meGO_ensemble["sbtype_dtype"])
+    train_dataset["aj"] = train_dataset["aj"].astype(meGO_ensemble["sbtype_dtype"])
+
+    # the bonded exclusions (1_2_3 or 1_4) of the intramolecular contacts, looked up by their pair key
+    exclusion_keys = pair_keys.get_pair_keys(get_atom_ids(exclusion_bonds14["ai"]), get_atom_ids(exclusion_bonds14["aj"]))
+    exclusion_order = np.argsort(exclusion_keys)
+    exclusion_keys = exclusion_keys[exclusion_order]
+    exclusion_codes = exclusion_bonds14["1-4"].cat.codes.to_numpy()[exclusion_order]
+    positions, found = pair_keys.lookup(
+        pair_keys.get_pair_keys(get_atom_ids(train_dataset["ai"]), get_atom_ids(train_dataset["aj"])), exclusion_keys
+    )
+    found &= train_dataset["same_chain"].to_numpy(dtype=bool)
+    codes = np.full(len(train_dataset), -1, dtype=exclusion_codes.dtype)
+    codes[found] = exclusion_codes[positions[found]]
+    train_dataset["1-4"] = pd.Categorical.from_codes(codes, dtype=exclusion_bonds14["1-4"].dtype)
 
     # We remove from train the 0_1_2_3 intramolecolar interactions
     train_dataset = train_dataset[
@@ -775,49 +1045,33 @@ def init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args):
         type_to_c12_appo = {key: val for key, val in zip(custom_c12_dict.name, custom_c12_dict.c12)}
         type_to_c12.update(type_to_c12_appo)
 
-    type_ai_mapped = train_dataset["ai"].map(meGO_ensemble["sbtype_type_dict"])
-    type_aj_mapped = train_dataset["aj"].map(meGO_ensemble["sbtype_type_dict"])
-
     # set of interactions with parameters not resulting from the combination rule
-    # oxygen-oxygen repulsion
-    OO_mask = masking.create_linearized_mask(
-        type_ai_mapped.to_numpy(),
-        type_aj_mapped.to_numpy(),
-        [("O", "O"), ("OM", "OM"), ("O", "OM")],
-        symmetrize=True,
-    )
-
-    # hydrongen-oxygen attraction
-    HO_mask = masking.create_linearized_mask(
-        type_ai_mapped.to_numpy(),
-        type_aj_mapped.to_numpy(),
-        [("H", "O"), ("H", "OM"), ("H", "OA")],
-        symmetrize=True,
-    )
-
-    # oxygen-nitrogen repulsion (when not attractive)
-    ON_mask = masking.create_linearized_mask(
-        type_ai_mapped.to_numpy(),
-        type_aj_mapped.to_numpy(),
-        [
-            ("O", "N"),
-            ("OM", "N"),
-        ],
-        symmetrize=True,
+    special_pairs = {
+        # oxygen-oxygen repulsion
+        "OO": [("O", "O"), ("OM", "OM"), ("O", "OM")],
+        # hydrongen-oxygen attraction
+        "HO": [("H", "O"), ("H", "OM"), ("H", "OA")],
+        # oxygen-nitrogen repulsion (when not attractive)
+        "ON": [("O", "N"), ("OM", "N")],
+        # NL-NZ repulsion
+        "NN": [("NL", "NL"), ("NZ", "NZ"), ("NL", "NZ")],
+    }
+    # the types are encoded once per atom and the pairs of the dataset are looked up in a single table
+    vocabulary, (atom_type_code,) = masking.encode_types(meGO_ensemble["topology_dataframe"]["type"].to_numpy())
+    rule_table = masking.create_rule_table(vocabulary, special_pairs.values(), symmetrize=True)
+    special_masks = masking.get_rule_masks(
+        rule_table[atom_type_code[get_atom_ids(train_dataset["ai"])], atom_type_code[get_atom_ids(train_dataset["aj"])]],
+        special_pairs,
     )
+    OO_mask, HO_mask, ON_mask, NN_mask = (special_masks[rule] for rule in ["OO", "HO", "ON", "NN"])
 
     # hydrogen-hydrogen repulsion
     # Define condition where only ai or aj (but not both) starts with "H"
-    H_mask = train_dataset["ai"].str.startswith("H") ^ train_dataset["aj"].str.startswith("H")
-    HH_mask = train_dataset["ai"].str.startswith("H") & train_dataset["aj"].str.startswith("H")
-
-    # NL-NZ repulsion
-    NN_mask = masking.create_linearized_mask(
-        type_ai_mapped.to_numpy(),
-        type_aj_mapped.to_numpy(),
-        [("NL", "NL"), ("NZ", "NZ"), ("NL", "NZ")],
-        symmetrize=True,
-    )
+    atom_is_H = meGO_ensemble["topology_dataframe"]["sb_type"].str.startswith("H").to_numpy()
+    ai_is_H = atom_is_H[get_atom_ids(train_dataset["ai"])]
+    aj_is_H = atom_is_H[get_atom_ids(train_dataset["aj"])]
+    H_mask = ai_is_H ^ aj_is_H
+    HH_mask = ai_is_H & aj_is_H
 
     # default repulsive C12 (rep)
     pairwise_c12 = np.sqrt(
@@ -869,72 +1123,108 @@ def init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args):
     train_dataset.dropna(subset=["mg_sigma"], inplace=True)
     train_dataset = train_dataset.loc[train_dataset["rep"] > 0.0]
 
-    return train_dataset
+    return io.set_precision(train_dataset, args.precision)
+
+
+def get_MG_pairs(ai_ids, aj_ids, excluded_keys=None):
+    """
+    Returns all the pairs of atoms of ai_ids times aj_ids, with ai varying slowest as in itertools.product,
+    optionally without the pairs in excluded_keys.
 
+    Parameters
+    ----------
+    ai_ids, aj_ids : np.ndarray
+        The atom_ids of the two sets of atoms
+    excluded_keys : np.ndarray, optional
+        The sorted pair_keys of the atom_ids of the pairs not to generate
 
-def generate_MG_LJ(meGO_ensemble):
+    Returns
+    -------
+    ai, aj : np.ndarray
+        The atom_ids of the pairs
+    """
+    ai, aj = np.meshgrid(ai_ids, aj_ids, indexing="ij")
+    ai, aj = ai.ravel(), aj.ravel()
+    if excluded_keys is not None:
+        keep = ~pair_keys.isin(pair_keys.get_pair_keys(ai, aj), excluded_keys)
+        ai, aj = ai[keep], aj[keep]
+    return ai, aj
+
+
+def generate_MG_LJ(meGO_ensemble, learned_LJ=None):
     """
     The multi-eGO molten-globule force-field includes special repulsive and attractive interaction pairs like O-O, H-H, and O-H.
     TODO: define them by means of an external dictionary instead of hardcoding them. This dictionary should be used also from make_mat
     these are generate in the following
-    """
 
-    # TODO: unify the method to generate the combinations
+    The pairs are built on the atom_ids of the topology. If learned_LJ is given, the pairs that are learned
+    in it (in either order) are not generated, because generate_LJ would discard them anyway.
 
-    # OO in MG are repulsive (Ramachandran and negatively charged sidechains)
-    O_OM_sbtype = [
-        sbtype for sbtype, atomtype in meGO_ensemble["sbtype_type_dict"].items() if atomtype == "O" or atomtype == "OM"
-    ]
-    combinations = list(itertools.product(O_OM_sbtype, repeat=2))
-    OO_LJ = pd.DataFrame(combinations, columns=["ai", "aj"])
-    OO_LJ["c12"] = type_definitions.mg_OO_c12_rep
-    OO_LJ["c6"] = 0.0
-    OO_LJ["epsilon"] = -OO_LJ["c12"]
-    OO_LJ["sigma"] = OO_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    OO_LJ["mg_sigma"] = OO_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    OO_LJ["mg_epsilon"] = -OO_LJ["c12"]
-
-    # HH in MG are repulsive (Ramachandran)
-    H_H_sbtype = [sbtype for sbtype, atomtype in meGO_ensemble["sbtype_type_dict"].items() if atomtype == "H"]
-    combinations = list(itertools.product(H_H_sbtype, repeat=2))
-    HH_LJ = pd.DataFrame(combinations, columns=["ai", "aj"])
-    HH_LJ["c12"] = type_definitions.mg_HH_c12_rep
-    HH_LJ["c6"] = 0.0
-    HH_LJ["epsilon"] = -HH_LJ["c12"]
-    HH_LJ["sigma"] = HH_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    HH_LJ["mg_sigma"] = HH_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    HH_LJ["mg_epsilon"] = -HH_LJ["c12"]
-
-    # HO in MG are attractive (H-bonds)
-    O_OM_OA_sbtype = [
-        sbtype
-        for sbtype, atomtype in meGO_ensemble["sbtype_type_dict"].items()
-        if atomtype == "O" or atomtype == "OM" or atomtype == "OA"
-    ]
-    combinations = list(itertools.product(H_H_sbtype, O_OM_OA_sbtype)) + list(itertools.product(O_OM_OA_sbtype, H_H_sbtype))
-    HO_LJ = pd.DataFrame(combinations, columns=["ai", "aj"])
-    HO_LJ["c12"] = 4.0 * type_definitions.mg_eps_ch3 * type_definitions.mg_HO_sigma**12.0
-    HO_LJ["c6"] = 4.0 * type_definitions.mg_eps_ch3 * type_definitions.mg_HO_sigma**6.0
-    HO_LJ["epsilon"] = type_definitions.mg_eps_ch3
-    HO_LJ["sigma"] = type_definitions.mg_HO_sigma
-    HO_LJ["mg_sigma"] = type_definitions.mg_HO_sigma
-    HO_LJ["mg_epsilon"] = type_definitions.mg_eps_ch3
-
-    # NL/NZ in MG are repulsive (positevely charged sidechains and N-terminus)
-    NL_NZ_sbtype = [
-        sbtype for sbtype, atomtype in meGO_ensemble["sbtype_type_dict"].items() if atomtype == "NL" or atomtype == "NZ"
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        The meGO ensemble
+    learned_LJ : pd.DataFrame, optional
+        The contacts generated from the trainings, with ai, aj and learned
+
+    Returns
+    -------
+    rc_LJ : pd.DataFrame
+        The molten-globule interactions
+    """
+    atom_type = meGO_ensemble["topology_dataframe"]["type"].to_numpy()
+    atom_molecule = meGO_ensemble["topology_dataframe"]["molecule"].to_numpy()
+
+    excluded_keys = None
+    if learned_LJ is not None:
+        learned = learned_LJ.loc[learned_LJ["learned"] == 1]
+        ai, aj = get_atom_ids(learned["ai"]), get_atom_ids(learned["aj"])
+        excluded_keys = pair_keys.get_pair_set(np.concatenate([ai, aj]), np.concatenate([aj, ai]))
+
+    O_OM_ids = np.flatnonzero(np.isin(atom_type, ["O", "OM"]))
+    H_ids = np.flatnonzero(atom_type == "H")
+    O_OM_OA_ids = np.flatnonzero(np.isin(atom_type, ["O", "OM", "OA"]))
+    NL_NZ_ids = np.flatnonzero(np.isin(atom_type, ["NL", "NZ"]))
+
+    def repulsive(c12):
+        # c6, c12, epsilon, sigma
+        return 0.0, c12, -c12, c12 ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
+
+    HO_parameters = (
+        4.0 * type_definitions.mg_eps_ch3 * type_definitions.mg_HO_sigma**6.0,
+        4.0 * type_definitions.mg_eps_ch3 * type_definitions.mg_HO_sigma**12.0,
+        type_definitions.mg_eps_ch3,
+        type_definitions.mg_HO_sigma,
+    )
+    blocks = [
+        # OO in MG are repulsive (Ramachandran and negatively charged sidechains)
+        (O_OM_ids, O_OM_ids, repulsive(type_definitions.mg_OO_c12_rep)),
+        # HH in MG are repulsive (Ramachandran)
+        (H_ids, H_ids, repulsive(type_definitions.mg_HH_c12_rep)),
+        # HO in MG are attractive (H-bonds)
+        (H_ids, O_OM_OA_ids, HO_parameters),
+        (O_OM_OA_ids, H_ids, HO_parameters),
+        # NL/NZ in MG are repulsive (positevely charged sidechains and N-terminus)
+        (NL_NZ_ids, NL_NZ_ids, repulsive(type_definitions.mg_NN_c12_rep)),
     ]
-    combinations = list(itertools.product(NL_NZ_sbtype, repeat=2))
-    NN_LJ = pd.DataFrame(combinations, columns=["ai", "aj"])
-    NN_LJ["c12"] = type_definitions.mg_NN_c12_rep
-    NN_LJ["c6"] = 0.0
-    NN_LJ["epsilon"] = -NN_LJ["c12"]
-    NN_LJ["sigma"] = NN_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    NN_LJ["mg_sigma"] = NN_LJ["c12"] ** (1.0 / 12.0) / 2.0 ** (1.0 / 6.0)
-    NN_LJ["mg_epsilon"] = -NN_LJ["c12"]
-
-    # combine them:
-    rc_LJ = pd.concat([OO_LJ, HH_LJ, HO_LJ, NN_LJ], axis=0)
+    pairs = [get_MG_pairs(ai_ids, aj_ids, excluded_keys) for ai_ids, aj_ids, _ in blocks]
+    ai = np.concatenate([block_ai for block_ai, _ in pairs])
+    aj = np.concatenate([block_aj for _, block_aj in pairs])
+    sizes = [len(block_ai) for block_ai, _ in pairs]
+    c6, c12, epsilon, sigma = (np.repeat(values, sizes) for values in zip(*[parameters for _, _, parameters in blocks]))
+
+    rc_LJ = pd.DataFrame(
+        {
+            "ai": pd.Categorical.from_codes(ai, dtype=meGO_ensemble["sbtype_dtype"]),
+            "aj": pd.Categorical.from_codes(aj, dtype=meGO_ensemble["sbtype_dtype"]),
+            "c12": c12,
+            "c6": c6,
+            "epsilon": epsilon,
+            "sigma": sigma,
+            "mg_sigma": sigma,
+            "mg_epsilon": epsilon,
+        }
+    )
     rc_LJ["type"] = 1
     rc_LJ["same_chain"] = False
     rc_LJ["source"] = "mg"
@@ -946,13 +1236,8 @@ def generate_MG_LJ(meGO_ensemble):
     rc_LJ["md_threshold"] = 1.0
     rc_LJ["learned"] = 0
     rc_LJ["1-4"] = "1>4"
-    molecule_names_dictionary = {name.split("_", 1)[1]: name for name in meGO_ensemble["molecules_idx_sbtype_dictionary"]}
-    rc_LJ["molecule_name_ai"] = rc_LJ["ai"].apply(lambda x: "_".join(x.split("_")[1:-1])).map(molecule_names_dictionary)
-    rc_LJ["molecule_name_aj"] = rc_LJ["aj"].apply(lambda x: "_".join(x.split("_")[1:-1])).map(molecule_names_dictionary)
-    rc_LJ["ai"] = rc_LJ["ai"].astype("category")
-    rc_LJ["aj"] = rc_LJ["aj"].astype("category")
-    rc_LJ["molecule_name_ai"] = rc_LJ["molecule_name_ai"].astype("category")
-    rc_LJ["molecule_name_aj"] = rc_LJ["molecule_name_aj"].astype("category")
+    rc_LJ["molecule_name_ai"] = pd.Categorical(atom_molecule[ai])
+    rc_LJ["molecule_name_aj"] = pd.Categorical(atom_molecule[aj])
 
     return rc_LJ
 
@@ -981,39 +1266,52 @@ def set_sig_epsilon(meGO_LJ, parameters):
     consistent with the given probability and distance thresholds, maintaining the accuracy of simulations or calculations.
     """
 
+    # the columns can be stored in float32 (see --precision), the formulas are computed in float64
+    dtype = meGO_LJ["probability"].dtype
+    probability = np.asarray(meGO_LJ["probability"], dtype=np.float64)
+    rc_probability = np.maximum(
+        np.asarray(meGO_LJ["rc_probability"], dtype=np.float64), np.asarray(meGO_LJ["rc_threshold"], dtype=np.float64)
+    )
+    epsilon_prior = np.asarray(meGO_LJ["epsilon_prior"], dtype=np.float64)
+    positive_epsilon_prior = np.maximum(0.0, epsilon_prior)
+    limit_rc_att = np.asarray(meGO_LJ["limit_rc_att"], dtype=np.float64)
+    above_md_threshold = probability > np.asarray(meGO_LJ["md_threshold"], dtype=np.float64)
+
     # first: all contacts are set as for the prior model
     # these contacts are not considered as learned so can be overriden
-    meGO_LJ["learned"] = 0
-    meGO_LJ["epsilon"] = meGO_LJ["epsilon_prior"]
-    meGO_LJ["sigma"] = meGO_LJ["sigma_prior"]
+    epsilon = epsilon_prior
+    sigma = np.asarray(meGO_LJ["sigma_prior"], dtype=np.float64)
+    learned = np.zeros(len(probability), dtype=int)
 
     # Attractive interactions
     # These are defined only if the training probability is greater than MD_threshold and
     # by comparing them with RC_probabilities so that the resulting epsilon is between eps_min and eps_0
-    condition = (
-        meGO_LJ["probability"] > meGO_LJ["limit_rc_att"] * np.maximum(meGO_LJ["rc_probability"], meGO_LJ["rc_threshold"])
-    ) & (meGO_LJ["probability"] > meGO_LJ["md_threshold"])
-
-    meGO_LJ.loc[condition, "epsilon"] = np.maximum(0.0, meGO_LJ["epsilon_prior"]) - (
-        (meGO_LJ["epsilon_0"] - np.maximum(0.0, meGO_LJ["epsilon_prior"])) / np.log(meGO_LJ["rc_threshold"])
-    ) * (np.log(meGO_LJ["probability"] / (np.maximum(meGO_LJ["rc_probability"], meGO_LJ["rc_threshold"]))))
-    meGO_LJ.loc[condition, "learned"] = 1
-    meGO_LJ.loc[condition, "sigma"] = meGO_LJ["distance"] / 2.0 ** (1.0 / 6.0)
+    attractive = (probability > limit_rc_att * rc_probability) & above_md_threshold
+    with np.errstate(divide="ignore", invalid="ignore"):
+        attractive_epsilon = positive_epsilon_prior - (
+            (np.asarray(meGO_LJ["epsilon_0"], dtype=np.float64) - positive_epsilon_prior)
+            / np.log(np.asarray(meGO_LJ["rc_threshold"], dtype=np.float64))
+        ) * (np.log(probability / rc_probability))
+    epsilon = np.where(attractive, attractive_epsilon, epsilon)
+    sigma = np.where(attractive, np.asarray(meGO_LJ["distance"], dtype=np.float64) / 2.0 ** (1.0 / 6.0), sigma)
 
     # Not-attractive interactions
     # this is used only when MD_th < MD_p < limit_rc_att*RC_p
     # negative epsilon are used to identify non-attractive interactions
-    condition = (
-        meGO_LJ["probability"] <= meGO_LJ["limit_rc_att"] * np.maximum(meGO_LJ["rc_probability"], meGO_LJ["rc_threshold"])
-    ) & (meGO_LJ["probability"] > meGO_LJ["md_threshold"])
-    meGO_LJ.loc[condition, "epsilon"] = -meGO_LJ["rep"] * (
-        1.0 + (np.maximum(meGO_LJ["rc_probability"], meGO_LJ["rc_threshold"]) - meGO_LJ["probability"])
+    repulsive = (probability <= limit_rc_att * rc_probability) & above_md_threshold
+    epsilon = np.where(
+        repulsive, -np.asarray(meGO_LJ["rep"], dtype=np.float64) * (1.0 + (rc_probability - probability)), epsilon
     )
-    meGO_LJ.loc[condition, "learned"] = 1
+    learned[attractive | repulsive] = 1
     # for repulsive interaction we reset sigma to its effective value
     # this because when merging repulsive contacts from different sources what will matters
     # will be the repulsive strength that in this way is consistent
-    meGO_LJ.loc[(meGO_LJ["epsilon"] < 0.0), "sigma"] = (-meGO_LJ["epsilon"]) ** (1.0 / 12.0) / (2.0 ** (1.0 / 6.0))
+    with np.errstate(invalid="ignore"):
+        sigma = np.where(epsilon < 0.0, (-epsilon) ** (1.0 / 12.0) / (2.0 ** (1.0 / 6.0)), sigma)
+
+    meGO_LJ["learned"] = learned
+    meGO_LJ["epsilon"] = epsilon.astype(dtype)
+    meGO_LJ["sigma"] = sigma.astype(dtype)
 
     # clean NaN and zeros
     meGO_LJ.dropna(subset=["epsilon"], inplace=True)
@@ -1022,78 +1320,272 @@ def set_sig_epsilon(meGO_LJ, parameters):
     return meGO_LJ
 
 
-def apply_symmetries(meGO_ensemble, meGO_input, symmetry):
+def get_symmetry_index(meGO_ensemble, symmetry):
     """
-    Apply symmetries to the molecular ensemble.
+    Maps the atoms of the topology to their equivalent atoms according to the symmetry lines.
 
-    This function applies symmetries to the input molecular ensemble based on the provided symmetry parameters.
+    For each symmetry line (resname, atom_1, atom_2, ...) and for each pair of its atoms (atom_a, atom_b),
+    the atom atom_a of every residue resname is mapped to the atom atom_b of the same residue.
 
     Parameters
     ----------
     meGO_ensemble : dict
-        A dictionary containing relevant meGO data such as interactions and statistics within the molecular ensemble.
-    meGO_input : pd.DataFrame
-        Input DataFrame containing molecular ensemble data.
-    parameters : dict
-        A dictionary containing parameters parsed from the command-line, including symmetry information.
+        The meGO ensemble, with the topology_dataframe and the sbtype_dtype
+    symmetry : list of list of str
+        The symmetry lines, as parsed by io.read_symmetry_file
 
     Returns
     -------
-    pd.DataFrame
-        A pandas DataFrame containing the molecular ensemble data with applied symmetries.
+    symmetry_index : dict
+        {(resname, atom_a, atom_b): np.ndarray} for each atom_id the atom_id of its equivalent atom, -1 if none
     """
-
-    # Step 1: Initialize variables
+    sbtypes = meGO_ensemble["sbtype_dtype"].categories.astype(str)
     dict_sbtype_to_resname = meGO_ensemble["topology_dataframe"].set_index("sb_type")["resname"].to_dict()
-    mglj_resn_ai = meGO_input["ai"].map(dict_sbtype_to_resname)
-    mglj_resn_aj = meGO_input["aj"].map(dict_sbtype_to_resname)
-    df_list = []
+    resnames = sbtypes.map(dict_sbtype_to_resname).to_numpy()
+    split = sbtypes.str.split("_", n=1)
+    names = split.str[0].to_numpy()
+    suffixes = split.str[1].to_numpy()
 
-    # Step 2: Loop through symmetries and permutations
+    symmetry_index = {}
     for sym in symmetry:
         if not sym:
             continue
-        # Pre-filter the DataFrame to speed up when there are multiple equivalent atoms
-        meGO_filtered = meGO_input[(mglj_resn_ai == sym[0]) | (mglj_resn_aj == sym[0])]
-        mgf_resn_ai = meGO_filtered["ai"].map(dict_sbtype_to_resname)
-        mgf_resn_aj = meGO_filtered["aj"].map(dict_sbtype_to_resname)
-        for atypes in itertools.permutations(sym[1:]):
-            t_df_ai = meGO_filtered[meGO_filtered["ai"].str.startswith(f"{atypes[0]}_") & (mgf_resn_ai == sym[0])]
-            t_df_aj = meGO_filtered[meGO_filtered["aj"].str.startswith(f"{atypes[0]}_") & (mgf_resn_aj == sym[0])]
-            t_df_ai.loc[:, "ai"] = t_df_ai["ai"].str.replace(r"^(.*?)_", atypes[1] + "_", regex=True)
-            t_df_aj.loc[:, "aj"] = t_df_aj["aj"].str.replace(r"^(.*?)_", atypes[1] + "_", regex=True)
-            df_list.extend([t_df_ai, t_df_aj])
+        for atom_a, atom_b in itertools.permutations(sym[1:], 2):
+            if (sym[0], atom_a, atom_b) in symmetry_index:
+                continue
+            source = np.flatnonzero((names == atom_a) & (resnames == sym[0]))
+            equivalent = np.full(len(sbtypes), -1, dtype=np.int64)
+            equivalent[source] = sbtypes.get_indexer(atom_b + "_" + suffixes[source])
+            symmetry_index[(sym[0], atom_a, atom_b)] = equivalent
 
-    # Step 3: Concatenate DataFrames
-    df_tmp = pd.concat(df_list, ignore_index=True)
-    df_list = []
-    df_tmp.drop_duplicates(inplace=True)
+    return symmetry_index
 
-    # Step 4: Filter and concatenate again
-    df_resn_ai = df_tmp["ai"].map(dict_sbtype_to_resname)
-    df_resn_aj = df_tmp["aj"].map(dict_sbtype_to_resname)
 
+def expand_symmetries(meGO_input, symmetry, symmetry_index):
+    """
+    Returns a copy of the rows of meGO_input for each atom, ai or aj, that has an equivalent atom,
+    with that atom replaced by its equivalent atom.
+
+    Parameters
+    ----------
+    meGO_input : pd.DataFrame
+        The contacts, with ai and aj categorical with the sbtype_dtype
+    symmetry : list of list of str
+        The symmetry lines
+    symmetry_index : dict
+        The equivalent atoms, as returned by get_symmetry_index
+
+    Returns
+    -------
+    pd.DataFrame
+        The expanded contacts, without duplicates
+    """
+    codes = {"ai": meGO_input["ai"].cat.codes.to_numpy(), "aj": meGO_input["aj"].cat.codes.to_numpy()}
+    rows, new_codes = [], {"ai": [], "aj": []}
+    # same order as the permutations of the symmetry lines, so that drop_duplicates keeps the same rows
     for sym in symmetry:
         if not sym:
             continue
-        # Pre-filter the DataFrame to speed up when there are multiple equivalent atoms
-        df_tmp_filt = df_tmp[(df_resn_ai == sym[0]) | (df_resn_aj == sym[0])]
-        df_resn_ai_f = df_tmp_filt["ai"].map(dict_sbtype_to_resname)
-        df_resn_aj_f = df_tmp_filt["aj"].map(dict_sbtype_to_resname)
         for atypes in itertools.permutations(sym[1:]):
-            t_df_ai = df_tmp_filt[df_tmp_filt["ai"].str.startswith(f"{atypes[0]}_") & (df_resn_ai_f == sym[0])]
-            t_df_aj = df_tmp_filt[df_tmp_filt["aj"].str.startswith(f"{atypes[0]}_") & (df_resn_aj_f == sym[0])]
-            t_df_ai.loc[:, "ai"] = t_df_ai["ai"].str.replace(r"^(.*?)_", atypes[1] + "_", regex=True)
-            t_df_aj.loc[:, "aj"] = t_df_aj["aj"].str.replace(r"^(.*?)_", atypes[1] + "_", regex=True)
-            df_list.extend([t_df_ai, t_df_aj])
-
-    # Step 5: Concatenate and remove duplicates
-    tmp_df = pd.concat(df_list + [df_tmp], ignore_index=True)
+            equivalent = symmetry_index[(sym[0], atypes[0], atypes[1])]
+            for column, other in [("ai", "aj"), ("aj", "ai")]:
+                replaced = equivalent[codes[column]]
+                selected = np.flatnonzero(replaced >= 0)
+                rows.append(selected)
+                new_codes[column].append(replaced[selected])
+                new_codes[other].append(codes[other][selected])
+
+    rows = np.concatenate(rows)
+    expanded = meGO_input.iloc[rows].reset_index(drop=True)
+    for column in ["ai", "aj"]:
+        expanded[column] = pd.Categorical.from_codes(np.concatenate(new_codes[column]), dtype=meGO_input[column].dtype)
+    expanded.drop_duplicates(inplace=True)
+
+    return expanded
+
+
+def apply_symmetries(meGO_ensemble, meGO_input, symmetry):
+    """
+    Apply symmetries to the molecular ensemble.
+
+    The contacts of the equivalent atoms are generated replacing ai, aj and then both of them by their
+    equivalent atoms, using an index of the equivalent atom_ids built once from the topology.
+
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        A dictionary containing relevant meGO data such as interactions and statistics within the molecular ensemble.
+    meGO_input : pd.DataFrame
+        Input DataFrame containing molecular ensemble data, with ai and aj categorical with the sbtype_dtype.
+    symmetry : list of list of str
+        The symmetry lines, as parsed by io.read_symmetry_file.
+
+    Returns
+    -------
+    pd.DataFrame
+        A pandas DataFrame containing the contacts generated by the symmetries.
+    """
+    symmetry_index = get_symmetry_index(meGO_ensemble, symmetry)
+    meGO_input = meGO_input.astype({"ai": meGO_ensemble["sbtype_dtype"], "aj": meGO_ensemble["sbtype_dtype"]})
+
+    # replace one of the two atoms
+    df_tmp = expand_symmetries(meGO_input, symmetry, symmetry_index)
+    # replace the other one too
+    tmp_df = pd.concat([expand_symmetries(df_tmp, symmetry, symmetry_index), df_tmp], ignore_index=True)
     tmp_df.drop_duplicates(inplace=True)
 
     return tmp_df
 
 
+def get_new_group(*columns):
+    """
+    Returns a boolean mask that is True on the first row of each run of equal values of the columns.
+    """
+    new_group = np.zeros(len(columns[0]), dtype=bool)
+    new_group[:1] = True
+    for column in columns:
+        new_group[1:] |= column[1:] != column[:-1]
+    return new_group
+
+
+def select_best_contacts(meGO_LJ):
+    """
+    Keeps one contact for each ai, aj and same_chain, choosing:
+    1. learned over not learned
+    2. attractive over repulsive
+    3. shorter over longer
+    4. stronger over weaker attractive
+    5. weaker over stronger repulsive
+
+    The priority is sorted in a single np.lexsort, which is stable so that ties are resolved
+    in the order of meGO_LJ as with sort_values.
+
+    Parameters
+    ----------
+    meGO_LJ : pd.DataFrame
+        The contacts, with ai and aj categorical with the sbtype_dtype
+
+    Returns
+    -------
+    pd.DataFrame
+        The selected contacts, sorted by ai, aj and same_chain
+    """
+    ai = get_atom_ids(meGO_LJ["ai"])
+    aj = get_atom_ids(meGO_LJ["aj"])
+    same_chain = meGO_LJ["same_chain"].to_numpy(dtype=bool)
+    epsilon = meGO_LJ["epsilon"].to_numpy()
+    # learned first, then attractive first
+    priority = -3 * meGO_LJ["learned"].to_numpy(dtype=np.int64) - np.sign(epsilon).astype(np.int64)
+
+    order = np.lexsort((-epsilon, meGO_LJ["sigma"].to_numpy(), priority, same_chain, aj, ai))
+    best = order[get_new_group(ai[order], aj[order], same_chain[order])]
+    return meGO_LJ.iloc[best]
+
+
+def split_LJ_14(meGO_LJ):
+    """
+    Splits the contacts selected by select_best_contacts in the contacts of the force-field, one per pair
+    prioritising intermolecular interactions, and the contacts to be added as pairs, prioritising intramolecular
+    interactions, for the pairs that have an intermolecular contact.
+
+    Parameters
+    ----------
+    meGO_LJ : pd.DataFrame
+        The contacts, sorted by ai, aj and same_chain with at most one contact for each
+
+    Returns
+    -------
+    meGO_LJ : pd.DataFrame
+        The contacts of the force-field
+    meGO_LJ_14 : pd.DataFrame
+        The contacts of the pairs
+    """
+    ai = get_atom_ids(meGO_LJ["ai"])
+    aj = get_atom_ids(meGO_LJ["aj"])
+    first = get_new_group(ai, aj)
+    # the intermolecular contact is the first of each pair, the intramolecular one the last
+    last = np.append(first[1:], True)
+    first, last = np.flatnonzero(first), np.flatnonzero(last)
+    has_inter = ~meGO_LJ["same_chain"].to_numpy(dtype=bool)[first]
+
+    meGO_LJ_14 = meGO_LJ.iloc[last[has_inter]].reset_index(drop=True)
+    return meGO_LJ.iloc[first], meGO_LJ_14
+
+
+def learn_LJ(train_dataset, parameters):
+    """
+    Learns the sigma and epsilon of the learned contacts of a training dataset.
+
+    Parameters
+    ----------
+    train_dataset : pd.DataFrame
+        DataFrame containing training dataset information for LJ interactions.
+    parameters : dict
+        Contains parameters parsed from the command-line.
+
+    Returns
+    -------
+    meGO_LJ : pd.DataFrame
+        The learned contacts with the LEARNED_LJ_FIELDS, one for each contact of each training.
+    """
+    # copy only learned contacts
+    meGO_LJ = train_dataset[train_dataset["learned"]].copy()
+    # generate attractive and repulsive interactions
+    return set_sig_epsilon(meGO_LJ, parameters)[LEARNED_LJ_FIELDS]
+
+
+def stream_LJ_datasets(meGO_ensemble, pairs14, exclusion_bonds14, args, custom_dict):
+    """
+    Learns each training as soon as its contact matrix is read, keeping only the best contact of each
+    ai, aj and same_chain, so that a single training matrix is in memory at a time instead of all of them.
+
+    The contacts of each training are selected together with the best ones of the previous trainings by
+    select_best_contacts, which keeps the first of equivalent contacts, so that the result is the same as
+    selecting the contacts of all the trainings at once.
+
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        The meGO ensemble, see init_meGO_ensemble
+    pairs14 : pd.DataFrame
+        The 1-4 pairs, see generate_14_data
+    exclusion_bonds14 : pd.DataFrame
+        The bonded exclusions, see generate_14_data
+    args : argparse.Namespace
+        The parsed parameters, with a single sweep point
+    custom_dict : dict
+        The custom atom names dictionary
+
+    Returns
+    -------
+    meGO_ensemble : dict
+        The meGO ensemble, see init_meGO_matrices
+    meGO_LJ : pd.DataFrame
+        The best learned contact of each ai, aj and same_chain, to be passed to merge_LJ
+    """
+    best_LJ = None
+
+    def learn_training(matrices, name, ref_name):
+        nonlocal best_LJ
+        with perf.stage("learn") as record:
+            train_dataset = init_LJ_datasets(meGO_ensemble, matrices, pairs14, exclusion_bonds14, args, [(name, ref_name)])
+            meGO_LJ = learn_LJ(train_dataset, args)
+            del train_dataset
+            # the contacts already selected come first so that they are kept on ties, as for a single selection
+            if best_LJ is not None:
+                meGO_LJ = pd.concat([best_LJ, meGO_LJ], ignore_index=True)
+            best_LJ = select_best_contacts(meGO_LJ)
+            record["rows"] = len(best_LJ)
+
+    meGO_ensemble, _ = init_meGO_matrices(meGO_ensemble, args, custom_dict, learn_training=learn_training)
+
+    meGO_LJ = best_LJ.reset_index(drop=True)
+    # the categories of the string columns differ between trainings and are lost when concatenated
+    for column in ["molecule_name_ai", "molecule_name_aj", "source"]:
+        meGO_LJ[column] = meGO_LJ[column].astype("category")
+    return meGO_ensemble, meGO_LJ
+
+
 def generate_LJ(meGO_ensemble, train_dataset, parameters):
     """
     Generates LJ (Lennard-Jones) interactions and associated atomic contacts within a molecular ensemble.
@@ -1115,230 +1607,196 @@ def generate_LJ(meGO_ensemble, train_dataset, parameters):
         Contains 1-4 atomic contacts associated with LJ parameters and statistics.
     """
 
-    st = time.time()
     print("\t- Set sigma and epsilon")
-    # copy only learned contacts
-    meGO_LJ = train_dataset[train_dataset["learned"]].copy()
-    # meGO needed fields
-    needed_fields = [
-        "molecule_name_ai",
-        "ai",
-        "molecule_name_aj",
-        "aj",
-        "probability",
-        "same_chain",
-        "source",
-        "reference",
-        "rc_probability",
-        "sigma",
-        "epsilon",
-        "1-4",
-        "rep",
-        "sigma_prior",
-        "epsilon_prior",
-        "mg_sigma",
-        "mg_epsilon",
-        "md_threshold",
-        "rc_threshold",
-        "learned",
-    ]
+    with perf.stage("set_sig_epsilon") as record:
+        meGO_LJ = learn_LJ(train_dataset, parameters)
+        record["rows"] = len(meGO_LJ)
 
-    # generate attractive and repulsive interactions
-    meGO_LJ = set_sig_epsilon(meGO_LJ, parameters)[needed_fields]
+    print("\t- Done in:", record["wall_time"], "seconds")
 
-    et = time.time()
-    elapsed_time = et - st
-    st = et
-    print("\t- Done in:", elapsed_time, "seconds")
+    return merge_LJ(meGO_ensemble, meGO_LJ, parameters)
+
+
+def merge_LJ(meGO_ensemble, meGO_LJ, parameters):
+    """
+    Merges the learned contacts of the trainings and of the symmetric atoms and adds the default interactions.
+
+    Parameters
+    ----------
+    meGO_ensemble : dict
+        Contains relevant meGO data such as interactions and statistics within the molecular ensemble.
+    meGO_LJ : pd.DataFrame
+        The learned contacts, see learn_LJ and stream_LJ_datasets.
+    parameters : dict
+        Contains parameters parsed from the command-line.
+
+    Returns
+    -------
+    meGO_LJ : pd.DataFrame
+        Contains non-bonded atomic contacts associated with LJ parameters and statistics.
+    meGO_LJ_14 : pd.DataFrame
+        Contains 1-4 atomic contacts associated with LJ parameters and statistics.
+    """
 
     # apply symmetries for equivalent atoms
     if parameters.symmetry:
         print("\t- Apply the defined atomic symmetries")
-        meGO_LJ_sym = apply_symmetries(meGO_ensemble, meGO_LJ, parameters.symmetry)
-        meGO_LJ = pd.concat([meGO_LJ, meGO_LJ_sym])
-        meGO_LJ.reset_index(inplace=True)
-        et = time.time()
-        elapsed_time = et - st
-        st = et
-        print("\t- Done in:", elapsed_time, "seconds")
+        with perf.stage("symmetry") as record:
+            meGO_LJ_sym = apply_symmetries(meGO_ensemble, meGO_LJ, parameters.symmetry)
+            meGO_LJ = pd.concat([meGO_LJ, meGO_LJ_sym])
+            meGO_LJ.reset_index(inplace=True)
+            record["rows"] = len(meGO_LJ_sym)
+        print("\t- Done in:", record["wall_time"], "seconds")
 
     print("\t- Merging multiple states (training, symmetries, inter/intra)")
-
-    # Merging of multiple simulations:
-    # 1. learned over not learned
-    # 2. attractive over repulsive
-    # 3. shorter over longer
-    # 4. stronger over weaker attractive
-    # 5. wearker over stronger repulsive
-    meGO_LJ["type"] = np.sign(meGO_LJ["epsilon"])
-    meGO_LJ.sort_values(
-        by=["ai", "aj", "same_chain", "learned", "type", "sigma", "epsilon"],
-        ascending=[True, True, True, False, False, True, False],
-        inplace=True,
-    )
-    # Cleaning the duplicates
-    meGO_LJ = meGO_LJ.drop_duplicates(subset=["ai", "aj", "same_chain"], keep="first")
-
-    # now we can remove contacts with default c6/c12 becasue these
-    # are uninformative and predefined. This also allow to replace them with contact learned
-    # by either intra/inter training. We cannot remove 1-4 interactions.
-    # we should not remove default interactions in the window of 2 neighor AA to
-    # avoid replacing them with unwanted interactions
-
-    # this removes attractive/repulsive contacts that are default
-    meGO_LJ = meGO_LJ.loc[
-        ~(
-            (meGO_LJ["epsilon"] > 0)
-            & (meGO_LJ["mg_epsilon"] > 0)
-            & ((abs(meGO_LJ["epsilon"] - meGO_LJ["mg_epsilon"]) / meGO_LJ["mg_epsilon"]) < parameters.relative_c12d)
-            & ((abs(meGO_LJ["sigma"] - meGO_LJ["mg_sigma"]) / meGO_LJ["mg_sigma"]) < parameters.relative_c12d)
-            & (meGO_LJ["1-4"] == "1>4")
-        )
-    ]
-    meGO_LJ = meGO_LJ.loc[
-        ~(
-            (meGO_LJ["epsilon"] < 0)
-            & (meGO_LJ["mg_epsilon"] < 0)
-            & ((abs(meGO_LJ["epsilon"] - meGO_LJ["mg_epsilon"]) / abs(meGO_LJ["mg_epsilon"])) < parameters.relative_c12d)
-            & (meGO_LJ["1-4"] == "1>4")
-            & ~(
-                (abs(meGO_LJ["ai"].apply(get_residue_number) - meGO_LJ["aj"].apply(get_residue_number)) < 3)
-                & (meGO_LJ["same_chain"])
-            )
-        )
-    ]
-
-    meGO_LJ = meGO_LJ[needed_fields]
-
-    # now is a good time to acquire statistics on the parameters
-    # this should be done per interaction pair (cycling over all molecules combinations) and inter/intra/intra_d
-    stat_str = io.print_stats(meGO_LJ)
-
-    # Here we create a copy of contacts to be added in pairs-exclusion section in topol.top.
-    meGO_LJ_14 = meGO_LJ.copy()
-
-    # Sorting the pairs prioritising intermolecular interactions
-    meGO_LJ.sort_values(by=["ai", "aj", "same_chain"], ascending=[True, True, True], inplace=True)
-    meGO_LJ = meGO_LJ.drop_duplicates(subset=["ai", "aj"], keep="first")
-
-    # Pairs prioritise intramolecular interactions
-    meGO_LJ_14.sort_values(by=["ai", "aj", "same_chain"], ascending=[True, True, False], inplace=True)
-    meGO_LJ_14 = meGO_LJ_14.drop_duplicates(subset=["ai", "aj"], keep="first")
-
-    # where meGO_LJ_14 is the same of meGO_LJ and same_chain is yes that the line can be dropped
-    # that is I want to keep lines with same_chain no or lines with same chain yes that have same_chain no in meGO_LJ
-    test = pd.merge(meGO_LJ_14, meGO_LJ, how="right", on=["ai", "aj"])
-    meGO_LJ_14 = test.loc[(~test["same_chain_x"]) | ((test["same_chain_x"]) & (~test["same_chain_y"]))]
-    # removes columns ending with _y
-    meGO_LJ_14 = meGO_LJ_14.loc[:, ~meGO_LJ_14.columns.str.endswith("_y")]
-    # rename the columns _x
-    meGO_LJ_14.columns = meGO_LJ_14.columns.str.rstrip("_x")
-
-    # remove intermolecular interactions across molecules from meGO_LJ_14
-    meGO_LJ_14 = meGO_LJ_14[meGO_LJ_14["molecule_name_ai"] == meGO_LJ_14["molecule_name_aj"]]
-
-    # copy 1-4 interactions into meGO_LJ_14
-    copy14 = meGO_LJ.loc[(meGO_LJ["1-4"] == "1_4")]
-    meGO_LJ_14 = pd.concat([meGO_LJ_14, copy14], axis=0, sort=False, ignore_index=True)
-    # remove them from the default force-field
-    meGO_LJ = meGO_LJ.loc[(meGO_LJ["1-4"] != "1_4")]
-
-    if not parameters.single_molecule:
-        # neighbour intramolecular interactions are not used as intermolecular
-        copy_intra = meGO_LJ.loc[
-            (meGO_LJ["same_chain"])
-            & (abs(meGO_LJ["ai"].apply(get_residue_number) - meGO_LJ["aj"].apply(get_residue_number)) < 3)
-        ]
-        meGO_LJ_14 = pd.concat([meGO_LJ_14, copy_intra], axis=0, sort=False, ignore_index=True)
-        # remove them from the default force-field
+    with perf.stage("merge") as record:
+        # Merging of multiple simulations:
+        # 1. learned over not learned
+        # 2. attractive over repulsive
+        # 3. shorter over longer
+        # 4. stronger over weaker attractive
+        # 5. wearker over stronger repulsive
+        meGO_LJ = select_best_contacts(meGO_LJ)
+
+        # now we can remove contacts with default c6/c12 becasue these
+        # are uninformative and predefined. This also allow to replace them with contact learned
+        # by either intra/inter training. We cannot remove 1-4 interactions.
+        # we should not remove default interactions in the window of 2 neighor AA to
+        # avoid replacing them with unwanted interactions
+
+        # this removes attractive/repulsive contacts that are default
         meGO_LJ = meGO_LJ.loc[
             ~(
-                (meGO_LJ["same_chain"])
-                & (abs(meGO_LJ["ai"].apply(get_residue_number) - meGO_LJ["aj"].apply(get_residue_number)) < 3)
+                (meGO_LJ["epsilon"] > 0)
+                & (meGO_LJ["mg_epsilon"] > 0)
+                & ((abs(meGO_LJ["epsilon"] - meGO_LJ["mg_epsilon"]) / meGO_LJ["mg_epsilon"]) < parameters.relative_c12d)
+                & ((abs(meGO_LJ["sigma"] - meGO_LJ["mg_sigma"]) / meGO_LJ["mg_sigma"]) < parameters.relative_c12d)
+                & (meGO_LJ["1-4"] == "1>4")
             )
         ]
-
-    # now we can decide to keep intermolecular interactions as intramolecular ones
-    # to do this is enough to remove it from meGO_LJ_14, in this way the value used for the contact is the one meGO_LJ
-    if not parameters.force_split:
-        # Filter rows in meGO_LJ_14 that meet the condition
-        meGO_LJ_14 = meGO_LJ_14.loc[
+        meGO_LJ = meGO_LJ.loc[
             ~(
-                (~meGO_LJ_14["same_chain"])
-                & (meGO_LJ_14["molecule_name_ai"] == meGO_LJ_14["molecule_name_aj"])
-                & (meGO_LJ_14["epsilon"] > 0.0)
-                & (abs(meGO_LJ_14["ai"].apply(get_residue_number) - meGO_LJ_14["aj"].apply(get_residue_number)) > 2)
+                (meGO_LJ["epsilon"] < 0)
+                & (meGO_LJ["mg_epsilon"] < 0)
+                & ((abs(meGO_LJ["epsilon"] - meGO_LJ["mg_epsilon"]) / abs(meGO_LJ["mg_epsilon"])) < parameters.relative_c12d)
+                & (meGO_LJ["1-4"] == "1>4")
+                & ~((get_residue_distance(meGO_ensemble, meGO_LJ) < 3) & (meGO_LJ["same_chain"]))
             )
         ]
-    else:
-        split_ii = meGO_LJ.loc[(meGO_LJ["same_chain"])]
-        # move the intramolecular interaction in the topology
-        meGO_LJ_14 = pd.concat([meGO_LJ_14, split_ii], axis=0, sort=False, ignore_index=True)
+
+        meGO_LJ = meGO_LJ[LEARNED_LJ_FIELDS]
+
+        # now is a good time to acquire statistics on the parameters
+        # this should be done per interaction pair (cycling over all molecules combinations) and inter/intra/intra_d
+        stat_str = io.print_stats(meGO_LJ)
+
+        # Here we create a copy of contacts to be added in pairs-exclusion section in topol.top.
+        # meGO_LJ keeps intermolecular interactions, pairs prioritise intramolecular interactions,
+        # a pair with only intramolecular interactions is not added to meGO_LJ_14
+        meGO_LJ, meGO_LJ_14 = split_LJ_14(meGO_LJ)
+
+        # remove intermolecular interactions across molecules from meGO_LJ_14
+        meGO_LJ_14 = meGO_LJ_14[meGO_LJ_14["molecule_name_ai"] == meGO_LJ_14["molecule_name_aj"]]
+
+        # copy 1-4 interactions into meGO_LJ_14
+        copy14 = meGO_LJ.loc[(meGO_LJ["1-4"] == "1_4")]
+        meGO_LJ_14 = pd.concat([meGO_LJ_14, copy14], axis=0, sort=False, ignore_index=True)
         # remove them from the default force-field
-        meGO_LJ = meGO_LJ.loc[(~meGO_LJ["same_chain"])]
+        meGO_LJ = meGO_LJ.loc[(meGO_LJ["1-4"] != "1_4")]
+
+        if not parameters.single_molecule:
+            # neighbour intramolecular interactions are not used as intermolecular
+            neighbour_intra = (meGO_LJ["same_chain"]) & (get_residue_distance(meGO_ensemble, meGO_LJ) < 3)
+            copy_intra = meGO_LJ.loc[neighbour_intra]
+            meGO_LJ_14 = pd.concat([meGO_LJ_14, copy_intra], axis=0, sort=False, ignore_index=True)
+            # remove them from the default force-field
+            meGO_LJ = meGO_LJ.loc[~neighbour_intra]
+
+        # now we can decide to keep intermolecular interactions as intramolecular ones
+        # to do this is enough to remove it from meGO_LJ_14, in this way the value used for the contact is the one meGO_LJ
+        if not parameters.force_split:
+            # Filter rows in meGO_LJ_14 that meet the condition
+            meGO_LJ_14 = meGO_LJ_14.loc[
+                ~(
+                    (~meGO_LJ_14["same_chain"])
+                    & (meGO_LJ_14["molecule_name_ai"] == meGO_LJ_14["molecule_name_aj"])
+                    & (meGO_LJ_14["epsilon"] > 0.0)
+                    & (get_residue_distance(meGO_ensemble, meGO_LJ_14) > 2)
+                )
+            ]
+        else:
+            split_ii = meGO_LJ.loc[(meGO_LJ["same_chain"])]
+            # move the intramolecular interaction in the topology
+            meGO_LJ_14 = pd.concat([meGO_LJ_14, split_ii], axis=0, sort=False, ignore_index=True)
+            # remove them from the default force-field
+            meGO_LJ = meGO_LJ.loc[(~meGO_LJ["same_chain"])]
+
+        # Now is time to add masked default interactions for pairs
+        # that have not been learned in any other way
+        needed_fields = [
+            "molecule_name_ai",
+            "ai",
+            "molecule_name_aj",
+            "aj",
+            "probability",
+            "same_chain",
+            "source",
+            "reference",
+            "rc_probability",
+            "sigma",
+            "epsilon",
+            "1-4",
+            "rep",
+            "mg_sigma",
+            "mg_epsilon",
+            "md_threshold",
+            "rc_threshold",
+            "learned",
+        ]
+        with perf.stage("mg defaults") as mg_record:
+            basic_LJ = generate_MG_LJ(meGO_ensemble, meGO_LJ)[needed_fields]
+            mg_record["rows"] = len(basic_LJ)
+        meGO_LJ = pd.concat([meGO_LJ, basic_LJ])
+
+        # make meGO_LJ fully symmetric
+        # Create inverse DataFrame
+        inverse_meGO_LJ = meGO_LJ.rename(
+            columns={"ai": "aj", "aj": "ai", "molecule_name_ai": "molecule_name_aj", "molecule_name_aj": "molecule_name_ai"}
+        ).copy()
+        # Concatenate original and inverse DataFrames
+        # Here we have a fully symmetric matrix for both intra/intersame/intercross
+        meGO_LJ = pd.concat([meGO_LJ, inverse_meGO_LJ], axis=0, sort=False, ignore_index=True)
+
+        meGO_LJ["ai"] = meGO_LJ["ai"].astype(meGO_ensemble["sbtype_dtype"])
+        meGO_LJ["aj"] = meGO_LJ["aj"].astype(meGO_ensemble["sbtype_dtype"])
+        meGO_LJ["molecule_name_ai"] = meGO_LJ["molecule_name_ai"].astype("category")
+        meGO_LJ["molecule_name_aj"] = meGO_LJ["molecule_name_aj"].astype("category")
+
+        # Sorting the pairs prioritising learned interactions
+        meGO_LJ.sort_values(by=["ai", "aj", "same_chain", "learned"], ascending=[True, True, True, False], inplace=True)
+        # Cleaning the duplicates, that is that we retained a not learned interaction only if it is unique
+        # first we remove duplicated masked interactions
+        meGO_LJ = meGO_LJ.drop_duplicates(subset=["ai", "aj", "same_chain", "learned"], keep="first")
+        meGO_LJ = meGO_LJ.loc[(~(meGO_LJ.duplicated(subset=["ai", "aj"], keep=False)) | (meGO_LJ["learned"] == 1))]
+
+        # we are ready to finalize the setup
+        # Calculate c6 and c12 for meGO_LJ
+        meGO_LJ["c6"] = np.where(meGO_LJ["epsilon"] < 0.0, 0.0, 4 * meGO_LJ["epsilon"] * (meGO_LJ["sigma"] ** 6))
+
+        meGO_LJ["c12"] = np.where(
+            meGO_LJ["epsilon"] < 0.0, -meGO_LJ["epsilon"], 4 * meGO_LJ["epsilon"] * (meGO_LJ["sigma"] ** 12)
+        )
 
-    # Now is time to add masked default interactions for pairs
-    # that have not been learned in any other way
-    needed_fields = [
-        "molecule_name_ai",
-        "ai",
-        "molecule_name_aj",
-        "aj",
-        "probability",
-        "same_chain",
-        "source",
-        "reference",
-        "rc_probability",
-        "sigma",
-        "epsilon",
-        "1-4",
-        "rep",
-        "mg_sigma",
-        "mg_epsilon",
-        "md_threshold",
-        "rc_threshold",
-        "learned",
-    ]
-    basic_LJ = generate_MG_LJ(meGO_ensemble)[needed_fields]
-    meGO_LJ = pd.concat([meGO_LJ, basic_LJ])
-
-    # make meGO_LJ fully symmetric
-    # Create inverse DataFrame
-    inverse_meGO_LJ = meGO_LJ.rename(
-        columns={"ai": "aj", "aj": "ai", "molecule_name_ai": "molecule_name_aj", "molecule_name_aj": "molecule_name_ai"}
-    ).copy()
-    # Concatenate original and inverse DataFrames
-    # Here we have a fully symmetric matrix for both intra/intersame/intercross
-    meGO_LJ = pd.concat([meGO_LJ, inverse_meGO_LJ], axis=0, sort=False, ignore_index=True)
-
-    meGO_LJ["ai"] = meGO_LJ["ai"].astype("category")
-    meGO_LJ["aj"] = meGO_LJ["aj"].astype("category")
-    meGO_LJ["molecule_name_ai"] = meGO_LJ["molecule_name_ai"].astype("category")
-    meGO_LJ["molecule_name_aj"] = meGO_LJ["molecule_name_aj"].astype("category")
-
-    # Sorting the pairs prioritising learned interactions
-    meGO_LJ.sort_values(by=["ai", "aj", "same_chain", "learned"], ascending=[True, True, True, False], inplace=True)
-    # Cleaning the duplicates, that is that we retained a not learned interaction only if it is unique
-    # first we remove duplicated masked interactions
-    meGO_LJ = meGO_LJ.drop_duplicates(subset=["ai", "aj", "same_chain", "learned"], keep="first")
-    meGO_LJ = meGO_LJ.loc[(~(meGO_LJ.duplicated(subset=["ai", "aj"], keep=False)) | (meGO_LJ["learned"] == 1))]
-
-    # we are ready to finalize the setup
-    # Calculate c6 and c12 for meGO_LJ
-    meGO_LJ["c6"] = np.where(meGO_LJ["epsilon"] < 0.0, 0.0, 4 * meGO_LJ["epsilon"] * (meGO_LJ["sigma"] ** 6))
-
-    meGO_LJ["c12"] = np.where(meGO_LJ["epsilon"] < 0.0, -meGO_LJ["epsilon"], 4 * meGO_LJ["epsilon"] * (meGO_LJ["sigma"] ** 12))
-
-    # Calculate c6 and c12 for meGO_LJ_14
-    meGO_LJ_14["c6"] = np.where(meGO_LJ_14["epsilon"] < 0.0, 0.0, 4 * meGO_LJ_14["epsilon"] * (meGO_LJ_14["sigma"] ** 6))
-
-    meGO_LJ_14["c12"] = np.where(
-        meGO_LJ_14["epsilon"] < 0.0, -meGO_LJ_14["epsilon"], 4 * meGO_LJ_14["epsilon"] * (meGO_LJ_14["sigma"] ** 12)
-    )
+        # Calculate c6 and c12 for meGO_LJ_14
+        meGO_LJ_14["c6"] = np.where(meGO_LJ_14["epsilon"] < 0.0, 0.0, 4 * meGO_LJ_14["epsilon"] * (meGO_LJ_14["sigma"] ** 6))
 
-    et = time.time()
-    elapsed_time = et - st
-    print("\t- Done in:", elapsed_time, "seconds")
+        meGO_LJ_14["c12"] = np.where(
+            meGO_LJ_14["epsilon"] < 0.0, -meGO_LJ_14["epsilon"], 4 * meGO_LJ_14["epsilon"] * (meGO_LJ_14["sigma"] ** 12)
+        )
+
+        record["rows"] = len(meGO_LJ)
+
+    print("\t- Done in:", record["wall_time"], "seconds")
 
     return meGO_LJ, meGO_LJ_14, stat_str
 
@@ -1346,8 +1804,9 @@ def generate_LJ(meGO_ensemble, train_dataset, parameters):
 def sort_LJ(meGO_ensemble, meGO_LJ):
     # Add or modify columns in the original DataFrame
     meGO_LJ["type"] = 1
-    meGO_LJ["number_ai"] = meGO_LJ["ai"].map(meGO_ensemble["sbtype_number_dict"]).astype(int)
-    meGO_LJ["number_aj"] = meGO_LJ["aj"].map(meGO_ensemble["sbtype_number_dict"]).astype(int)
+    atom_number = meGO_ensemble["topology_dataframe"]["number"].astype(int).to_numpy()
+    meGO_LJ["number_ai"] = atom_number[get_atom_ids(meGO_LJ["ai"])]
+    meGO_LJ["number_aj"] = atom_number[get_atom_ids(meGO_LJ["aj"])]
 
     # Filter and explicitly create a copy to avoid the warning
     meGO_LJ = meGO_LJ[(meGO_LJ["ai"].cat.codes <= meGO_LJ["aj"].cat.codes)].copy()
@@ -1446,8 +1905,63 @@ def sort_LJ(meGO_ensemble, meGO_LJ):
     return meGO_LJ
 
 
-def get_residue_number(s):
-    return int(s.split("_")[-1])
+def get_local_window_pairs(residue_number, window=2):
+    """
+    Returns all the pairs of atoms whose residue numbers differ by at most window.
+
+    The atoms are stably sorted by residue number and each atom is paired with the following ones
+    in the window, so that the pairs are ordered as in a two-pointer scan of the sorted atoms.
+
+    Parameters
+    ----------
+    residue_number : np.ndarray
+        The residue number of each atom
+    window : int
+        The largest difference of the residue numbers
+
+    Returns
+    -------
+    ai, aj : np.ndarray
+        The positions of the atoms of each pair in residue_number
+    """
+    order = np.argsort(residue_number, kind="stable")
+    sorted_residue = residue_number[order]
+    # the atoms after each atom and within the window
+    counts = np.searchsorted(sorted_residue, sorted_residue + window, side="right") - np.arange(1, len(order) + 1)
+    ai = np.repeat(np.arange(len(order)), counts)
+    aj = ai + 1 + np.arange(len(ai)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return order[ai], order[aj]
+
+
+def get_mg_window_c12(atom_type, rc_c12, ai, aj):
+    """
+    Returns the c12 of the molten-globule pairs of the local window: the geometric mean of the rc_c12 of the atoms,
+    except for the O-O, H-H, NL/NZ-NL/NZ and O-N repulsions, looked up in a table by the class of the atom types.
+
+    Parameters
+    ----------
+    atom_type : np.ndarray
+        The type of each atom
+    rc_c12 : np.ndarray
+        The rc_c12 of each atom
+    ai, aj : np.ndarray
+        The positions of the atoms of each pair
+
+    Returns
+    -------
+    c12 : np.ndarray
+        The c12 of each pair
+    """
+    type_class = {"O": 1, "OM": 1, "H": 2, "NL": 3, "NZ": 3, "N": 4}
+    c12_table = np.full((5, 5), np.nan)
+    c12_table[1, 1] = type_definitions.mg_OO_c12_rep
+    c12_table[2, 2] = type_definitions.mg_HH_c12_rep
+    c12_table[3, 3] = type_definitions.mg_NN_c12_rep
+    c12_table[1, 4] = c12_table[4, 1] = type_definitions.mg_ON_c12_rep
+
+    atom_class = np.array([type_class.get(t, 0) for t in atom_type], dtype=np.int64)
+    special_c12 = c12_table[atom_class[ai], atom_class[aj]]
+    return np.where(np.isnan(special_c12), np.sqrt(rc_c12[ai] * rc_c12[aj]), special_c12)
 
 
 def make_pairs_exclusion_topology(meGO_ensemble, meGO_LJ_14, args):
@@ -1480,6 +1994,7 @@ def make_pairs_exclusion_topology(meGO_ensemble, meGO_LJ_14, args):
                     "type",
                     "resname",
                     "molecule_type",
+                    "rc_c12",
                 ]
             ]
             .copy()
@@ -1489,100 +2004,29 @@ def make_pairs_exclusion_topology(meGO_ensemble, meGO_LJ_14, args):
         reduced_topology["resnum"] = reduced_topology["resnum"].astype(int)
 
         atnum_type_dict = reduced_topology.set_index("sb_type")["number"].to_dict()
-        resnum_type_dict = reduced_topology.set_index("sb_type")["resnum"].to_dict()
 
-        # Building the exclusion bonded list
-        # exclusion_bonds are all the interactions within 3 bonds
-        # p14 are specifically the interactions at exactly 3 bonds
-        exclusion_bonds, p14 = topology.get_14_interaction_list(reduced_topology, bond_pair)
+        # The exclusion bonded list contains all the interactions within 3 bonds,
+        # those at exactly 3 bonds are marked as 1_4
+        exclusions = meGO_ensemble["bonded_exclusions"][molecule]
+        exclusion_bonds = pair_keys.get_pair_set(exclusions["ai"], exclusions["aj"])
+        p14 = pair_keys.get_pair_set(*exclusions.loc[exclusions["1-4"] == "1_4", ["ai", "aj"]].to_numpy().T)
 
         pairs = pd.DataFrame()
         # in the case of the MG prior we need to remove interactions in a window of 2 residues
         if args.egos == "mg":
-            # Create a list of tuples (sbtype, residue_number)
-            sbtype_with_residue = [(sbtype, resnum_type_dict[sbtype]) for sbtype in reduced_topology["sb_type"]]
-            # Sort the list by residue numbers
-            sbtype_with_residue.sort(key=lambda x: x[1])
-            # Initialize a list to hold the filtered combinations
-            filtered_combinations = []
-            # Use two pointers to find valid pairs
-            n = len(sbtype_with_residue)
-            for i in range(n):
-                j = i + 1  # Start with the current sbtype
-                # Find the range of valid sbtypes
-                while j < n and abs(sbtype_with_residue[j][1] - sbtype_with_residue[i][1]) <= 2:
-                    filtered_combinations.append((sbtype_with_residue[i][0], sbtype_with_residue[j][0]))
-                    j += 1
-
-            # Filter out invalid combinations
-            valid_combinations = [
-                (ai, aj)
-                for ai, aj in filtered_combinations
-                # this is to remove all interaction of H with the rest exept for O, OM, and OA
-                if not (
-                    (
-                        meGO_ensemble["sbtype_type_dict"][ai] == "H"
-                        and meGO_ensemble["sbtype_type_dict"][aj] not in {"H", "O", "OM", "OA"}
-                    )
-                    or (
-                        meGO_ensemble["sbtype_type_dict"][aj] == "H"
-                        and meGO_ensemble["sbtype_type_dict"][ai] not in {"H", "O", "OM", "OA"}
-                    )
-                )
-            ]
+            atom_type = reduced_topology["type"].to_numpy()
+            ai, aj = get_local_window_pairs(reduced_topology["resnum"].to_numpy())
+            # this is to remove all interaction of H with the rest exept for O, OM, and OA
+            is_H = atom_type == "H"
+            is_H_O = np.isin(atom_type, ["H", "O", "OM", "OA"])
+            valid = ~((is_H[ai] & ~is_H_O[aj]) | (is_H[aj] & ~is_H_O[ai]))
+            ai, aj = ai[valid], aj[valid]
 
             # Create a DataFrame from the filtered combinations
-            df = pd.DataFrame(valid_combinations, columns=["ai", "aj"])
+            sb_type = reduced_topology["sb_type"].to_numpy()
+            df = pd.DataFrame({"ai": sb_type[ai], "aj": sb_type[aj]})
             df["c6"] = 0.0
-            df["c12"] = np.sqrt(
-                df["ai"].map(meGO_ensemble["sbtype_c12_dict"]) * df["aj"].map(meGO_ensemble["sbtype_c12_dict"])
-            )
-            df.loc[
-                (
-                    (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "OM")
-                    | (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "O")
-                )
-                & (
-                    (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "OM")
-                    | (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "O")
-                ),
-                "c12",
-            ] = type_definitions.mg_OO_c12_rep
-            df.loc[
-                ((df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "H"))
-                & ((df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "H")),
-                "c12",
-            ] = type_definitions.mg_HH_c12_rep
-            df.loc[
-                (
-                    (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "NL")
-                    | (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "NZ")
-                )
-                & (
-                    (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "NL")
-                    | (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "NZ")
-                ),
-                "c12",
-            ] = type_definitions.mg_NN_c12_rep
-
-            df.loc[
-                (
-                    (
-                        (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "OM")
-                        | (df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "O")
-                    )
-                    & ((df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "N"))
-                )
-                | (
-                    ((df["ai"].map(meGO_ensemble["sbtype_type_dict"]) == "N"))
-                    & (
-                        (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "OM")
-                        | (df["aj"].map(meGO_ensemble["sbtype_type_dict"]) == "O")
-                    )
-                ),
-                "c12",
-            ] = type_definitions.mg_ON_c12_rep
-
+            df["c12"] = get_mg_window_c12(atom_type, reduced_topology["rc_c12"].to_numpy(), ai, aj)
             df["same_chain"] = True
             df["probability"] = 1.0
             df["rc_probability"] = 1.0
@@ -1590,14 +2034,11 @@ def make_pairs_exclusion_topology(meGO_ensemble, meGO_LJ_14, args):
             df["rep"] = df["c12"]
             df["1-4"] = "1>4"
             # The exclusion list was made based on the atom number
-            df["check"] = df["ai"].map(atnum_type_dict).astype(str) + "_" + df["aj"].map(atnum_type_dict).astype(str)
+            number = reduced_topology["number"].astype(int).to_numpy()
+            check = pair_keys.get_pair_keys(number[ai], number[aj])
             # Here the drop the contacts which are already defined by GROMACS, including the eventual 1-4 exclusion defined in the LJ_df
-            df["remove"] = ""
-            df.loc[(df["check"].isin(exclusion_bonds)), "remove"] = "Yes"
-            df.loc[(df["check"].isin(p14) & (df["same_chain"])), "remove"] = "Yes"
-            mask = df.remove == "Yes"
+            mask = pair_keys.isin(check, exclusion_bonds) | (pair_keys.isin(check, p14) & df["same_chain"].to_numpy())
             df = df[~mask]
-            df.drop(columns=["check", "remove"], inplace=True)
             pairs = pd.concat([meGO_LJ_14, df], axis=0, sort=False, ignore_index=True)
         elif args.egos == "production" and not meGO_LJ_14.empty:
             mol_ai = f"{idx}_{molecule}"
@@ -1620,57 +2061,30 @@ def make_pairs_exclusion_topology(meGO_ensemble, meGO_LJ_14, args):
             # Intermolecular interactions are excluded
             # this need to be the default repulsion if within two residue
             if not pairs.empty:
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) < 3),
-                    "c6",
-                ] = 0.0
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) < 3),
-                    "c12",
-                ] = pairs["rep"]
+                residue_distance = get_residue_distance(meGO_ensemble, pairs)
+                neighbours = (~pairs["same_chain"]) & (residue_distance < 3)
+                pairs.loc[neighbours, "c6"] = 0.0
+                pairs.loc[neighbours, "c12"] = pairs["rep"]
                 # else it should be default mg
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) > 2)
-                    & (pairs["mg_epsilon"] < 0.0),
-                    "c6",
-                ] = 0.0
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) > 2)
-                    & (pairs["mg_epsilon"] < 0.0),
-                    "c12",
-                ] = -pairs["mg_epsilon"]
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) > 2)
-                    & (pairs["mg_epsilon"] > 0.0),
-                    "c6",
-                ] = (
-                    4 * pairs["mg_epsilon"] * (pairs["mg_sigma"] ** 6)
-                )
-                pairs.loc[
-                    (~pairs["same_chain"])
-                    & (abs(pairs["ai"].apply(get_residue_number) - pairs["aj"].apply(get_residue_number)) > 2)
-                    & (pairs["mg_epsilon"] > 0.0),
-                    "c12",
-                ] = (
-                    4 * pairs["mg_epsilon"] * (pairs["mg_sigma"] ** 12)
-                )
+                repulsive = (~pairs["same_chain"]) & (residue_distance > 2) & (pairs["mg_epsilon"] < 0.0)
+                pairs.loc[repulsive, "c6"] = 0.0
+                pairs.loc[repulsive, "c12"] = -pairs["mg_epsilon"]
+                attractive = (~pairs["same_chain"]) & (residue_distance > 2) & (pairs["mg_epsilon"] > 0.0)
+                pairs.loc[attractive, "c6"] = 4 * pairs["mg_epsilon"] * (pairs["mg_sigma"] ** 6)
+                pairs.loc[attractive, "c12"] = 4 * pairs["mg_epsilon"] * (pairs["mg_sigma"] ** 12)
 
         # now we are ready to finalize
         if not pairs.empty:
             # The exclusion list was made based on the atom number
             pairs["ai"] = pairs["ai"].map(atnum_type_dict)
             pairs["aj"] = pairs["aj"].map(atnum_type_dict)
-            pairs["check"] = pairs["ai"].astype(str) + "_" + pairs["aj"].astype(str)
+            # atom numbers start from 1, the atoms of other molecules (NaN) become 0 and match no exclusion
+            check = pair_keys.get_pair_keys(
+                np.nan_to_num(pd.to_numeric(pairs["ai"]).to_numpy(dtype=float), nan=0),
+                np.nan_to_num(pd.to_numeric(pairs["aj"]).to_numpy(dtype=float), nan=0),
+            )
             # Here the drop the contacts which are already defined by GROMACS, including the eventual 1-4 exclusion defined in the LJ_pairs
-            pairs["remove"] = ""
-            pairs.loc[(pairs["check"].isin(exclusion_bonds)), "remove"] = "Yes"
-            pairs.loc[(pairs["check"].isin(p14) & (pairs["same_chain"])), "remove"] = "No"
-            mask = pairs.remove == "Yes"
+            mask = pair_keys.isin(check, exclusion_bonds) & ~(pair_keys.isin(check, p14) & pairs["same_chain"].to_numpy())
             pairs = pairs[~mask]
             # finalize
             pairs["func"] = 1
@@ -1,3 +1,6 @@
+from . import cache
+from . import contact_grid
+
 import numpy as np
 import pandas as pd
 import glob
@@ -5,6 +8,11 @@ import os
 import yaml
 import git
 import time
+import copy
+import itertools
+import concurrent.futures
+import hashlib
+import json
 
 # import sys
 import re
@@ -179,6 +187,53 @@ def combine_configurations(yml, args, args_dict):
     return args
 
 
+def get_sweep_arguments(args):
+    """
+    Expands the sweep options into one set of parameters per output model.
+
+    Each combination of epsilon_sweep, p_to_learn_sweep and relative_c12d_sweep is returned as a
+    copy of args in which the swept values replace epsilon (of every reference), p_to_learn and
+    relative_c12d. The explicit_name of each copy is extended with the swept values so that each
+    model is written in its own output directory.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        The parsed parameters
+
+    Returns
+    -------
+    sweep_args : list of argparse.Namespace
+        The parameters of each sweep point, [args] if no sweep was requested
+    """
+    if not (args.epsilon_sweep or args.p_to_learn_sweep or args.relative_c12d_sweep):
+        return [args]
+
+    sweep_args = []
+    for epsilon, p_to_learn, relative_c12d in itertools.product(
+        args.epsilon_sweep or [None],
+        args.p_to_learn_sweep or [args.p_to_learn],
+        args.relative_c12d_sweep or [args.relative_c12d],
+    ):
+        point = copy.deepcopy(args)
+        name = args.explicit_name if args.explicit_name else args.egos
+        if epsilon is not None:
+            point.epsilon = epsilon
+            for ref in point.input_refs:
+                ref["epsilon"] = epsilon
+            name += f"_e{epsilon}"
+        if args.p_to_learn_sweep:
+            point.p_to_learn = p_to_learn
+            name += f"_p{p_to_learn}"
+        if args.relative_c12d_sweep:
+            point.relative_c12d = relative_c12d
+            name += f"_c12d{relative_c12d}"
+        point.explicit_name = name
+        sweep_args.append(point)
+
+    return sweep_args
+
+
 def strip_gz_h5_suffix(filename):
     """
     Remove the '.gz' suffix from a filename if it ends with '.gz'.
@@ -200,6 +255,9 @@ def strip_gz_h5_suffix(filename):
     if filename.endswith(".h5"):
         return filename[:-3]
 
+    if filename.endswith(".mm"):
+        return filename[:-3]
+
     return filename
 
 
@@ -252,23 +310,34 @@ def check_matrix_compatibility(input_path):
     if common_files:
         raise ValueError(f"Error: Some files have both gz and hdf5 versions: {common_files}")
 
+    # the dense memory-mapped version can not be present together with any other
+    stripped_matrix_paths_mm_set = set(map(strip_gz_h5_suffix, glob.glob(f"{input_path}.ndx.mm")))
+    for other_format, other_set in [
+        ("text", matrix_paths_set),
+        ("gz", stripped_matrix_paths_gz_set),
+        ("hdf5", stripped_matrix_paths_h5_set),
+    ]:
+        common_files = other_set.intersection(stripped_matrix_paths_mm_set)
+        if common_files:
+            raise ValueError(f"Error: Some files have both {other_format} and mm versions: {common_files}")
+
 
 def check_mat_name(mat_name, ref):
     # Check name of matrix is either intramat_X_X or intermat_X_Y
     pattern = r"^(intra|inter)mat_\d+_\d+$"
     if not re.match(pattern, mat_name):
         raise ValueError(
-            f"Wrong input matrix format {mat_name} in reference {ref}. \nContact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5) or intermat_X_Y.ndx(.gz/.h5)"
+            f"Wrong input matrix format {mat_name} in reference {ref}. \nContact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5/.mm) or intermat_X_Y.ndx(.gz/.h5/.mm)"
         )
 
 
 def check_mat_extension(extension, ref):
     # pattern = r"^ndx(\.gz)?(\.h5)?$"
     # checks the extension of matrix name is either none or, .ndx(.gz/.h5)
-    pattern = r"^(|\.ndx(\.gz|\.h5)?)$"
+    pattern = r"^(|\.ndx(\.gz|\.h5|\.mm)?)$"
     if not re.match(pattern, extension):
         raise ValueError(
-            f"Wrong input matrix format extension: {extension} in reference {ref}. \nContact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5) or intermat_X_Y.ndx(.gz/.h5)"
+            f"Wrong input matrix format extension: {extension} in reference {ref}. \nContact matrix file(s) must be named as intramat_X_X.ndx(.gz/.h5/.mm) or intermat_X_Y.ndx(.gz/.h5/.mm)"
         )
 
 
@@ -378,12 +447,193 @@ def parse_symmetry_list(symmetry_list):
     return symmetry
 
 
-def read_molecular_contacts(path, ensemble_molecules_idx_sbtype_dictionary, simulation, h5=False):
+# number of rows of a contact matrix read and filtered at a time
+CONTACT_MATRIX_CHUNKSIZE = 1000000
+
+
+def is_heavy_atom(sbtypes):
     """
-    Reads intra-/intermat files to determine molecular contact statistics.
+    Returns the mask of the sb_types that are part of multi-eGO, that is all but the hydrogens other than the polar "H".
+    """
+    atoms = sbtypes.str.split("_").str[0]
+    return ~(atoms.str.startswith("H") & (atoms != "H"))
+
+
+class ContactMatrixFilter:
+    """
+    Selects, while a contact matrix is read, the rows that are used by multi-eGO, so that the others are
+    never kept in memory: rows involving atoms that are not part of multi-eGO (see is_heavy_atom) and,
+    when learned_only is set, rows not flagged as learned.
+
+    Parameters
+    ----------
+    molecules_idx_sbtype_dictionary : dict
+        {molecule: {atom index: sb_type}} of the topology of the simulation the matrix comes from
+    learned_only : bool
+        Whether to keep only the rows flagged as learned
+    """
+
+    def __init__(self, molecules_idx_sbtype_dictionary, learned_only=False):
+        self.heavy_atoms = {}
+        for molecule, idx_sbtype in molecules_idx_sbtype_dictionary.items():
+            indices = pd.Index(list(idx_sbtype.keys()), dtype=str)
+            heavy = is_heavy_atom(pd.Index(list(idx_sbtype.values()), dtype=str))
+            self.heavy_atoms[molecule.split("_", 1)[0]] = indices[heavy]
+        self.learned_only = learned_only
+        # identifies the selection in the matrix cache
+        self.key = hashlib.sha256(
+            repr((sorted((k, list(v)) for k, v in self.heavy_atoms.items()), learned_only)).encode()
+        ).hexdigest()
+
+    def atom_mask(self, molecule, atoms):
+        heavy_atoms = self.heavy_atoms.get(str(molecule))
+        if heavy_atoms is None:
+            # unknown molecules are reported when the matrix is compared with the topology
+            return np.ones(len(atoms), dtype=bool)
+        return atoms.cat.categories.astype(str).isin(heavy_atoms)[atoms.cat.codes.to_numpy()]
+
+    def __call__(self, chunk):
+        """
+        Returns the mask of the rows of chunk to keep.
+        """
+        if chunk.empty:
+            return np.ones(0, dtype=bool)
+        mask = self.atom_mask(chunk["molecule_name_ai"].iloc[0], chunk["ai"])
+        mask &= self.atom_mask(chunk["molecule_name_aj"].iloc[0], chunk["aj"])
+        if self.learned_only:
+            mask &= chunk["learned"].to_numpy()
+        return mask
+
+
+def validate_contact_matrix(contact_matrix):
+    """
+    Checks that the probabilities, distances and cutoffs of (a chunk of) a contact matrix are valid.
+    """
+    # Validation checks using `query` for more efficient conditional filtering
+    if contact_matrix.query("probability < 0 or probability > 1").shape[0] > 0:
+        raise ValueError("ERROR: Probabilities should be between 0 and 1.")
+
+    if contact_matrix.query("distance < 0 or distance > cutoff").shape[0] > 0:
+        raise ValueError("ERROR: Distances should be between 0 and cutoff.")
+
+    if contact_matrix.query("cutoff < 0").shape[0] > 0:
+        raise ValueError("ERROR: Cutoff values cannot be negative.")
+
+    # Check for NaN or infinite values in critical columns
+    if contact_matrix[["probability", "distance", "cutoff"]].isnull().any().any():
+        raise ValueError("ERROR: The matrix contains NaN values.")
+
+    if np.isinf(contact_matrix[["probability", "distance", "cutoff"]].values).any():
+        raise ValueError("ERROR: The matrix contains INF values.")
+
+
+def concat_contact_matrix_chunks(chunks):
+    """
+    Concatenates chunks of a contact matrix, the categories of the categorical columns are merged.
+    """
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    return pd.DataFrame(
+        {
+            col: (
+                pd.api.types.union_categoricals([chunk[col] for chunk in chunks])
+                if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)
+                else np.concatenate([chunk[col].to_numpy() for chunk in chunks])
+            )
+            for col in chunks[0].columns
+        }
+    )
+
+
+# identifies the memory-mapped dense contact matrix format (.ndx.mm)
+DENSE_MATRIX_MAGIC = b"MEGOMM01"
+# the arrays of a dense matrix start at multiples of the page size, so that they can be mapped independently
+DENSE_MATRIX_ALIGNMENT = 4096
+DENSE_MATRIX_ARRAYS = {"distance": "<f8", "probability": "<f8", "cutoff": "<f8", "learned": "|u1"}
+
+
+def write_dense_contact_matrix(path, contact_matrix):
+    """
+    Writes an intra-/intermat in the memory-mapped dense format (.ndx.mm): a small JSON header followed by
+    distance, probability, cutoff and learned stored as len_ai x len_aj arrays, where row i and column j
+    are the atoms with index i + 1 and j + 1. The matrix must contain every pair of atoms exactly once.
+    The matrix is validated here, as dense matrices are used without being read.
+
+    Parameters
+    ----------
+    path : str
+        The output file
+    contact_matrix : pd.DataFrame
+        The contact matrix with the columns of the .ndx format
+    """
+    if contact_matrix["molecule_name_ai"].nunique() != 1 or contact_matrix["molecule_name_aj"].nunique() != 1:
+        raise ValueError(f"ERROR: {path} can contain a single pair of molecules.")
+    ai = contact_matrix["ai"].astype(int).to_numpy() - 1
+    aj = contact_matrix["aj"].astype(int).to_numpy() - 1
+    shape = (int(ai.max()) + 1, int(aj.max()) + 1)
+    cells = np.ravel_multi_index((ai, aj), shape)
+    if len(cells) != shape[0] * shape[1] or len(np.unique(cells)) != len(cells):
+        raise ValueError(f"ERROR: the contact matrix written to {path} must contain all the {shape[0]}x{shape[1]} pairs once.")
+    validate_contact_matrix(contact_matrix)
+
+    header = {
+        "molecule_name_ai": str(contact_matrix["molecule_name_ai"].iloc[0]),
+        "molecule_name_aj": str(contact_matrix["molecule_name_aj"].iloc[0]),
+        "shape": shape,
+        "arrays": {},
+    }
+    offset = DENSE_MATRIX_ALIGNMENT
+    for name, dtype in DENSE_MATRIX_ARRAYS.items():
+        header["arrays"][name] = {"dtype": dtype, "offset": offset}
+        size = shape[0] * shape[1] * np.dtype(dtype).itemsize
+        offset += -(-size // DENSE_MATRIX_ALIGNMENT) * DENSE_MATRIX_ALIGNMENT
+    header_bytes = json.dumps(header).encode()
+    if len(DENSE_MATRIX_MAGIC) + 8 + len(header_bytes) > DENSE_MATRIX_ALIGNMENT:
+        raise ValueError(f"ERROR: the header of {path} is too large.")
+
+    with open(path, "wb") as f:
+        f.write(DENSE_MATRIX_MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, dtype in DENSE_MATRIX_ARRAYS.items():
+            values = np.zeros(shape[0] * shape[1], dtype=dtype)
+            values[cells] = contact_matrix[name].to_numpy().astype(dtype)
+            f.seek(header["arrays"][name]["offset"])
+            values.tofile(f)
+        f.truncate(offset)
+
+
+def open_dense_contact_matrix(path):
+    """
+    Maps a contact matrix in the memory-mapped dense format (see write_dense_contact_matrix) without reading it.
+
+    Returns
+    -------
+    header : dict
+        The molecule names and the shape of the matrix
+    arrays : dict
+        {name: read-only np.memmap of shape header["shape"]} for distance, probability, cutoff and learned
+    """
+    with open(path, "rb") as f:
+        if f.read(len(DENSE_MATRIX_MAGIC)) != DENSE_MATRIX_MAGIC:
+            raise ValueError(f"ERROR: {path} is not a dense contact matrix.")
+        header_size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_size).decode())
+
+    shape = tuple(header["shape"])
+    arrays = {
+        name: np.memmap(path, dtype=array["dtype"], mode="r", offset=array["offset"], shape=shape)
+        for name, array in header["arrays"].items()
+    }
+    return header, arrays
+
+
+def read_contact_matrix_file(path, h5=False, row_filter=None, chunksize=CONTACT_MATRIX_CHUNKSIZE):
+    """
+    Reads and validates an intra-/intermat file (.ndx, .ndx.gz or .ndx.h5) as written by make_mat.
+    The file is read in chunks of chunksize rows, each chunk is validated and only the rows selected
+    by row_filter (see ContactMatrixFilter) are kept.
     """
-    print("\t\t-", f"Reading {path}")
-    st = time.time()
     # Define column names and data types directly during read
     col_names = ["molecule_name_ai", "ai", "molecule_name_aj", "aj", "distance", "probability", "cutoff", "learned"]
     col_types = {
@@ -397,34 +647,172 @@ def read_molecular_contacts(path, ensemble_molecules_idx_sbtype_dictionary, simu
         "learned": "Int64",  # Allows for integer with NaNs, which can be cast later
     }
 
-    contact_matrix = pd.DataFrame()
+    chunks = []
+    n_rows = 0
+
+    def process(chunk):
+        nonlocal n_rows
+        # text files written without the learned column have all the contacts learned
+        chunk["learned"] = chunk["learned"].fillna(1).astype(bool)
+        validate_contact_matrix(chunk)
+        n_rows += len(chunk)
+        if row_filter is not None:
+            chunk = chunk[row_filter(chunk)]
+        chunks.append(chunk)
+
     if not h5:
-        contact_matrix = pd.read_csv(path, header=None, sep=r"\s+", names=col_names, dtype=col_types)
-        contact_matrix["learned"] = contact_matrix["learned"].fillna(1).astype(bool)
+        with pd.read_csv(path, header=None, sep=r"\s+", names=col_names, dtype=col_types, chunksize=chunksize) as reader:
+            for chunk in reader:
+                process(chunk)
     else:
-        contact_matrix = pd.read_hdf(path, key="data", dtype=col_types)
+        with pd.HDFStore(path, mode="r") as store:
+            for chunk in store.select("data", chunksize=chunksize):
+                process(chunk)
 
-    contact_matrix["learned"] = contact_matrix["learned"].astype(bool)
+    if not chunks:
+        contact_matrix = pd.DataFrame(
+            {col: pd.Series(dtype="bool" if col == "learned" else col_types[col]) for col in col_names}
+        )
+        contact_matrix.attrs["source_rows"] = 0
+        return contact_matrix
 
-    t1 = time.time()
-    print("\t\t- Read in:", t1 - st)
+    contact_matrix = concat_contact_matrix_chunks(chunks)
+    # the size of the whole matrix, to check it against the topology
+    contact_matrix.attrs["source_rows"] = n_rows
+    if row_filter is not None:
+        print("\t\t-", f"Skipped {n_rows - len(contact_matrix)} of {n_rows} rows of {path}")
 
-    # Validation checks using `query` for more efficient conditional filtering
-    if contact_matrix.query("probability < 0 or probability > 1").shape[0] > 0:
-        raise ValueError("ERROR: Probabilities should be between 0 and 1.")
+    return contact_matrix
 
-    if contact_matrix.query("distance < 0 or distance > cutoff").shape[0] > 0:
-        raise ValueError("ERROR: Distances should be between 0 and cutoff.")
 
-    if contact_matrix.query("cutoff < 0").shape[0] > 0:
-        raise ValueError("ERROR: Cutoff values cannot be negative.")
+def load_contact_matrix(path, h5=False, cache_dir=None, row_filter=None):
+    """
+    Returns the validated content of an intra-/intermat file, restricted to the rows selected by row_filter.
+    If cache_dir is set, the matrix is stored in a binary sidecar that is used instead of the source file
+    in the following runs (see cache.read_contact_matrix), one for each selection of rows.
+    Dense (.ndx.mm) matrices are mapped from disk instead, see read_dense_molecular_contacts.
+    """
+    key = row_filter.key if row_filter is not None else ""
+    contact_matrix = None
+    if cache_dir:
+        contact_matrix = cache.read_contact_matrix(path, cache_dir, key)
+    if contact_matrix is None:
+        contact_matrix = read_contact_matrix_file(path, h5, row_filter)
+        if cache_dir:
+            cache.write_contact_matrix(path, contact_matrix, cache_dir, key)
 
-    # Check for NaN or infinite values in critical columns
-    if contact_matrix[["probability", "distance", "cutoff"]].isnull().any().any():
-        raise ValueError("ERROR: The matrix contains NaN values.")
+    return contact_matrix
 
-    if np.isinf(contact_matrix[["probability", "distance", "cutoff"]].values).any():
-        raise ValueError("ERROR: The matrix contains INF values.")
+
+class ContactMatrixPrefetcher:
+    """
+    Reads contact matrices in background threads, in the order in which they will be requested,
+    so that reading and decoding the next matrices overlaps with the processing of the current one.
+
+    At most max_workers matrices are read at the same time. A new read is not started while the
+    matrices being read or waiting to be used are estimated to take more than max_memory bytes
+    (the first pending matrix is always read). With max_workers <= 1 matrices are read on request.
+
+    Parameters
+    ----------
+    paths : list of str
+        The matrices in the order they will be requested, duplicates are read once
+    cache_dir : str, optional
+        The cache folder passed to load_contact_matrix
+    max_workers : int
+        The number of reading threads
+    max_memory : float, optional
+        The memory cap in bytes, no cap if None
+    row_filters : dict, optional
+        {path: ContactMatrixFilter} the rows to keep of each matrix, all if not given
+    """
+
+    def __init__(self, paths, cache_dir=None, max_workers=1, max_memory=None, row_filters=None):
+        self.paths = list(dict.fromkeys(paths))
+        self.cache_dir = cache_dir
+        self.row_filters = row_filters or {}
+        self.max_memory = max_memory
+        self.next_index = 0
+        self.futures = {}
+        self.estimates = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers) if max_workers > 1 else None
+        self.submit()
+
+    @staticmethod
+    def estimate_memory(path):
+        """
+        Rough estimate of the memory of a decoded matrix from the size of its file.
+        """
+        size = os.path.getsize(path)
+        return 4 * size if path.endswith(".gz") else size
+
+    def submit(self):
+        if self.executor is None:
+            return
+        while self.next_index < len(self.paths):
+            path = self.paths[self.next_index]
+            estimate = self.estimate_memory(path)
+            if self.futures and self.max_memory is not None and sum(self.estimates.values()) + estimate > self.max_memory:
+                break
+            self.futures[path] = self.executor.submit(
+                load_contact_matrix, path, path.endswith(".h5"), self.cache_dir, self.row_filters.get(path)
+            )
+            self.estimates[path] = estimate
+            self.next_index += 1
+
+    def get(self, path):
+        """
+        Returns the matrix at path, waiting for it to be read if needed, and schedules the following reads.
+        Matrices that were not scheduled (or were already returned) are read directly.
+        """
+        if path not in self.futures:
+            return load_contact_matrix(path, path.endswith(".h5"), self.cache_dir, self.row_filters.get(path))
+        contact_matrix = self.futures.pop(path).result()
+        del self.estimates[path]
+        self.submit()
+        return contact_matrix
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        self.futures = {}
+        self.estimates = {}
+
+
+def set_precision(dataframe, precision):
+    """
+    Returns the dataframe with its float columns converted to precision (float64 or float32, see --precision).
+    """
+    return dataframe.astype({column: precision for column in dataframe.select_dtypes("float").columns})
+
+
+def read_molecular_contacts(
+    path,
+    ensemble_molecules_idx_sbtype_dictionary,
+    simulation,
+    h5=False,
+    cache_dir=None,
+    prefetcher=None,
+    sbtype_dtype=None,
+    row_filter=None,
+    float_dtype=None,
+):
+    """
+    Reads intra-/intermat files to determine molecular contact statistics.
+    The file is read through prefetcher when given, otherwise with load_contact_matrix keeping the rows selected by row_filter.
+    The ai/aj columns (and the index) are categoricals of sbtype_dtype (by default built from the
+    sb_types of ensemble_molecules_idx_sbtype_dictionary), so that their codes are the atom_id.
+    The float columns are converted to float_dtype when given (e.g. float32 to halve their memory).
+    """
+    print("\t\t-", f"Reading {path}")
+    st = time.time()
+    if prefetcher is not None:
+        contact_matrix = prefetcher.get(path)
+    else:
+        contact_matrix = load_contact_matrix(path, h5, cache_dir, row_filter)
+
+    t1 = time.time()
+    print("\t\t- Read in:", t1 - st)
 
     molecule_names_dictionary = {
         name.split("_", 1)[0]: name.split("_", 1)[1] for name in ensemble_molecules_idx_sbtype_dictionary
@@ -441,34 +829,47 @@ def read_molecular_contacts(path, ensemble_molecules_idx_sbtype_dictionary, simu
         [category + name_mol_aj for category in contact_matrix["molecule_name_aj"].cat.categories]
     )
 
-    contact_matrix["ai"] = contact_matrix["ai"].map(
-        ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_ai"][0]]
-    )
-    contact_matrix["aj"] = contact_matrix["aj"].map(
-        ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_aj"][0]]
-    )
+    idx_sbtype_ai = ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_ai"][0]]
+    idx_sbtype_aj = ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_aj"][0]]
 
     name = path.split("/")[-1].split("_")
-    len_ai = len(ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_ai"][0]])
-    len_aj = len(ensemble_molecules_idx_sbtype_dictionary[contact_matrix["molecule_name_aj"][0]])
-    if len_ai * len_aj != len(contact_matrix):
+    if len(idx_sbtype_ai) * len(idx_sbtype_aj) != contact_matrix.attrs.get("source_rows", len(contact_matrix)):
         raise Exception("The " + simulation + " topology and " + name[0] + " files are inconsistent")
 
-    # Define a function to check the atom part
-    # Vectorized split to extract the atom part
-    ai_atoms = contact_matrix["ai"].str.split("_").str[0]
-    aj_atoms = contact_matrix["aj"].str.split("_").str[0]
-
-    # Create a mask for valid rows
-    valid_rows = ~((ai_atoms.str.startswith("H") & (ai_atoms != "H")) | (aj_atoms.str.startswith("H") & (aj_atoms != "H")))
+    if sbtype_dtype is None:
+        sbtype_dtype = pd.CategoricalDtype(
+            categories=[
+                sbtype for molecule in ensemble_molecules_idx_sbtype_dictionary.values() for sbtype in molecule.values()
+            ]
+        )
 
-    contact_matrix = contact_matrix[valid_rows]
+    # the atom indices are mapped per category: first to sb_types, then to the integer codes of sbtype_dtype
+    ai_sbtypes = contact_matrix["ai"].cat.categories.map(idx_sbtype_ai)
+    aj_sbtypes = contact_matrix["aj"].cat.categories.map(idx_sbtype_aj)
+    ai_codes = contact_matrix["ai"].cat.codes.to_numpy()
+    aj_codes = contact_matrix["aj"].cat.codes.to_numpy()
+
+    # Create a mask for valid rows (usually already applied while reading, see ContactMatrixFilter)
+    valid_rows = is_heavy_atom(ai_sbtypes)[ai_codes] & is_heavy_atom(aj_sbtypes)[aj_codes]
+    ai_codes = sbtype_dtype.categories.get_indexer(ai_sbtypes)[ai_codes[valid_rows]]
+    aj_codes = sbtype_dtype.categories.get_indexer(aj_sbtypes)[aj_codes[valid_rows]]
+    if (ai_codes < 0).any() or (aj_codes < 0).any():
+        unknown = set(ai_sbtypes.difference(sbtype_dtype.categories)) | set(aj_sbtypes.difference(sbtype_dtype.categories))
+        raise ValueError(
+            f"The following atoms of {simulation} are not in the reference topology:\n{unknown}\n"
+            'You MUST add them in "from_ff_to_multiego" dictionary to properly merge all the contacts.'
+        )
 
-    contact_matrix = contact_matrix.assign(
+    contact_matrix = contact_matrix[valid_rows].assign(
+        ai=pd.Categorical.from_codes(ai_codes, dtype=sbtype_dtype),
+        aj=pd.Categorical.from_codes(aj_codes, dtype=sbtype_dtype),
         same_chain=name[0] == "intramat",
-        source=pd.Categorical([simulation] * len(contact_matrix)),  # Convert to category
+        source=pd.Categorical([simulation] * len(ai_codes)),  # Convert to category
     )
 
+    if float_dtype is not None:
+        contact_matrix = set_precision(contact_matrix, float_dtype)
+
     contact_matrix[["idx_ai", "idx_aj"]] = contact_matrix[["ai", "aj"]]
     contact_matrix.set_index(["idx_ai", "idx_aj"], inplace=True)
 
@@ -478,6 +879,73 @@ def read_molecular_contacts(path, ensemble_molecules_idx_sbtype_dictionary, simu
     return contact_matrix
 
 
+def read_dense_molecular_contacts(
+    path,
+    ensemble_molecules_idx_sbtype_dictionary,
+    simulation,
+    sbtype_dtype,
+    topology_dataframe,
+    float_dtype=None,
+):
+    """
+    Maps an intra-/intermat in the dense format (.ndx.mm) as a ContactGrid over the atoms of topology_dataframe,
+    in place of read_molecular_contacts and ContactGrid.from_contact_matrix for the other formats.
+    The atom indices of the file are mapped once per axis to the atom_id of their sb_type (the codes of sbtype_dtype),
+    the atoms that are not part of multi-eGO (see is_heavy_atom) are dropped. The mapped arrays are the fields of the grid
+    when the atoms are already in the order of the topology, otherwise they are gathered once.
+    The float fields are converted to float_dtype when given.
+    """
+    print("\t\t-", f"Mapping {path}")
+    st = time.time()
+    header, arrays = open_dense_contact_matrix(path)
+
+    molecule_names_dictionary = {
+        name.split("_", 1)[0]: name.split("_", 1)[1] for name in ensemble_molecules_idx_sbtype_dictionary
+    }
+    molecule_name_ai = f"{header['molecule_name_ai']}_{molecule_names_dictionary[header['molecule_name_ai']]}"
+    molecule_name_aj = f"{header['molecule_name_aj']}_{molecule_names_dictionary[header['molecule_name_aj']]}"
+    idx_sbtype_ai = ensemble_molecules_idx_sbtype_dictionary[molecule_name_ai]
+    idx_sbtype_aj = ensemble_molecules_idx_sbtype_dictionary[molecule_name_aj]
+
+    name = path.split("/")[-1].split("_")
+    if tuple(header["shape"]) != (len(idx_sbtype_ai), len(idx_sbtype_aj)):
+        raise Exception("The " + simulation + " topology and " + name[0] + " files are inconsistent")
+
+    # the atom_id of the atom index i + 1 of each axis, -1 for the atoms that are not part of multi-eGO
+    atom_ids = []
+    unknown = set()
+    for idx_sbtype, n_atoms in zip([idx_sbtype_ai, idx_sbtype_aj], header["shape"]):
+        sbtypes = pd.Index([idx_sbtype[str(i)] for i in range(1, n_atoms + 1)], dtype=str)
+        codes = sbtype_dtype.categories.get_indexer(sbtypes)
+        heavy = is_heavy_atom(sbtypes)
+        unknown |= set(sbtypes[heavy & (codes < 0)])
+        atom_ids.append(np.where(heavy, codes, -1))
+    if unknown:
+        raise ValueError(
+            f"The following atoms of {simulation} are not in the reference topology:\n{unknown}\n"
+            'You MUST add them in "from_ff_to_multiego" dictionary to properly merge all the contacts.'
+        )
+
+    arrays["learned"] = arrays["learned"].view(bool)
+    grid = contact_grid.ContactGrid.from_dense_arrays(
+        molecule_name_ai,
+        atom_ids[0],
+        molecule_name_aj,
+        atom_ids[1],
+        arrays,
+        topology_dataframe,
+        same_chain=name[0] == "intramat",
+        source=simulation,
+    )
+    if float_dtype is not None:
+        for field in ["distance", "probability", "cutoff"]:
+            grid[field] = grid[field].astype(float_dtype, copy=False)
+
+    print("\t\t- Mapped in:", time.time() - st)
+
+    return grid
+
+
 def write_nonbonded(topology_dataframe, meGO_LJ, parameters, output_folder):
     """
     Writes the non-bonded parameter file ffnonbonded.itp.
@@ -512,16 +980,12 @@ def write_nonbonded(topology_dataframe, meGO_LJ, parameters, output_folder):
         else:
             atomtypes = topology_dataframe[["sb_type", "atomic_number", "mass", "charge", "ptype", "c6", "c12"]].copy()
 
-        atomtypes["c6"] = atomtypes["c6"].map(lambda x: "{:.6e}".format(x))
-        atomtypes["c12"] = atomtypes["c12"].map(lambda x: "{:.6e}".format(x))
-        file.write(dataframe_to_write(atomtypes))
+        write_dataframe(file, atomtypes, LJ_FLOAT_FORMATS)
 
         if not meGO_LJ.empty:
             file.write("\n\n[ nonbond_params ]\n")
-            meGO_LJ["c6"] = meGO_LJ["c6"].map(lambda x: "{:.6e}".format(x))
-            meGO_LJ["c12"] = meGO_LJ["c12"].map(lambda x: "{:.6e}".format(x))
             meGO_LJ.insert(5, ";", ";")
-            file.write(dataframe_to_write(meGO_LJ))
+            write_dataframe(file, meGO_LJ, LJ_FLOAT_FORMATS)
 
 
 def write_model(meGO_ensemble, meGO_LJ, meGO_LJ_14, parameters, stat_str):
@@ -538,6 +1002,11 @@ def write_model(meGO_ensemble, meGO_LJ, meGO_LJ_14, parameters, stat_str):
         Contains the c6 and c12 LJ parameters of the pairs and exclusions
     parameters : dict
         A dictionaty of the command-line parsed parameters
+
+    Returns
+    -------
+    output_dir : str
+        The folder the model was written to
     """
     output_dir = get_outdir_name(
         f"{parameters.root_dir}/outputs/{parameters.system}", parameters.explicit_name, parameters.egos
@@ -556,6 +1025,8 @@ def write_model(meGO_ensemble, meGO_LJ, meGO_LJ_14, parameters, stat_str):
     print("\t- " f"Output files written to {output_dir}")
     print(stat_str)
 
+    return output_dir
+
 
 def write_output_readme(meGO_LJ, parameters, output_dir, stat_str):
     """
@@ -668,26 +1139,179 @@ def get_outdir_name(output_dir, explicit_name, egos):
     return output_dir
 
 
-def dataframe_to_write(df):
+# rows formatted and written at a time by write_dataframe
+WRITE_CHUNKSIZE = 100000
+# decimals of the floats written without an explicit format, as in DataFrame.to_string (display.precision)
+FLOAT_DIGITS = 6
+# the LJ parameters are always written in scientific notation
+LJ_FLOAT_FORMATS = {"c6": ".6e", "c12": ".6e"}
+
+
+def get_float_width(values, spec, na_rep="nan"):
+    """
+    Returns the length of the longest element of a float array formatted with spec, without formatting all of them:
+    the length of fixed point and scientific numbers only grows with the absolute value (and with the exponent),
+    so only the extremes of each sign are formatted.
+    """
+    finite = values[np.isfinite(values)]
+    negative = np.signbit(finite)
+    width = 0
+    for group, sign_width in [(finite[negative], 1), (finite[~negative], 0)]:
+        if len(group):
+            abs_group = np.abs(group)
+            nonzero = abs_group[abs_group > 0]
+            extremes = [abs_group.min(), abs_group.max(), nonzero.min() if len(nonzero) else 0.0]
+            width = max(width, sign_width + max(len(format(float(x), spec)) for x in extremes))
+    if np.isnan(values).any():
+        width = max(width, len(na_rep))
+    if np.isposinf(values).any():
+        width = max(width, 3)
+    if np.isneginf(values).any():
+        width = max(width, 4)
+    return width
+
+
+def get_float_format(values):
+    """
+    Returns the format spec and the width of a float column written as DataFrame.to_string does: in fixed point with
+    FLOAT_DIGITS decimals, less the trailing zeros common to all the values, or in scientific notation when some values
+    would be written as 0 or are too large.
     """
-    Returns a stringified and formated dataframe and a message if the dataframe is empty.
+    finite = values[np.isfinite(values)]
+    fixed_spec = f".{FLOAT_DIGITS}f"
+    # at least one decimal digit is kept, the scan stops at the first value without trailing zeros
+    trimmed = FLOAT_DIGITS - 1 if len(finite) else 0
+    for x in finite.tolist():
+        fixed = format(x, fixed_spec)
+        trimmed = min(trimmed, len(fixed) - len(fixed.rstrip("0")))
+        if trimmed == 0:
+            break
+    spec = f".{FLOAT_DIGITS - trimmed}f"
+    width = get_float_width(values, spec, "NaN")
+
+    abs_values = np.abs(values)
+    has_large_values = (abs_values > 1e6).any()
+    has_small_values = ((abs_values < 10 ** (-FLOAT_DIGITS)) & (abs_values > 0)).any()
+    if has_small_values or (width > FLOAT_DIGITS + 6 and has_large_values):
+        spec = f".{FLOAT_DIGITS}e"
+        width = get_float_width(values, spec, "NaN")
+
+    return spec, width
+
+
+def get_column_formatter(column, float_format=None):
+    """
+    Returns how to write a column of a table in the layout of DataFrame.to_string.
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The input dataframe
+    column : pd.Series
+        The column
+    float_format : str, optional
+        The format spec of a float column, the column is then written as if it was made of strings
 
     Returns
     -------
-    The stringified dataframe
+    get_rows : callable or None
+        get_rows(start, stop) returns the elements of the rows start:stop, None if the column can not be written
+    spec : str
+        The format spec of the elements returned by get_rows
+    width : int
+        The width of the longest formatted element
+    numeric : bool
+        Whether pandas considers the column numeric, numeric column names are prefixed by a space
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        if len(codes) and codes.min() < 0:
+            return None, "", 0, False
+        categories = np.array([str(category) for category in column.cat.categories], dtype=object)
+        width = max((len(category) for category in categories[np.unique(codes)]), default=0)
+        return (lambda start, stop: categories[codes[start:stop]].tolist()), "", width, False
+
+    values = column.to_numpy()
+    if values.dtype.kind == "b":
+        words = np.array(["False", "True"], dtype=object)
+        width = max((len(word) for word in words[np.unique(values.astype(int))]), default=0)
+        return (lambda start, stop: words[values[start:stop].astype(int)].tolist()), "", width, True
+
+    if values.dtype.kind in "iu":
+        width = max(len(str(values.min())), len(str(values.max()))) if len(values) else 0
+        return (lambda start, stop: values[start:stop].tolist()), "d", width, True
+
+    if values.dtype.kind == "f":
+        if float_format is not None:
+            return (
+                (lambda start, stop: values[start:stop].tolist()),
+                float_format,
+                get_float_width(values, float_format),
+                False,
+            )
+        spec, width = get_float_format(values)
+        if np.isnan(values).any():
+            # NaN are written as pandas does
+            return (
+                (lambda start, stop: ["NaN" if np.isnan(x) else format(x, spec) for x in values[start:stop].tolist()]),
+                "",
+                width,
+                True,
+            )
+        return (lambda start, stop: values[start:stop].tolist()), spec, width, True
+
+    if values.dtype == object and all(isinstance(x, (str, int, np.integer)) and not isinstance(x, bool) for x in values):
+        width = max((len(str(x)) for x in values), default=0)
+        return (lambda start, stop: list(map(str, values[start:stop]))), "", width, False
+
+    return None, "", 0, False
+
+
+def write_dataframe(file, df, float_formats=None, chunksize=WRITE_CHUNKSIZE):
+    """
+    Writes a table in the layout of DataFrame.to_string(index=False), with the name of the first column commented out.
+    The widths of the columns are computed first, then the rows are formatted and written chunksize at a time
+    so that the text of the whole table is never in memory. A message is written instead of empty tables.
+
+    Parameters
+    ----------
+    file : file object
+        The open output file
+    df : pd.DataFrame
+        The table
+    float_formats : dict, optional
+        {column: format spec} of the float columns to write with a fixed format (e.g. LJ_FLOAT_FORMATS)
+    chunksize : int
+        The number of rows formatted at a time
     """
     if df.empty:
         # TODO insert and improve the following warning
         print("\t- WARNING: A topology parameter is empty. Check the reference topology.")
-        return "; The following parameters where not parametrized on multi-eGO.\n; If this is not expected, check the reference topology."
-    else:
-        df.rename(columns={df.columns[0]: f"; {df.columns[0]}"}, inplace=True)
-        return df.to_string(index=False)
+        file.write(
+            "; The following parameters where not parametrized on multi-eGO.\n; If this is not expected, check the reference topology."
+        )
+        return
+
+    float_formats = float_formats or {}
+    headers, getters, header_fields, row_fields = [], [], [], []
+    for i, (name, column) in enumerate(df.items()):
+        get_rows, spec, width, numeric = get_column_formatter(column, float_formats.get(name))
+        if get_rows is None:
+            # columns of other types are left to pandas
+            df = df.rename(columns={df.columns[0]: f"; {df.columns[0]}"})
+            file.write(df.to_string(index=False))
+            return
+        header = f"; {name}" if i == 0 else str(name)
+        headers.append(f" {header}" if numeric else header)
+        width = max(width, len(headers[-1]))
+        getters.append(get_rows)
+        header_fields.append(f"{{:>{width}}}")
+        row_fields.append(f"{{:>{width}{spec}}}")
+
+    file.write(" ".join(header_fields).format(*headers))
+    row_format = " ".join(row_fields).format
+    for start in range(0, len(df), chunksize):
+        stop = min(start + chunksize, len(df))
+        file.write("\n")
+        file.write("\n".join(map(row_format, *[get_rows(start, stop) for get_rows in getters])))
 
 
 def make_header(parameters):
@@ -778,8 +1402,6 @@ def write_topology(
             pairs = meGO_LJ_14[molecule]
             if not pairs.empty:
                 pairs.insert(5, ";", ";")
-                pairs["c6"] = pairs["c6"].map(lambda x: "{:.6e}".format(x))
-                pairs["c12"] = pairs["c12"].map(lambda x: "{:.6e}".format(x))
                 bonded_interactions_dict[molecule]["pairs"] = pairs
                 exclusions = pairs[["ai", "aj"]].copy()
 
@@ -795,7 +1417,8 @@ def write_topology(
             atom_selection_dataframe = topology_dataframe.loc[topology_dataframe["molecule_name"] == molecule][
                 ["number", "sb_type", "resnum", "resname", "name", "cgnr"]
             ].copy()
-            file.write(f"{dataframe_to_write(atom_selection_dataframe)}\n\n")
+            write_dataframe(file, atom_selection_dataframe)
+            file.write("\n\n")
             # Here are written bonds, angles, dihedrals and impropers
             for bonded_type, interactions in bonded_interactions.items():
                 if interactions.empty:
@@ -805,10 +1428,10 @@ def write_topology(
                         file.write("[ dihedrals ]\n")
                     else:
                         file.write(f"[ {bonded_type} ]\n")
-                    file.write(dataframe_to_write(interactions))
+                    write_dataframe(file, interactions, LJ_FLOAT_FORMATS)
                     file.write("\n\n")
             file.write("[ exclusions ]\n")
-            file.write(dataframe_to_write(exclusions))
+            write_dataframe(file, exclusions)
 
         footer = f"""
 
@@ -912,6 +1535,7 @@ def check_files_existence(args):
                 ndx_files = glob.glob(f"{ensemble}/*.ndx")
                 ndx_files += glob.glob(f"{ensemble}/*.ndx.gz")
                 ndx_files += glob.glob(f"{ensemble}/*.h5")
+                ndx_files += glob.glob(f"{ensemble}/*.mm")
                 if not ndx_files and not args.egos == "mg":
                     raise FileNotFoundError(
                         f"contact matrix input file(s) (e.g., intramat_1_1.ndx, etc.) were not found in {ensemble}/"
@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# bump this when the layout of the report changes
+PERF_REPORT_VERSION = 2
+
+# the stages recorded so far, in the order in which they were entered
+stages = []
+# the stages currently running, the last one is the innermost
+running = []
+# the peak resident memory (MB) reached before the last reset of the high-water mark, see reset_hwm
+peak_before_reset = 0.0
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident memory (MB) of the process since its start, None if it can not be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    peak = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    # resetting the high-water mark also resets ru_maxrss
+    return max(peak, peak_before_reset)
+
+
+def get_hwm():
+    """
+    Returns the high-water mark of the resident memory (MB) of the process, VmHWM in /proc/self/status,
+    None if it can not be read (e.g. not on Linux).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def reset_hwm():
+    """
+    Resets the high-water mark of the resident memory of the process to its current value (Linux only),
+    returns whether it was reset.
+    """
+    global peak_before_reset
+    hwm = get_hwm()
+    if hwm is None:
+        return False
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    peak_before_reset = max(peak_before_reset, hwm)
+    return True
+
+
+def get_rss():
+    """
+    Returns the current resident memory (MB) of the process, None if it can not be measured.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Records the wall time, the CPU time, the memory and the number of rows of a stage of multi-eGO.
+    Stages entered while another one is running are recorded as its sub-stages, with path "stage/sub-stage".
+
+    Where the high-water mark of the resident memory can be reset (Linux), it is reset when the stage starts
+    and the peak of the stage is recorded as stage_peak_rss_mb. Otherwise the peak of the process up to the end
+    of the stage is recorded as process_peak_rss_mb.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage
+    rows : int, optional
+        The number of rows produced by the stage, it can also be set later as record["rows"]
+
+    Yields
+    ------
+    record : dict
+        The record of the stage, completed when the stage ends
+    """
+    record = {
+        "name": name,
+        "path": "/".join([parent["name"] for parent in running] + [name]),
+        "depth": len(running),
+        "rows": rows,
+    }
+    # the peak of the running stages up to now is kept before resetting the high-water mark
+    hwm = get_hwm()
+    for parent in running:
+        if parent["stage_peak"] is not None and hwm is not None:
+            parent["stage_peak"] = max(parent["stage_peak"], hwm)
+    record["stage_peak"] = 0.0 if reset_hwm() else None
+    stages.append(record)
+    running.append(record)
+    rss_start = get_rss()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_time"] = time.perf_counter() - wall_start
+        record["cpu_time"] = time.process_time() - cpu_start
+        record["rss_mb"] = get_rss()
+        record["rss_delta_mb"] = None if rss_start is None or record["rss_mb"] is None else record["rss_mb"] - rss_start
+        stage_peak = record.pop("stage_peak")
+        hwm = get_hwm()
+        if stage_peak is not None and hwm is not None:
+            record["stage_peak_rss_mb"] = max(stage_peak, hwm)
+            for parent in running[:-1]:
+                if parent["stage_peak"] is not None:
+                    parent["stage_peak"] = max(parent["stage_peak"], record["stage_peak_rss_mb"])
+        else:
+            record["process_peak_rss_mb"] = get_peak_rss()
+        running.pop()
+
+
+def write_report(path):
+    """
+    Writes the stages recorded so far to a JSON file.
+
+    The CPU time includes all the threads of the process (e.g. the contact matrices read in the background).
+    The peak memory of each stage is either stage_peak_rss_mb, measured during the stage only, or process_peak_rss_mb,
+    the peak of the process up to the end of the stage (see stage). peak_rss_mb is the peak memory of the whole run.
+
+    Parameters
+    ----------
+    path : str
+        The output file
+    """
+    report = {
+        "version": PERF_REPORT_VERSION,
+        "generated": time.strftime("%d-%m-%Y %H:%M", time.localtime()),
+        "command": " ".join(sys.argv),
+        "peak_rss_mb": get_peak_rss(),
+        "stages": [record for record in stages if "wall_time" in record],
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -1,3 +1,5 @@
+from .resources import type_definitions
+
 import pandas as pd
 import numpy as np
 
@@ -248,90 +250,118 @@ def get_pairs(topology):
     - topology (list): List of pair atoms information.
 
     Returns:
-    - pairs_dataframe (pandas.DataFrame): DataFrame containing pair data, including atom indices, function type, and pair type.
+    - pairs_dataframe (pandas.DataFrame): DataFrame containing pair data, including atom indices, function type and
+      the c6/c12 of the pair (NaN when the pair has no parameters).
     """
     pairs_dataframe = pd.DataFrame(
         {
             "ai": [pair.atom1.idx + 1 for pair in topology],
             "aj": [pair.atom2.idx + 1 for pair in topology],
             "funct": [pair.funct for pair in topology],
-            "type": [pair.type for pair in topology],
+            "c6": [pair.type.sigma * 0.1 if pair.type is not None else np.nan for pair in topology],
+            "c12": [pair.type.epsilon * 4.184 if pair.type is not None else np.nan for pair in topology],
         }
     )
     return pairs_dataframe
 
 
-def get_14_interaction_list(reduced_topology, bond_pair):
+def get_bonded_exclusions(bond_pair):
     """
-    Creates lists containing a atoms involved in 1-4 interactions.
+    Finds the atoms within 3 bonds of each other from a sparse (CSR) adjacency built on the bonds.
+    Non backtracking walks of 1, 2 and 3 bonds are expanded in one vectorized pass over the
+    neighbour lists.
 
     Parameters
     ----------
-    reduced_topology: pandas.DataFrame
-        function
-    bond_bair: i don't know man
-        function
+    bond_pair: list
+        List of (ai, aj) tuples of bonded atom numbers (1-based), as returned by get_bond_pairs
 
     Returns
     -------
-    exclusion_bonds: list
-        Contains interaction with distance up to 3 bonds
-    p14: list
-        Contains interactions with distance exactly 3 bonds
-    """
-    # Building the exclusion bonded list
-    # exclusion_bonds are all the interactions within 3 bonds
-    # p14 are specifically the interactions at exactly 3 bonds
-    ex, ex14, p14, exclusion_bonds = [], [], [], []
-    for atom in reduced_topology["number"].to_list():
-        for t in bond_pair:
-            if t[0] == atom:
-                first = t[1]
-                ex.append(t[1])
-            elif t[1] == atom:
-                first = t[0]
-                ex.append(t[0])
-            else:
-                continue
-            for tt in bond_pair:
-                if (tt[0] == first) & (tt[1] != atom):
-                    second = tt[1]
-                    ex.append(tt[1])
-                elif (tt[1] == first) & (tt[0] != atom):
-                    second = tt[0]
-                    ex.append(tt[0])
-                else:
-                    continue
-                for ttt in bond_pair:
-                    if (ttt[0] == second) & (ttt[1] != first):
-                        ex.append(ttt[1])
-                        ex14.append(ttt[1])
-                    elif (ttt[1] == second) & (ttt[0] != first):
-                        ex.append(ttt[0])
-                        ex14.append(ttt[0])
-
-        for e in ex:
-            exclusion_bonds.append((str(str(atom) + "_" + str(e))))
-            exclusion_bonds.append((str(str(e) + "_" + str(atom))))
-
-        ex = []
-        for e in ex14:
-            p14.append((str(str(atom) + "_" + str(e))))
-            p14.append((str(str(e) + "_" + str(atom))))
-        ex14 = []
-
-    return exclusion_bonds, p14
+    exclusions: pandas.DataFrame
+        One row per (ai, aj) pair (both orders) of atoms within 3 bonds, with integer atom numbers.
+        The "1-4" column is "1_4" for pairs connected by a walk of exactly 3 bonds and "1_2_3" otherwise.
+    """
+    if not bond_pair:
+        return pd.DataFrame({"ai": np.array([], dtype=np.int64), "aj": np.array([], dtype=np.int64), "1-4": []})
+
+    bonds = np.array(bond_pair, dtype=np.int64)
+    # directed edges sorted by source atom, CSR neighbour lists: neighbours of a are dst[indptr[a]:indptr[a + 1]]
+    src = np.concatenate([bonds[:, 0], bonds[:, 1]])
+    dst = np.concatenate([bonds[:, 1], bonds[:, 0]])
+    order = np.argsort(src, kind="stable")
+    src, dst = src[order], dst[order]
+    n_atoms = int(bonds.max()) + 1
+    degree = np.bincount(src, minlength=n_atoms)
+    indptr = np.concatenate([[0], np.cumsum(degree)])
+
+    def expand(walk_end):
+        # for each walk, the position in dst of all the neighbours of its last atom
+        n_neighbours = degree[walk_end]
+        walk = np.repeat(np.arange(len(walk_end)), n_neighbours)
+        offset = np.arange(n_neighbours.sum()) - np.repeat(np.cumsum(n_neighbours) - n_neighbours, n_neighbours)
+        return walk, dst[indptr[walk_end][walk] + offset]
+
+    # 1-2: a-b
+    a1, b1 = src, dst
+    # 1-3: a-b-c with c != a
+    walk, c2 = expand(b1)
+    a2, b2 = a1[walk], b1[walk]
+    keep = c2 != a2
+    a2, b2, c2 = a2[keep], b2[keep], c2[keep]
+    # 1-4: a-b-c-d with d != b
+    walk, d3 = expand(c2)
+    a3, b3 = a2[walk], b2[walk]
+    keep = d3 != b3
+    a3, d3 = a3[keep], d3[keep]
+
+    # unique pairs encoded as integer keys
+    keys = np.unique(np.concatenate([a1, a2, a3]) * n_atoms + np.concatenate([b1, c2, d3]))
+    keys14 = np.unique(a3 * n_atoms + d3)
+    exclusions = pd.DataFrame({"ai": keys // n_atoms, "aj": keys % n_atoms})
+    exclusions["1-4"] = np.where(np.isin(keys, keys14), "1_4", "1_2_3")
+
+    return exclusions
 
 
 def get_lj_params(topology):
-    lj_params = pd.DataFrame(columns=["ai", "c6", "c12"], index=np.arange(len(topology.atoms)))
-    for i, atom in enumerate(topology.atoms):
-        c6, c12 = atom.sigma * 0.1, atom.epsilon * 4.184
-        lj_params.loc[i] = [atom.atom_type, c6, c12]
+    """
+    Extracts the Lennard-Jones parameters of each atom from a molecular topology.
+
+    Parameters
+    ----------
+    topology: parmed.topology object
+        Contains the molecular topology information
+
+    Returns
+    -------
+    lj_params: pd.DataFrame
+        DataFrame containing the atom type (ai) and the c6 and c12 of each atom
+    """
+    n_atoms = len(topology.atoms)
+    lj_params = pd.DataFrame(
+        {
+            "ai": np.array([atom.type for atom in topology.atoms], dtype=object),
+            "c6": np.fromiter((atom.sigma for atom in topology.atoms), dtype=float, count=n_atoms) * 0.1,
+            "c12": np.fromiter((atom.epsilon for atom in topology.atoms), dtype=float, count=n_atoms) * 4.184,
+        }
+    )
 
     return lj_params
 
 
+def get_lj_epsilon_sigma(c6, c12):
+    """
+    Converts c6 and c12 arrays to epsilon and sigma, pairs with c6 = 0 are repulsive only
+    and get a negative epsilon (-c12) and the sigma of the repulsive c12.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        epsilon = np.where(c6 > 0, c6**2 / (4 * c12), -c12)
+        sigma = np.where(c6 > 0, (c12 / c6) ** (1 / 6), c12 ** (1 / 12) / (2.0 ** (1.0 / 6.0)))
+
+    return epsilon, sigma
+
+
 def get_lj_pairs(topology):
     """
     Extracts Lennard-Jones pair information from a molecular topology.
@@ -346,17 +376,16 @@ def get_lj_pairs(topology):
     pairs_dataframe: pd.DataFrame
         DataFrame containing Lennard-Jones pair information
     """
-    lj_pairs = pd.DataFrame(columns=["ai", "aj", "epsilon", "sigma"], index=np.arange(len(topology.parameterset.nbfix_types)))
-    for i, (sbtype_i, sbtype_j) in enumerate(topology.parameterset.nbfix_types):
-        key = (sbtype_i, sbtype_j)
-        # This is read as rmin not as sigma --> must be scaled by 1/2**(1/6)
-        # Any contact present more then once is overwritten by the last one in the nonbond_params
-        c12, c6 = topology.parameterset.nbfix_types[key][0] * 4.184, topology.parameterset.nbfix_types[key][1] * 0.1 / (
-            2 ** (1 / 6)
-        )
-        epsilon = c6**2 / (4 * c12) if c6 > 0 else -c12
-        sigma = (c12 / c6) ** (1 / 6) if c6 > 0 else c12 ** (1 / 12) / (2.0 ** (1.0 / 6.0))
-        lj_pairs.loc[i] = [sbtype_i, sbtype_j, epsilon, sigma]
+    nbfix_types = topology.parameterset.nbfix_types
+    n_pairs = len(nbfix_types)
+    # Any contact present more then once is overwritten by the last one in the nonbond_params
+    types = np.array(list(nbfix_types.keys()), dtype=object).reshape(n_pairs, 2)
+    params = np.array(list(nbfix_types.values()), dtype=float).reshape(n_pairs, -1)
+    # This is read as rmin not as sigma --> must be scaled by 1/2**(1/6)
+    c12 = params[:, 0] * 4.184
+    c6 = params[:, 1] * 0.1 / (2 ** (1 / 6))
+    epsilon, sigma = get_lj_epsilon_sigma(c6, c12)
+    lj_pairs = pd.DataFrame({"ai": types[:, 0], "aj": types[:, 1], "epsilon": epsilon, "sigma": sigma})
 
     return lj_pairs
 
@@ -375,106 +404,147 @@ def get_lj14_pairs(topology):
     pairs_dataframe: pd.DataFrame
         DataFrame containing Lennard-Jones pair information
     """
-    lj14_pairs = pd.DataFrame()
-    for mol, top in topology.molecules.items():
-        pair14 = [
-            {
-                "ai": pair.atom1.type,
-                "aj": pair.atom2.type,
-                "c6": pair.type.sigma * 0.1,
-                "c12": pair.type.epsilon * 4.184,
-            }
-            for pair in top[0].adjusts
-        ]
-        df = pd.DataFrame(pair14)
-        lj14_pairs = pd.concat([lj14_pairs, df])
+    adjusts = [pair for top in topology.molecules.values() for pair in top[0].adjusts]
+    n_pairs = len(adjusts)
+    c6 = np.fromiter((pair.type.sigma for pair in adjusts), dtype=float, count=n_pairs) * 0.1
+    c12 = np.fromiter((pair.type.epsilon for pair in adjusts), dtype=float, count=n_pairs) * 4.184
+    epsilon, sigma = get_lj_epsilon_sigma(c6, c12)
+    lj14_pairs = pd.DataFrame(
+        {
+            "ai": np.array([pair.atom1.type for pair in adjusts], dtype=object),
+            "aj": np.array([pair.atom2.type for pair in adjusts], dtype=object),
+            "epsilon": epsilon,
+            "sigma": sigma,
+        }
+    )
 
-    lj14_pairs = lj14_pairs.reset_index()
+    return lj14_pairs
 
-    # Calculate "epsilon" using a vectorized conditional expression
-    lj14_pairs["epsilon"] = np.where(lj14_pairs["c6"] > 0, lj14_pairs["c6"] ** 2 / (4 * lj14_pairs["c12"]), -lj14_pairs["c12"])
 
-    # Calculate "sigma" using a vectorized conditional expression
-    lj14_pairs["sigma"] = np.where(
-        lj14_pairs["c6"] > 0,
-        (lj14_pairs["c12"] / lj14_pairs["c6"]) ** (1 / 6),
-        lj14_pairs["c12"] ** (1 / 12) / (2.0 ** (1.0 / 6.0)),
-    )
+def get_molecules(topology):
+    """
+    Extracts the atom table of each molecule type from a molecular topology.
 
-    lj14_pairs.drop(columns=["c6", "c12"], inplace=True)
+    Parameters
+    ----------
+    topology: parmed.topology object
+        Contains the molecular topology information
 
-    return lj14_pairs
+    Returns
+    -------
+    molecules: dict
+        {molecule_name: {"atoms": pd.DataFrame, "nrexcl": int}} in the order of the [ molecules ] section
+    """
+    return {
+        name: {"atoms": molecule[0].to_dataframe(), "nrexcl": molecule[1]} for name, molecule in topology.molecules.items()
+    }
 
 
-def create_pairs_14_dataframe(atomtype1, atomtype2, c6=0.0, shift=0, prefactor=None, constant=None):
+def get_bonded_interactions(topology):
     """
-    Used to create additional or modified, multi-eGO-specific 1-4 (like) interactions. Two sets of atomtypes with
-    specific shifts in the residue index can be fed to the function to obtain a new set of 1-4 interaction pairs.
+    Extracts the bonded interactions of each molecule type from a molecular topology.
 
     Parameters
     ----------
-    atomtype1: list or list-like
-        Contains the first set of atomtypes
-    atomtype2: list or list-like
-        Contains the second set of atomtypes
-    c6: float
-        Sets a fixed c6 LJ parameters for the specificied type of interaction (default = 0.0)
-    shift: int
-        Defines the shift in residue index in which to apply the shift. Positive shifts apply the function
-        to the atom of the next residue. Negative shifts apply the function to the atom of the previous residue
-    prefactor: float
-        Factor which to multiply the c12 with after using the combination rule for LJ parameters
-    constant: float
-        A constant c12 value to use for LJ c12 parameters
+    topology: parmed.topology object
+        Contains the molecular topology information
 
     Returns
     -------
-    pairs_14: pd.DataFrame
-        A DataFrame containing output containing the additional atom indices and LJ parameters
-    """
-    # if prefactor is not None and constant is not None:
-    #    raise ValueError("Either prefactor or constant has to be set.")
-    if prefactor is None and constant is None:
-        raise ValueError("Neither prefactor nor constant has been set.")
-    pairs_14_ai, pairs_14_aj, pairs_14_c6, pairs_14_c12 = [], [], [], []
-
-    for index, line_atomtype1 in atomtype1.iterrows():
-        line_atomtype2 = atomtype2.loc[(atomtype2["resnum"] == line_atomtype1["resnum"] + shift)].squeeze(axis=None)
-        if not line_atomtype2.empty:
-            pairs_14_ai.append(line_atomtype1["number"])
-            pairs_14_aj.append(line_atomtype2["number"])
-            pairs_14_c6.append(c6)
-            c12 = 1
-            if constant is not None:
-                c12 = constant
-            if prefactor is not None:
-                mixed_c12 = prefactor * np.sqrt(line_atomtype1["c12"] * line_atomtype2["c12"])
-                c12 = min(c12, mixed_c12)
-
-            pairs_14_c12.append(c12)
-
-    pairs_14 = pd.DataFrame(
-        columns=[
-            "ai",
-            "aj",
-            "func",
-            "c6",
-            "c12",
-            "probability",
-            "rc_probability",
-            "source",
+    bonded_interactions: dict
+        {molecule_name: {"bonds", "angles", "dihedrals", "impropers", "pairs": pd.DataFrame, "bond_pairs": list}}
+    """
+    bonded_interactions = {}
+    for name, molecule in topology.molecules.items():
+        bonded_interactions[name] = {
+            "bonds": get_bonds(molecule[0].bonds),
+            "angles": get_angles(molecule[0].angles),
+            "dihedrals": get_dihedrals(molecule[0].dihedrals),
+            "impropers": get_impropers(molecule[0].impropers),
+            "pairs": get_pairs(molecule[0].adjusts),
+            "bond_pairs": get_bond_pairs(molecule[0].bonds),
+        }
+
+    return bonded_interactions
+
+
+def get_lj_data(topology):
+    """
+    Extracts the Lennard-Jones parameters (atom types, [ nonbond_params ] and [ pairs ]) from a molecular topology.
+
+    Parameters
+    ----------
+    topology: parmed.topology object
+        Contains the molecular topology information
+
+    Returns
+    -------
+    lj_data: dict
+        {"lj_params": pd.DataFrame, "lj_pairs": pd.DataFrame, "lj14_pairs": pd.DataFrame}
+    """
+    return {
+        "lj_params": get_lj_params(topology),
+        "lj_pairs": get_lj_pairs(topology),
+        "lj14_pairs": get_lj14_pairs(topology),
+    }
+
+
+def get_lj14_rule_pairs(topology_df, combinations=type_definitions.atom_type_combinations):
+    """
+    Resolves the multi-eGO-specific 1-4 (like) rules on a protein topology. Each rule pairs the atoms of a first
+    type with the atoms of a second type found in the residue shifted by a given amount, the partners are found
+    for all the atoms of a rule at once by a binary search on the residue numbers.
+
+    Parameters
+    ----------
+    topology_df: pd.DataFrame
+        The atoms of the molecule, with the "name", "type", "resname", "resnum" and "c12" columns
+    combinations: list
+        The rules as (atomtype1, atomtype2, prefactor, constant, shift) tuples, atomtypes are the keys of
+        type_definitions.lj14_generator. The c12 is prefactor times the mixed c12 of the two atoms, capped to constant.
+        Positive shifts pair atomtype1 with the atomtype2 of the next residue, negative shifts with the previous one
+
+    Returns
+    -------
+    ai, aj: np.ndarray
+        The positions (0-based rows of topology_df) of the two atoms of each pair, one entry per pair
+    c12: np.ndarray
+        The c12 of each pair
+    """
+    types = type_definitions.lj14_generator(topology_df)
+    resnum = topology_df["resnum"].to_numpy().astype(int)
+    atom_c12 = topology_df["c12"].to_numpy().astype(float)
+
+    ai, aj, c12 = [], [], []
+    for atomtype1, atomtype2, prefactor, constant, shift in combinations:
+        if prefactor is None and constant is None:
+            raise ValueError("Neither prefactor nor constant has been set.")
+        first = np.flatnonzero(types[atomtype1])
+        second = np.flatnonzero(types[atomtype2])
+        second = second[np.argsort(resnum[second], kind="stable")]
+        # all the atoms of the second type in the shifted residue of each atom of the first type
+        start = np.searchsorted(resnum[second], resnum[first] + shift, side="left")
+        stop = np.searchsorted(resnum[second], resnum[first] + shift, side="right")
+        n_partners = stop - start
+        rule_ai = np.repeat(first, n_partners)
+        rule_aj = second[
+            np.repeat(start, n_partners)
+            + np.arange(n_partners.sum())
+            - np.repeat(np.cumsum(n_partners) - n_partners, n_partners)
         ]
-    )
-    pairs_14["ai"] = pairs_14_ai
-    pairs_14["aj"] = pairs_14_aj
-    pairs_14["func"] = 1
-    pairs_14["c6"] = pairs_14_c6
-    pairs_14["c12"] = pairs_14_c12
-    pairs_14["source"] = "1-4"
-    pairs_14["probability"] = 1.0
-    pairs_14["rc_probability"] = 1.0
 
-    return pairs_14
+        if prefactor is None:
+            rule_c12 = np.full(len(rule_ai), constant)
+        else:
+            rule_c12 = prefactor * np.sqrt(atom_c12[rule_ai] * atom_c12[rule_aj])
+            if constant is not None:
+                rule_c12 = np.fmin(rule_c12, constant)
+
+        ai.append(rule_ai)
+        aj.append(rule_aj)
+        c12.append(rule_c12)
+
+    return np.concatenate(ai).astype(int), np.concatenate(aj).astype(int), np.concatenate(c12).astype(float)
 
 
 def protein_LJ14(reduced_topology):
@@ -487,190 +557,22 @@ def protein_LJ14(reduced_topology):
     Returns:
     - pairs (pd.DataFrame): DataFrame with LJ14 pairs for protein interactions.
     """
-    # Here we make a dictionary of the atoms used for local geometry
-    first_backbone_nitrogen = reduced_topology.loc[(reduced_topology["name"] == "N") & (reduced_topology["type"] == "NL")]
-    backbone_nitrogen = reduced_topology.loc[(reduced_topology["name"] == "N") & (reduced_topology["type"] != "NL")]
-    backbone_carbonyl = reduced_topology.loc[reduced_topology["name"] == "C"]
-    backbone_calpha = reduced_topology.loc[reduced_topology["name"] == "CA"]
-    backbone_oxygen = reduced_topology.loc[reduced_topology["name"] == "O"]
-    ct_oxygen = reduced_topology.loc[(reduced_topology["name"] == "O1") | (reduced_topology["name"] == "O2")]
-    sidechain_cb = reduced_topology.loc[reduced_topology["name"] == "CB"]
-    sidechain_cgs = reduced_topology.loc[
-        (reduced_topology["name"] == "CG")
-        | (reduced_topology["name"] == "CG1")
-        | (reduced_topology["name"] == "CG2")
-        | (reduced_topology["name"] == "SG")
-        | (reduced_topology["name"] == "OG")
-        | (reduced_topology["name"] == "OG1") & (reduced_topology["resname"] != "PRO")
-    ]
-    sidechain_cds = reduced_topology.loc[
-        (reduced_topology["name"] == "CD")
-        | (reduced_topology["name"] == "CD1")
-        | (reduced_topology["name"] == "CD2")
-        | (reduced_topology["name"] == "SD")
-        | (reduced_topology["name"] == "OD")
-        | (reduced_topology["name"] == "OD1")
-        | (reduced_topology["name"] == "OD2")
-        | (reduced_topology["name"] == "ND1")
-        | (reduced_topology["name"] == "ND2") & (reduced_topology["resname"] != "PRO")
-    ]
-    pairs = pd.DataFrame()
-
-    # For backbone carbonyl take the CB of the next residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=backbone_carbonyl,
-                atomtype2=sidechain_cb,
-                constant=1.299682e-06,
-                prefactor=0.275,
-                shift=+1,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For backbone oxygen take the CB of the same residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(atomtype1=backbone_oxygen, atomtype2=sidechain_cb, constant=1.5e-6, prefactor=1),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # now we add the pair between the last CB and the two OCT ones
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(atomtype1=ct_oxygen, atomtype2=sidechain_cb, constant=1.5e-6, prefactor=1),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For each backbone nitrogen take the CB of the previuos residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=backbone_nitrogen,
-                atomtype2=sidechain_cb,
-                constant=2.7e-6,
-                prefactor=1.00,
-                shift=-1,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For the first backbone nitrogen take the N of the next residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=first_backbone_nitrogen,
-                atomtype2=backbone_nitrogen,
-                constant=4.0e-06,
-                shift=+1,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For each backbone nitrogen take the N of the next residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=backbone_nitrogen,
-                atomtype2=backbone_nitrogen,
-                prefactor=0.343,
-                shift=+1,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For each backbone carbonyl take the carbonyl of the next residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=backbone_carbonyl,
-                atomtype2=backbone_carbonyl,
-                prefactor=0.5,
-                shift=-1,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For each backbone carbonyl take the CGs of the same residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(atomtype1=sidechain_cgs, atomtype2=backbone_carbonyl, constant=1.2e-6, prefactor=0.25),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    # For each backbone nitrogen take the CGs of the same residue and save in a pairs tuple
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(atomtype1=sidechain_cgs, atomtype2=backbone_nitrogen, constant=5.5e-7, prefactor=0.2),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(
-                atomtype1=sidechain_cgs,
-                atomtype2=first_backbone_nitrogen,
-                constant=5.5e-7,
-                prefactor=0.2,
-            ),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
-    pairs = pd.concat(
-        [
-            pairs,
-            create_pairs_14_dataframe(atomtype1=sidechain_cds, atomtype2=backbone_calpha, constant=5e-7, prefactor=0.100),
-        ],
-        axis=0,
-        sort=False,
-        ignore_index=True,
-    )
+    ai, aj, c12 = get_lj14_rule_pairs(reduced_topology)
+    number = reduced_topology["number"].to_numpy()
 
     # make it symmetric
-    inv_LJ = pairs[["aj", "ai", "func", "c6", "c12", "probability", "rc_probability", "source"]].copy()
-    inv_LJ.columns = [
-        "ai",
-        "aj",
-        "func",
-        "c6",
-        "c12",
-        "probability",
-        "rc_probability",
-        "source",
-    ]
-
-    pairs = pd.concat([pairs, inv_LJ], axis=0, sort=False, ignore_index=True)
+    pairs = pd.DataFrame(
+        {
+            "ai": np.concatenate([number[ai], number[aj]]),
+            "aj": np.concatenate([number[aj], number[ai]]),
+            "func": 1,
+            "c6": 0.0,
+            "c12": np.concatenate([c12, c12]),
+            "probability": 1.0,
+            "rc_probability": 1.0,
+            "source": "1-4",
+        }
+    )
     pairs["ai"] = pairs["ai"].astype(str)
     pairs["aj"] = pairs["aj"].astype(str)
 
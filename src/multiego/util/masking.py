@@ -116,10 +116,89 @@ def map_c12_mask(types, mask, standard_c12_dict, special_c12_dict):
     Returns:
     - numpy.ndarray: A combined array of c12 values based on the mask and dictionaries.
     """
-    translator = lambda types, c12s_dict: np.vectorize(c12s_dict.__getitem__)(types)
-    standard_c12 = np.where(np.logical_not(mask), translator(types, standard_c12_dict), 0.0)
-    special_c12 = np.where(mask, translator(types, special_c12_dict), 0.0)
+    # each distinct type is looked up once
+    unique_types, codes = np.unique(types, return_inverse=True)
+    translator = lambda c12s_dict: np.array([c12s_dict[t] for t in unique_types], dtype=float)[codes.reshape(np.shape(types))]
+    standard_c12 = np.where(np.logical_not(mask), translator(standard_c12_dict), 0.0)
+    special_c12 = np.where(mask, translator(special_c12_dict), 0.0)
 
     all_c12 = standard_c12 + special_c12
 
     return all_c12
+
+
+def encode_types(*type_sets):
+    """
+    Encodes one or more sets of types to small integers with a shared vocabulary.
+
+    Args:
+    - type_sets (numpy.ndarray): The sets of types to encode.
+
+    Returns:
+    - numpy.ndarray: The sorted unique types (the vocabulary).
+    - list of numpy.ndarray: The code of each element of each set, its position in the vocabulary.
+    """
+    vocabulary, codes = np.unique(np.concatenate([np.asarray(types) for types in type_sets]), return_inverse=True)
+    return vocabulary, np.split(codes.ravel(), np.cumsum([len(types) for types in type_sets])[:-1])
+
+
+def create_rule_table(vocabulary, rules, symmetrize=False):
+    """
+    Creates a lookup table of type-pair rules indexed by the codes of two types.
+
+    Args:
+    - vocabulary (numpy.ndarray): The vocabulary of the types, as returned by encode_types().
+    - rules (list): The rules (at most 64), each a list of tuples of types like the types of create_matrix_mask().
+    - symmetrize (bool): Flag to determine whether to symmetrize type selection.
+
+    Returns:
+    - numpy.ndarray: A (len(vocabulary), len(vocabulary)) uint64 table whose bit k is set for the pairs of rules[k].
+    """
+    rules = list(rules)
+    if len(rules) > 64:
+        raise ValueError(f"At most 64 type-pair rules can be evaluated at once, got {len(rules)}")
+    code = {t: i for i, t in enumerate(vocabulary)}
+    table = np.zeros((len(vocabulary), len(vocabulary)), dtype=np.uint64)
+    for bit, types in enumerate(rules):
+        if symmetrize:
+            types = types + [(t[1], t[0]) for t in types]
+        for type1, type2 in types:
+            if type1 in code and type2 in code:
+                table[code[type1], code[type2]] |= np.uint64(1) << np.uint64(bit)
+    return table
+
+
+def get_rule_masks(rule_bits, rules):
+    """
+    Splits the bits looked up in a table from create_rule_table() in one boolean mask per rule.
+
+    Args:
+    - rule_bits (numpy.ndarray): The values of the table for each pair.
+    - rules (dict): The rules the table was created from, by name.
+
+    Returns:
+    - dict: {name: mask} with the shape of rule_bits.
+    """
+    return {name: (rule_bits & (np.uint64(1) << np.uint64(bit))) != 0 for bit, name in enumerate(rules)}
+
+
+def create_rule_masks(set1, set2, rules, symmetrize=False, matrix=False):
+    """
+    Evaluates several type-pair rules in one pass: the types are encoded once and every pair is looked up
+    in a single table, instead of comparing the strings of the sets for each tuple of types.
+
+    Args:
+    - set1 (numpy.ndarray): First set of types.
+    - set2 (numpy.ndarray): Second set of types.
+    - rules (dict): {name: list of tuples of types}, the types of each rule as in create_matrix_mask().
+    - symmetrize (bool): Flag to determine whether to symmetrize type selection.
+    - matrix (bool): Whether to evaluate all the pairs of set1 and set2 (like create_matrix_mask())
+      instead of the element-wise pairs (like create_linearized_mask()).
+
+    Returns:
+    - dict: {name: boolean mask} of shape (len(set1), len(set2)) if matrix else (len(set1),).
+    """
+    vocabulary, (codes1, codes2) = encode_types(set1, set2)
+    table = create_rule_table(vocabulary, rules.values(), symmetrize)
+    rule_bits = table[codes1[:, np.newaxis], codes2[np.newaxis, :]] if matrix else table[codes1, codes2]
+    return get_rule_masks(rule_bits, rules)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def get_pair_keys(ai, aj):
+    """
+    Packs pairs of atom indices in uint64 keys, ai in the high and aj in the low 32 bits.
+
+    Args:
+    - ai (numpy.ndarray): Non negative integer indices of the first atoms (atom_id or atom number).
+    - aj (numpy.ndarray): Non negative integer indices of the second atoms.
+
+    Returns:
+    - numpy.ndarray: The uint64 key of each pair, ordered as the pairs (ai, aj).
+    """
+    return (np.asarray(ai).astype(np.uint64) << np.uint64(32)) | np.asarray(aj).astype(np.uint64)
+
+
+def get_pair_set(ai, aj):
+    """
+    Returns the sorted unique keys of a set of pairs, to be used with isin and lookup.
+
+    Args:
+    - ai (numpy.ndarray): Indices of the first atoms.
+    - aj (numpy.ndarray): Indices of the second atoms.
+
+    Returns:
+    - numpy.ndarray: The sorted uint64 keys.
+    """
+    return np.unique(get_pair_keys(ai, aj))
+
+
+def lookup(keys, sorted_keys):
+    """
+    Finds keys in a sorted array of keys by binary search.
+
+    Args:
+    - keys (numpy.ndarray): The uint64 keys to look for.
+    - sorted_keys (numpy.ndarray): The sorted uint64 keys to search in.
+
+    Returns:
+    - numpy.ndarray: The position of each key in sorted_keys (undefined where not found).
+    - numpy.ndarray: A boolean mask of the keys found.
+    """
+    positions = np.searchsorted(sorted_keys, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    in_range = positions < len(sorted_keys)
+    found[in_range] = sorted_keys[positions[in_range]] == keys[in_range]
+    return positions, found
+
+
+def isin(keys, sorted_keys):
+    """
+    Returns a boolean mask of the keys that are in a sorted array of keys.
+    """
+    return lookup(keys, sorted_keys)[1]
@@ -1,11 +1,16 @@
 import unittest
 import subprocess
 import shutil
+import glob
+import yaml
+import sys
 import os
 
 TEST_ROOT = os.path.dirname(os.path.abspath(__file__))
 MEGO_ROOT = os.path.abspath(os.path.join(TEST_ROOT, os.pardir))
-# sys.path.append(MEGO_ROOT)
+sys.path.append(MEGO_ROOT)
+
+from src.multiego import io
 
 
 def read_infile(path):
@@ -13,6 +18,10 @@ def read_infile(path):
     Reads a test-case input file and parses the system name the multi-eGO
     command line parameters.
 
+    A command can be followed by ' | ' and a list of output=case pairs, e.g. 'sweep_e0.25_1=case_3':
+    the model written to outputs/<system>/<output> is then compared with the expected outputs of
+    test_outputs/<system>/<case>, instead of the command having its own expected outputs.
+
     Parameters
     ----------
     path : str
@@ -24,20 +33,25 @@ def read_infile(path):
         A list of the commands split at each whitespace
     test_systems : list
         A list containing the system names
+    comparisons : list of list
+        A list containing the (output, case) pairs of each command, empty for the commands with their own expected outputs
     """
     input_list = []
     test_systems = []
+    comparisons = []
     with open(path, "r") as f:
         for line in f.readlines():
             if line[0] == "#":
                 continue
-            line = line.replace("\n", "").split(" ")
+            line, _, pairs = line.replace("\n", "").partition(" | ")
+            line = line.split(" ")
             system_index = line.index("--system") + 1
 
             input_list.append(line)
             test_systems.append(line[system_index])
+            comparisons.append([tuple(pair.split("=")) for pair in pairs.split()])
 
-    return input_list, test_systems
+    return input_list, test_systems, comparisons
 
 
 def read_outfile(path):
@@ -63,7 +77,7 @@ def read_outfile(path):
     return out_string
 
 
-def prep_system_data(name, index):
+def prep_system_data(name, index, output=None):
     """
     Prepares system data to be compared and tested by reading all necessary files.
 
@@ -76,6 +90,8 @@ def prep_system_data(name, index):
          - a string in the case of random coil
          - a list in case of production
         When egos is a list the list contains the two epsilon values for intra and inter.
+    output : str, optional
+        The folder of outputs/<name> to be tested against test_outputs/<name>/case_<index>, by default case_<index>
 
     Returns
     -------
@@ -88,13 +104,47 @@ def prep_system_data(name, index):
     ffnonbonded_test : str
         The contents of the newly created ffnonbonded which needs to match ffnonbonded_ref
     """
+    output = output or f"case_{index}"
     topol_ref = read_outfile(f"{TEST_ROOT}/test_outputs/{name}/case_{index}/topol_mego.top")
-    topol_test = read_outfile(f"{MEGO_ROOT}/outputs/{name}/case_{index}/topol_mego.top")
+    topol_test = read_outfile(f"{MEGO_ROOT}/outputs/{name}/{output}/topol_mego.top")
     ffnonbonded_ref = read_outfile(f"{TEST_ROOT}/test_outputs/{name}/case_{index}/ffnonbonded.itp")
-    ffnonbonded_test = read_outfile(f"{MEGO_ROOT}/outputs/{name}/case_{index}/ffnonbonded.itp")
+    ffnonbonded_test = read_outfile(f"{MEGO_ROOT}/outputs/{name}/{output}/ffnonbonded.itp")
     return topol_ref, topol_test, ffnonbonded_ref, ffnonbonded_test
 
 
+def create_comparison_test_case(test_case, output, case):
+    """
+    Creates a test function comparing a model written by a test case with the expected outputs of another one,
+    e.g. a model of a sweep with the model of the direct run with the same parameters.
+
+    Parameters
+    ----------
+    test_case : list
+        Contains the multi-eGO command line flags followed by arguments.
+    output : str
+        The folder of outputs/<system_name> written by the test case
+    case : str
+        The folder of test_outputs/<system_name> with the expected outputs, case_<index>
+
+    Returns
+    -------
+    function_name : str
+        The name of the function in format 'test_<system_name>/<output>'
+    function_template : function(self)
+        A function taking only self as a parameter intended to be used as a unittest test case.
+    """
+    system_name = test_case[test_case.index("--system") + 1]
+    function_name = f"test_{system_name}/{output}"
+    index = int(case.split("_")[-1])
+
+    def function_template(self):
+        topol_ref, topol_test, ffnonbonded_ref, ffnonbonded_test = prep_system_data(system_name, index, output)
+        self.assertEqual(topol_ref, topol_test, f"{system_name} :: {function_name} topology not equal to {case}")
+        self.assertEqual(ffnonbonded_ref, ffnonbonded_test, f"{system_name} :: {function_name} nonbonded not equal to {case}")
+
+    return function_name, function_template
+
+
 def create_test_cases(test_case):
     """
     Creates a test function based on the parameters. The metafunctions can be used with TestOutputs
@@ -137,7 +187,7 @@ def create_test_cases(test_case):
 class TestOutputs(unittest.TestCase):
     @classmethod
     def setUpClass(self):
-        test_commands, test_systems = read_infile(f"{TEST_ROOT}/test_cases.txt")
+        test_commands, test_systems, _ = read_infile(f"{TEST_ROOT}/test_cases.txt")
         # remake test_commands with only what comes before # if present
         test_commands = [[arg for arg in command if arg != "#"] for command in test_commands]
         # replace instances of TEST_ROOT in the commands with the actual path if TEST_ROOT is present
@@ -156,10 +206,67 @@ class TestOutputs(unittest.TestCase):
             assert e == 0, "Test setup exited with non-zero error code"
 
 
+class TestDenseContactMatrix(unittest.TestCase):
+    """
+    Runs production cases with all their contact matrices converted to the dense format (.ndx.mm),
+    as system <system>_mm, and compares the models with the expected outputs of the original matrices.
+    """
+
+    cases = {"gpref": "case_2", "ttrref": "case_1"}
+
+    @classmethod
+    def setUpClass(self):
+        for system in self.cases:
+            inputs_path = f"{MEGO_ROOT}/inputs/{system}_mm"
+            outputs_path = f"{MEGO_ROOT}/outputs/{system}_mm"
+            if os.path.exists(inputs_path):
+                shutil.rmtree(inputs_path)
+            if os.path.exists(outputs_path):
+                shutil.rmtree(outputs_path)
+            shutil.copytree(f"{TEST_ROOT}/test_inputs/{system}", inputs_path)
+            for path in glob.glob(f"{inputs_path}/*/*.ndx*"):
+                contact_matrix = io.read_contact_matrix_file(path, path.endswith(".h5"))
+                io.write_dense_contact_matrix(f"{io.strip_gz_h5_suffix(path)}.mm", contact_matrix)
+                os.remove(path)
+
+            with open(f"{TEST_ROOT}/test_inputs/{system}/config.yml") as f:
+                config = yaml.safe_load(f)
+            config = [
+                {"system": f"{system}_mm"} if isinstance(element, dict) and "system" in element else element
+                for element in config
+            ]
+            with open(f"{inputs_path}/config.yml", "w") as f:
+                yaml.safe_dump(config, f)
+
+            e = subprocess.call(
+                ["python", f"{MEGO_ROOT}/multiego.py", "--config", f"{inputs_path}/config.yml", "--explicit_name", "case"]
+            )
+            assert e == 0, "Test setup exited with non-zero error code"
+
+    def compare(self, system):
+        case = self.cases[system]
+        for output in ["topol_mego.top", "ffnonbonded.itp"]:
+            reference = read_outfile(f"{TEST_ROOT}/test_outputs/{system}/{case}/{output}")
+            # the name of the system is the only expected difference
+            test = read_outfile(f"{MEGO_ROOT}/outputs/{system}_mm/case_1/{output}").replace(f"{system}_mm", system)
+            self.assertEqual(reference, test, f"{system}_mm :: {output} not equal to {system}/{case}")
+
+    def test_gpref(self):
+        self.compare("gpref")
+
+    def test_ttrref(self):
+        self.compare("ttrref")
+
+
 if __name__ == "__main__":
-    test_commands, test_systems = read_infile(f"{TEST_ROOT}/test_cases.txt")
-    for command in test_commands:
-        function_name, new_method = create_test_cases(command)
-        setattr(TestOutputs, function_name, new_method)
+    test_commands, test_systems, comparisons = read_infile(f"{TEST_ROOT}/test_cases.txt")
+    for command, pairs in zip(test_commands, comparisons):
+        if pairs:
+            for output, case in pairs:
+                function_name, new_method = create_comparison_test_case(command, output, case)
+                setattr(TestOutputs, function_name, new_method)
+        else:
+            function_name, new_method = create_test_cases(command)
+            setattr(TestOutputs, function_name, new_method)
 
     unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from multiego import topology
+
+import argparse
+import numpy as np
+import parmed
+import time
+import types
+import warnings
+
+
+def make_synthetic_topology(n_types, n_nbfix, n_pairs14, seed=0):
+    """
+    Builds an object exposing the parts of a parmed topology read by the LJ extractors:
+    atoms with type/sigma/epsilon, parameterset.nbfix_types and the [ pairs ] of one molecule.
+    """
+    rng = np.random.default_rng(seed)
+    type_names = [f"C{i}_SYN_{i}" for i in range(n_types)]
+    atoms = [
+        types.SimpleNamespace(type=name, sigma=rng.uniform(0.0, 0.5), epsilon=rng.uniform(1e-7, 1e-5)) for name in type_names
+    ]
+    ai = rng.integers(0, n_types, n_nbfix)
+    aj = rng.integers(0, n_types, n_nbfix)
+    nbfix_types = {
+        (type_names[i], type_names[j]): (rng.uniform(1e-7, 1e-5), rng.choice([0.0, rng.uniform(0.2, 0.6)]))
+        for i, j in zip(ai, aj)
+    }
+    adjusts = [
+        types.SimpleNamespace(
+            atom1=atoms[i],
+            atom2=atoms[j],
+            type=types.SimpleNamespace(sigma=rng.uniform(0.0, 0.5), epsilon=rng.uniform(1e-7, 1e-5)),
+        )
+        for i, j in zip(rng.integers(0, n_types, n_pairs14), rng.integers(0, n_types, n_pairs14))
+    ]
+    return types.SimpleNamespace(
+        atoms=atoms,
+        parameterset=types.SimpleNamespace(nbfix_types=nbfix_types),
+        molecules={"SYN": (types.SimpleNamespace(adjusts=adjusts), 3)},
+    )
+
+
+def run_benchmark(top, repeat):
+    """
+    Times the LJ extractors on a topology, printing the best time and the throughput of each one.
+    """
+    extractors = {
+        "get_lj_params": (topology.get_lj_params, len(top.atoms)),
+        "get_lj_pairs": (topology.get_lj_pairs, len(top.parameterset.nbfix_types)),
+        "get_lj14_pairs": (topology.get_lj14_pairs, sum(len(mol[0].adjusts) for mol in top.molecules.values())),
+    }
+    print(f"{'extractor':<16} {'entries':>10} {'best time (s)':>14} {'entries/s':>12}")
+    for name, (extractor, n_entries) in extractors.items():
+        timings = []
+        for _ in range(repeat):
+            st = time.perf_counter()
+            extractor(top)
+            timings.append(time.perf_counter() - st)
+        best = min(timings)
+        throughput = n_entries / best if best > 0 else float("inf")
+        print(f"{name:<16} {n_entries:>10d} {best:>14.4f} {throughput:>12.3e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the throughput of the LJ parameter extraction from topologies")
+    parser.add_argument("--top", type=str, help="Topology to read, a synthetic one is generated if not set")
+    parser.add_argument("--n_types", type=int, default=2000, help="Number of atom types of the synthetic topology")
+    parser.add_argument("--n_nbfix", type=int, default=1000000, help="Number of nonbond_params of the synthetic topology")
+    parser.add_argument("--n_pairs14", type=int, default=100000, help="Number of [ pairs ] of the synthetic topology")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions, the best one is reported")
+    args = parser.parse_args()
+
+    if args.top:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            top = parmed.load_file(args.top)
+    else:
+        top = make_synthetic_topology(args.n_types, args.n_nbfix, args.n_pairs14)
+
+    run_benchmark(top, args.repeat)
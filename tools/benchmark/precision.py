@@ -0,0 +1,149 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+import synthetic_system
+
+import argparse
+import json
+import numpy as np
+import shutil
+import yaml
+
+PRECISIONS = ["float64", "float32"]
+
+
+def read_section(path, section):
+    """
+    Reads the c6 and c12 of the lines of a section of a topology, e.g. [ nonbond_params ] or [ pairs ].
+    The lines are identified by the molecule they belong to (for [ pairs ]) and by their first two columns.
+
+    Returns
+    -------
+    parameters : dict
+        {(molecule, ai, aj): np.array([c6, c12])}
+    """
+    parameters = {}
+    current, molecule = None, 0
+    with open(path) as f:
+        for line in f:
+            line = line.split(";")[0].strip()
+            if not line:
+                continue
+            if line.startswith("["):
+                current = line.strip("[] ")
+                if current == "moleculetype":
+                    molecule += 1
+                continue
+            if current == section:
+                fields = line.split()
+                parameters[(molecule, fields[0], fields[1])] = np.array([float(fields[3]), float(fields[4])])
+    return parameters
+
+
+def get_deviations(reference, parameters):
+    """
+    Compares the c6 and c12 of two runs, returns the maximum relative deviation of each, the line where it is reached
+    and the number of lines written by only one of the runs.
+    """
+    common = sorted(set(reference) & set(parameters))
+    result = {"lines": len(common), "only_float64": len(set(reference) - set(parameters))}
+    result["only_float32"] = len(set(parameters) - set(reference))
+    if not common:
+        return result
+
+    expected = np.array([reference[key] for key in common])
+    values = np.array([parameters[key] for key in common])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = np.where(expected != 0, np.abs(values - expected) / np.abs(expected), np.where(values != 0, np.inf, 0.0))
+    for column, name in enumerate(["c6", "c12"]):
+        worst = int(np.argmax(deviation[:, column]))
+        result[name] = {"max_relative_deviation": float(deviation[worst, column]), "line": list(common[worst][1:])}
+    return result
+
+
+def run(config, precision, no_cache):
+    """
+    Runs multiego.py with the given precision and returns the output folder and the peak memory.
+    """
+    arguments = ["--config", config, "--explicit_name", f"precision_{precision}", "--precision", precision, "--perf_report"]
+    output_dir = synthetic_system.run_multiego(arguments + (["--no_cache"] if no_cache else []))
+    with open(f"{output_dir}/perf_report.json") as f:
+        report = json.load(f)
+    return output_dir, report["peak_rss_mb"]
+
+
+def get_system(config):
+    with open(config) as f:
+        for element in yaml.safe_load(f):
+            if isinstance(element, dict) and "system" in element:
+                return element["system"]
+    raise ValueError(f"No system found in {config}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs multi-eGO with --precision float64 and float32 and reports the maximum relative deviation "
+        "of the written c6 and c12, and the peak memory of each run"
+    )
+    parser.add_argument("--config", type=str, help="Configuration of a production run, by default a synthetic system is used")
+    parser.add_argument("--n_residues", type=int, default=56, help="Number of residues of the synthetic molecule")
+    parser.add_argument("--n_trainings", type=int, default=2, help="Number of trainings of the synthetic system")
+    parser.add_argument("--density", type=float, default=0.05, help="Fraction of pairs in contact in the trainings")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random numbers")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic inputs and the outputs")
+    parser.add_argument("--output", type=str, help="JSON file where the results are saved")
+    args = parser.parse_args()
+
+    root_dir = synthetic_system.MEGO_ROOT
+    synthetic = args.config is None
+    if synthetic:
+        system = "precision"
+        config, _ = synthetic_system.generate_system(
+            system, args.n_residues, 1, 1, args.n_trainings, args.density, "mm", seed=args.seed
+        )
+    else:
+        config = os.path.abspath(args.config)
+        system = get_system(config)
+
+    runs = {}
+    try:
+        for precision in PRECISIONS:
+            runs[precision] = run(config, precision, synthetic)
+        parameters = {
+            precision: {
+                "nonbond_params": read_section(f"{output_dir}/ffnonbonded.itp", "nonbond_params"),
+                "pairs": read_section(f"{output_dir}/topol_mego.top", "pairs"),
+            }
+            for precision, (output_dir, _) in runs.items()
+        }
+    finally:
+        if not args.keep:
+            if synthetic:
+                shutil.rmtree(f"{root_dir}/inputs/{system}", ignore_errors=True)
+                shutil.rmtree(f"{root_dir}/outputs/{system}", ignore_errors=True)
+            else:
+                for output_dir, _ in runs.values():
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+    results = {"peak_rss_mb": {precision: peak_rss_mb for precision, (_, peak_rss_mb) in runs.items()}}
+    for section in ["nonbond_params", "pairs"]:
+        results[section] = get_deviations(parameters["float64"][section], parameters["float32"][section])
+
+    print(
+        f"peak memory (MB): float64 {results['peak_rss_mb']['float64']:.1f}, float32 {results['peak_rss_mb']['float32']:.1f}"
+    )
+    for section in ["nonbond_params", "pairs"]:
+        result = results[section]
+        print(
+            f"[ {section} ] {result['lines']} lines, only in float64 {result['only_float64']}, only in float32 {result['only_float32']}"
+        )
+        for name in ["c6", "c12"]:
+            if name in result:
+                line = " ".join(result[name]["line"])
+                print(f"\t{name}: maximum relative deviation {result[name]['max_relative_deviation']:.3e} ({line})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
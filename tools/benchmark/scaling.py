@@ -0,0 +1,119 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+import synthetic_system
+
+import argparse
+import json
+import numpy as np
+import shutil
+import time
+
+# the pipeline stages timed, as named in the perf_report.json of multiego.py
+STAGES = {
+    "init_meGO_matrices": "matrices",
+    "init_LJ_datasets": "LJ dataset",
+    "generate_LJ": "generate LJ",
+    "make_pairs_exclusion_topology": "pairs and exclusions",
+    "write_model": "write",
+}
+
+
+def run_size(n_residues, args):
+    """
+    Generates a synthetic system of about n_residues residues per molecule, runs multiego.py on it
+    and returns its size, the wall time of each stage and the peak memory.
+    """
+    system = f"{args.system}_{n_residues}"
+    root_dir = synthetic_system.MEGO_ROOT
+    config, n_atoms = synthetic_system.generate_system(
+        system,
+        n_residues,
+        args.n_molecules,
+        args.n_references,
+        args.n_trainings,
+        args.density,
+        args.format,
+        seed=args.seed,
+    )
+
+    try:
+        st = time.perf_counter()
+        output_dir = synthetic_system.run_multiego(
+            ["--config", config, "--explicit_name", "scaling", "--perf_report", "--no_cache"]
+        )
+        total_time = time.perf_counter() - st
+        with open(f"{output_dir}/perf_report.json") as f:
+            report = json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(f"{root_dir}/inputs/{system}", ignore_errors=True)
+            shutil.rmtree(f"{root_dir}/outputs/{system}", ignore_errors=True)
+
+    timings = {
+        function: sum(s["wall_time"] for s in report["stages"] if s["name"] == stage and s["depth"] <= 1)
+        for function, stage in STAGES.items()
+    }
+    return {"n_residues": n_residues, "n_atoms": n_atoms, "total": total_time, **timings, "peak_rss_mb": report["peak_rss_mb"]}
+
+
+def get_scaling_exponents(results):
+    """
+    Fits time ~ n_atoms ** exponent for each stage, and the peak memory, over the sizes of the ladder.
+    """
+    n_atoms = np.log([result["n_atoms"] for result in results])
+    exponents = {}
+    for key in ["total", *STAGES, "peak_rss_mb"]:
+        values = np.array([result[key] for result in results])
+        if len(results) > 1 and (values > 0).all():
+            exponents[key] = np.polyfit(n_atoms, np.log(values), 1)[0]
+        else:
+            exponents[key] = float("nan")
+    return exponents
+
+
+def print_results(results, exponents):
+    columns = ["n_atoms", "total", *STAGES, "peak_rss_mb"]
+    widths = [max(len(column), 10) for column in columns]
+    print(" ".join(f"{column:>{width}}" for column, width in zip(columns, widths)))
+    for result in results:
+        print(
+            " ".join(f"{result[column]:>{width}.{0 if column == 'n_atoms' else 3}f}" for column, width in zip(columns, widths))
+        )
+    print(" ".join([f"{'exponent':>{widths[0]}}"] + [f"{exponents[c]:>{w}.2f}" for c, w in zip(columns[1:], widths[1:])]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures how the stages of multi-eGO scale with the size of synthetic systems "
+        "(times in seconds, memory in MB, exponents of time ~ n_atoms ** exponent)"
+    )
+    parser.add_argument(
+        "--ladder",
+        type=lambda x: [int(n) for n in x.split(",")],
+        default=[56, 110, 218, 434],
+        help="Comma separated list of the number of residues of each molecule",
+    )
+    parser.add_argument("--n_molecules", type=int, default=1, help="Number of molecule types")
+    parser.add_argument("--n_references", type=int, default=1, help="Number of references")
+    parser.add_argument("--n_trainings", type=int, default=1, help="Number of trainings of each reference")
+    parser.add_argument("--density", type=float, default=0.05, help="Fraction of pairs in contact in the trainings")
+    parser.add_argument("--format", type=str, default="mm", choices=["mm", "h5", "gz"], help="Format of the contact matrices")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random numbers")
+    parser.add_argument("--system", type=str, default="scaling", help="Prefix of the synthetic systems in inputs/")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic inputs and the outputs")
+    parser.add_argument("--output", type=str, help="JSON file where the results are saved")
+    args = parser.parse_args()
+
+    results = []
+    for n_residues in args.ladder:
+        print(f"- {n_residues} residues per molecule")
+        results.append(run_size(n_residues, args))
+    exponents = get_scaling_exponents(results)
+    print_results(results, exponents)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results, "exponents": exponents}, f, indent=2)
@@ -0,0 +1,315 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from multiego import io
+
+import argparse
+import numpy as np
+import pandas as pd
+import shutil
+import subprocess
+import yaml
+
+MEGO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# the chain of the synthetic molecules is built from GB1: its first residue, n copies of the residues
+# 2-10 (THR...LYS) and the residues 11-56, the bonded terms across the copies are those between the
+# residues 10 and 11, a THR like residue 2
+TEMPLATE_TOPOLOGY = f"{MEGO_ROOT}/test/test_inputs/gpref/topol.top"
+TEMPLATE_REPEAT = (2, 10)
+BONDED_SECTIONS = ["bonds", "pairs", "angles", "dihedrals"]
+
+
+def run_multiego(arguments, root_dir=MEGO_ROOT):
+    """
+    Runs multiego.py with the given command line arguments and returns the folder the model was written to,
+    as printed by multi-eGO: outputs/<system>/<name>_1 or the next free <name>_<n> if it already exists.
+    """
+    result = subprocess.run(
+        [sys.executable, f"{root_dir}/multiego.py", *arguments], check=True, stdout=subprocess.PIPE, text=True
+    )
+    output_dirs = [
+        line.split("Output files written to ", 1)[1].strip()
+        for line in result.stdout.splitlines()
+        if "Output files written to " in line
+    ]
+    if not output_dirs:
+        raise RuntimeError(f"multiego.py {' '.join(arguments)} did not write a model")
+    return output_dirs[-1]
+
+
+def read_template(path=TEMPLATE_TOPOLOGY):
+    """
+    Reads the [ atoms ] and the bonded terms of the single molecule of a pdb2gmx topology.
+
+    Returns
+    -------
+    atoms : list of list of str
+        The fields of the atoms
+    bonded : list of (str, list of int, str)
+        The section, the atom indices and the parameters of each bonded term, in order
+    """
+    atoms, bonded = [], []
+    section = None
+    n_atoms = {"bonds": 2, "pairs": 2, "angles": 3, "dihedrals": 4}
+    with open(path) as f:
+        for line in f:
+            line = line.split(";")[0].strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("["):
+                section = line.strip("[] ")
+                continue
+            fields = line.split()
+            if section == "atoms":
+                atoms.append(fields)
+            elif section in BONDED_SECTIONS:
+                n = n_atoms[section]
+                bonded.append((section, [int(x) for x in fields[:n]], " ".join(fields[n:])))
+    return atoms, bonded
+
+
+def build_chain(n_residues, template=None):
+    """
+    Builds a protein chain of about n_residues residues by repeating the residues TEMPLATE_REPEAT of the template.
+
+    Returns
+    -------
+    atoms : list of list of str
+        The fields of the atoms of the chain
+    bonded : list of (str, list of int, str)
+        The bonded terms of the chain
+    """
+    atoms, bonded = template if template is not None else read_template()
+    residue = np.array([int(fields[2]) for fields in atoms])
+    first, last = TEMPLATE_REPEAT
+    n_template_residues = residue.max()
+    unit_residues = last - first + 1
+    n_copies = max(1, int(np.ceil((n_residues - (n_template_residues - unit_residues)) / unit_residues)))
+    # atom indices are 1-based, repeat_start/next_start are the first atoms of the residues first and last + 1
+    repeat_start = int(np.argmax(residue == first)) + 1
+    next_start = int(np.argmax(residue == last + 1)) + 1
+    unit_atoms = next_start - repeat_start
+    tail_shift = (n_copies - 1) * unit_atoms
+
+    def new_index(index, copy):
+        if index < repeat_start:
+            return index
+        if index < next_start:
+            return index + copy * unit_atoms
+        return index + tail_shift
+
+    chain_atoms = []
+    for fields in atoms:
+        index, resnr = int(fields[0]), int(fields[2])
+        for copy in range(n_copies) if first <= resnr <= last else [0]:
+            if resnr < first:
+                new_resnr = str(resnr)
+            elif resnr <= last:
+                new_resnr = str(resnr + copy * unit_residues)
+            else:
+                new_resnr = str(resnr + (n_copies - 1) * unit_residues)
+            chain_atoms.append((new_index(index, copy), [fields[1], new_resnr, fields[3], fields[4], new_resnr] + fields[6:]))
+    chain_atoms.sort(key=lambda x: x[0])
+
+    chain_bonded = []
+    for section, indices, parameters in bonded:
+        residues = residue[np.array(indices) - 1]
+        if not ((residues >= first) & (residues <= last)).any():
+            # terms of the first residue or of the tail
+            chain_bonded.append((section, [new_index(i, 0) for i in indices], parameters))
+            continue
+        for copy in range(n_copies):
+            if copy > 0 and (residues < first).any():
+                continue
+            new_indices = []
+            for i, r in zip(indices, residues):
+                if r > last and copy < n_copies - 1:
+                    # the residue after the repeat is the first one of the next copy
+                    new_indices.append(i - next_start + repeat_start + (copy + 1) * unit_atoms)
+                else:
+                    new_indices.append(new_index(i, copy))
+            chain_bonded.append((section, new_indices, parameters))
+
+    return [[str(index)] + fields for index, fields in chain_atoms], chain_bonded
+
+
+def write_topology(path, molecules, chain, include):
+    """
+    Writes a topology with one moleculetype per name in molecules, each one made of the same chain.
+    """
+    atoms, bonded = chain
+    with open(path, "w") as f:
+        f.write(f'; synthetic multi-eGO system\n#include "{include}"\n')
+        for name in molecules:
+            f.write(f"\n[ moleculetype ]\n; Name nrexcl\n{name} 3\n\n[ atoms ]\n")
+            f.write("\n".join(" ".join(fields) for fields in atoms) + "\n")
+            for section in BONDED_SECTIONS:
+                f.write(f"\n[ {section} ]\n")
+                f.write(
+                    "".join(
+                        f"{' '.join(map(str, indices))} {parameters}\n" for s, indices, parameters in bonded if s == section
+                    )
+                )
+        f.write("\n[ system ]\nsynthetic\n\n[ molecules ]\n")
+        f.write("".join(f"{name} 1\n" for name in molecules))
+
+
+def make_contact_matrix(molecule_ai, molecule_aj, cutoff, density, rng):
+    """
+    Generates a dense contact matrix between two molecules in the .ndx layout, given the cutoff of the n_atoms x n_atoms
+    pairs (shared by the reference and the trainings): a fraction density of the pairs is in contact with a log-uniform
+    probability, the other ones have probability 0.
+    """
+    n_atoms = int(np.sqrt(len(cutoff)))
+    ai, aj = np.divmod(np.arange(n_atoms * n_atoms), n_atoms)
+    probability = np.where(rng.random(len(ai)) < density, 10 ** rng.uniform(-6, 0, len(ai)), 0.0)
+    distance = np.where(probability > 0, rng.uniform(0.3, 1.0, len(ai)) * cutoff, 0.0)
+    return pd.DataFrame(
+        {
+            "molecule_name_ai": str(molecule_ai),
+            "ai": ai + 1,
+            "molecule_name_aj": str(molecule_aj),
+            "aj": aj + 1,
+            "distance": distance,
+            "probability": probability,
+            "cutoff": cutoff,
+            "learned": 1,
+        }
+    )
+
+
+def write_contact_matrix(path, contact_matrix):
+    """
+    Writes a contact matrix in the format given by the extension of path (.ndx.mm, .ndx.h5 or .ndx.gz).
+    """
+    if path.endswith(".mm"):
+        io.write_dense_contact_matrix(path, contact_matrix)
+    elif path.endswith(".h5"):
+        # the columns of the atoms are categories of strings, as written by make_mat
+        contact_matrix = contact_matrix.copy()
+        for column in ["molecule_name_ai", "ai", "molecule_name_aj", "aj"]:
+            categories, codes = np.unique(contact_matrix[column].to_numpy(), return_inverse=True)
+            contact_matrix[column] = pd.Categorical.from_codes(codes, categories=categories.astype(str))
+        contact_matrix.to_hdf(path, key="data", mode="w", format="table", complib="blosc:lz4", complevel=9)
+    else:
+        contact_matrix.to_csv(path, header=False, index=False, sep=" ", float_format="%.6f")
+
+
+def generate_system(
+    system,
+    n_residues,
+    n_molecules=1,
+    n_references=1,
+    n_trainings=1,
+    density=0.05,
+    matrix_format="mm",
+    epsilon=0.3,
+    seed=0,
+    root_dir=MEGO_ROOT,
+):
+    """
+    Writes the inputs of a synthetic multi-eGO system to root_dir/inputs/system: the topology, n_references
+    references (the mg model of the system, with their own contact matrices) and n_trainings trainings for each of
+    them, with an intramat for each molecule and an intermat for each pair of molecules, and config.yml.
+
+    Parameters
+    ----------
+    system : str
+        The name of the system
+    n_residues : int
+        The approximate number of residues of each molecule
+    n_molecules : int
+        The number of molecule types
+    n_references, n_trainings : int
+        The number of references and of trainings of each reference
+    density : float
+        The fraction of the pairs in contact in the training matrices (1 for dense matrices)
+    matrix_format : str
+        The extension of the contact matrices, mm, h5 or gz
+    epsilon : float
+        The epsilon of the references
+    seed : int
+        The seed of the random numbers
+
+    Returns
+    -------
+    config : str
+        The path of the configuration file of the production run
+    n_atoms : int
+        The number of atoms of the system
+    """
+    rng = np.random.default_rng(seed)
+    system_dir = f"{root_dir}/inputs/{system}"
+    shutil.rmtree(system_dir, ignore_errors=True)
+    os.makedirs(system_dir)
+
+    chain = build_chain(n_residues)
+    n_chain_atoms = len(chain[0])
+    molecules = [f"SYN{i}" for i in range(1, n_molecules + 1)]
+    force_field = f"{MEGO_ROOT}/multi-ego-basic.ff/forcefield.itp"
+    write_topology(f"{system_dir}/topol.top", molecules, chain, os.path.relpath(force_field, system_dir))
+
+    # the references are the mg model of the system
+    mg_dir = run_multiego(["--system", system, "--egos", "mg", "--explicit_name", "reference", "--no_cache"], root_dir)
+
+    matrices = [f"intramat_{i}_{i}" for i in range(1, n_molecules + 1)]
+    matrices += [f"intermat_{i}_{j}" for i in range(1, n_molecules + 1) for j in range(i, n_molecules + 1)]
+    input_refs = []
+    for r in range(n_references):
+        reference = f"reference_{r}"
+        trainings = [f"md_{r}_{t}" for t in range(n_trainings)]
+        os.makedirs(f"{system_dir}/{reference}")
+        for file in ["topol_mego.top", "ffnonbonded.itp"]:
+            shutil.copy(f"{mg_dir}/{file}", f"{system_dir}/{reference}/{file}")
+        for training in trainings:
+            os.makedirs(f"{system_dir}/{training}")
+            write_topology(
+                f"{system_dir}/{training}/topol.top",
+                molecules,
+                chain,
+                os.path.relpath(force_field, f"{system_dir}/{training}"),
+            )
+        for matrix in matrices:
+            i, j = matrix.split("_")[1:]
+            cutoff = rng.uniform(0.4, 0.6, n_chain_atoms * n_chain_atoms)
+            # the random coil is dense, the trainings have the requested density
+            for folder, matrix_density in [(reference, 1.0)] + [(training, density) for training in trainings]:
+                write_contact_matrix(
+                    f"{system_dir}/{folder}/{matrix}.ndx.{matrix_format}",
+                    make_contact_matrix(i, j, cutoff, matrix_density, rng),
+                )
+            input_refs.append({"reference": reference, "train": ",".join(trainings), "matrix": matrix, "epsilon": epsilon})
+    shutil.rmtree(f"{root_dir}/outputs/{system}", ignore_errors=True)
+
+    config = f"{system_dir}/config.yml"
+    with open(config, "w") as f:
+        yaml.safe_dump([{"system": system}, {"egos": "production"}, {"input_refs": input_refs}], f, sort_keys=False)
+
+    return config, n_chain_atoms * n_molecules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates the inputs of a synthetic multi-eGO system")
+    parser.add_argument("--system", type=str, default="synthetic", help="Name of the system, written in inputs/<system>")
+    parser.add_argument("--n_residues", type=int, default=100, help="Approximate number of residues of each molecule")
+    parser.add_argument("--n_molecules", type=int, default=1, help="Number of molecule types")
+    parser.add_argument("--n_references", type=int, default=1, help="Number of references")
+    parser.add_argument("--n_trainings", type=int, default=1, help="Number of trainings of each reference")
+    parser.add_argument("--density", type=float, default=0.05, help="Fraction of pairs in contact in the trainings")
+    parser.add_argument("--format", type=str, default="mm", choices=["mm", "h5", "gz"], help="Format of the contact matrices")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random numbers")
+    args = parser.parse_args()
+
+    config, n_atoms = generate_system(
+        args.system,
+        args.n_residues,
+        args.n_molecules,
+        args.n_references,
+        args.n_trainings,
+        args.density,
+        args.format,
+        seed=args.seed,
+    )
+    print(f"{n_atoms} atoms written to {os.path.dirname(config)}, run: python multiego.py --config {config}")
@@ -0,0 +1,95 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from multiego import io
+
+import argparse
+import numpy as np
+import pandas as pd
+import tempfile
+import time
+
+
+def make_synthetic_nonbond_params(n_rows, n_atoms=5000, seed=0):
+    """
+    Builds a table with the columns and types of the [ nonbond_params ] written by write_nonbonded.
+    """
+    rng = np.random.default_rng(seed)
+    atoms = [
+        f"{name}_SYN_{i // 8 + 1}" for i, name in zip(range(n_atoms), ["N", "CA", "CB", "CG", "CD", "C", "O", "H"] * n_atoms)
+    ]
+    ai = rng.integers(0, n_atoms, n_rows)
+    aj = rng.integers(0, n_atoms, n_rows)
+    nonbond_params = pd.DataFrame(
+        {
+            "ai": pd.Categorical.from_codes(ai, categories=atoms),
+            "aj": pd.Categorical.from_codes(aj, categories=atoms),
+            "type": 1,
+            "c6": rng.uniform(0.0, 1e-2, n_rows),
+            "c12": rng.uniform(1e-8, 1e-5, n_rows),
+            "sigma": rng.uniform(0.2, 0.6, n_rows),
+            "epsilon": rng.uniform(-1e-5, 0.4, n_rows),
+            "probability": rng.uniform(0.0, 1.0, n_rows),
+            "rc_probability": rng.uniform(0.0, 1.0, n_rows),
+            "md_threshold": rng.uniform(0.0, 1.0, n_rows),
+            "rc_threshold": rng.uniform(0.0, 1.0, n_rows),
+            "same_chain": rng.random(n_rows) > 0.5,
+            "source": pd.Categorical(rng.choice(["md_ensemble", "mg"], n_rows)),
+            "number_ai": ai + 1,
+            "number_aj": aj + 1,
+        }
+    )
+    nonbond_params.insert(5, ";", ";")
+    return nonbond_params
+
+
+def write_with_to_string(file, nonbond_params):
+    """
+    The writer used before write_dataframe: c6/c12 formatted one by one and the whole table rendered by pandas.
+    """
+    nonbond_params = nonbond_params.copy()
+    nonbond_params["c6"] = nonbond_params["c6"].map(lambda x: "{:.6e}".format(x))
+    nonbond_params["c12"] = nonbond_params["c12"].map(lambda x: "{:.6e}".format(x))
+    nonbond_params = nonbond_params.rename(columns={"ai": "; ai"})
+    file.write(nonbond_params.to_string(index=False))
+
+
+def run_benchmark(nonbond_params, writers, repeat):
+    """
+    Times the writers on a table, printing the best time and the throughput of each one.
+    """
+    print(f"{'writer':<16} {'lines':>10} {'best time (s)':>14} {'lines/s':>12} {'MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = f"{tmp_dir}/ffnonbonded.itp"
+        for name, writer in writers.items():
+            timings = []
+            for _ in range(repeat):
+                st = time.perf_counter()
+                with open(path, "w") as file:
+                    writer(file, nonbond_params)
+                timings.append(time.perf_counter() - st)
+            best = min(timings)
+            n_lines = len(nonbond_params) + 1
+            throughput = n_lines / best if best > 0 else float("inf")
+            print(f"{name:<16} {n_lines:>10d} {best:>14.4f} {throughput:>12.3e} {os.path.getsize(path) / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the throughput of the writer of the multi-eGO output tables")
+    parser.add_argument("--n_rows", type=int, default=1000000, help="Number of [ nonbond_params ] of the synthetic table")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions, the best one is reported")
+    parser.add_argument(
+        "--to_string",
+        action="store_true",
+        help="Also time the previous DataFrame.to_string based writer (slow, use a smaller --n_rows)",
+    )
+    args = parser.parse_args()
+
+    nonbond_params = make_synthetic_nonbond_params(args.n_rows)
+    writers = {"write_dataframe": lambda file, df: io.write_dataframe(file, df, io.LJ_FLOAT_FORMATS)}
+    if args.to_string:
+        writers["to_string"] = write_with_to_string
+
+    run_benchmark(nonbond_params, writers, args.repeat)
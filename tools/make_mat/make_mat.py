@@ -8,6 +8,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 from multiego.resources import type_definitions
 from multiego.util import masking
 from multiego import io
+from multiego import topology
 
 import argparse
 import multiprocessing
@@ -56,6 +57,12 @@ def write_mat(df, output_file):
     ordered_columns = ["molecule_name_ai", "ai", "molecule_name_aj", "aj", "distance", "probability", "cutoff", "learned"]
     df = df[ordered_columns]
 
+    if output_file.endswith(".mm"):
+        # Save the data as memory-mapped dense arrays
+        df["learned"] = df["learned"].astype(int)
+        io.write_dense_contact_matrix(output_file, df)
+        return
+
     # Save the data as HDF5 with compression
     df.to_hdf(output_file, key="data", mode="w", format="table", complib="blosc:lz4", complevel=9)
 
@@ -401,35 +408,16 @@ def warning_cutoff_histo(cutoff, max_adaptive_cutoff):
     )
 
 
-def generate_c12_values(df, types, combinations, molecule_type):
+def generate_c12_values(df, molecule_type):
     """
-    TODO
-    ----
-    Change symmetric to be a variable
+    Returns the N x N matrix of the c12 used to define the cutoffs: the combination rule
+    for all the pairs, replaced by the multi-eGO 1-4 rules (see topology.get_lj14_rule_pairs) for proteins.
     """
-    all_c12 = np.sqrt(df["c12"].to_numpy() * df["c12"].to_numpy()[:, np.newaxis])
-    c12_map = np.full(all_c12.shape, None)
-    resnums = df["resnum"].to_numpy()
+    c12_map = np.sqrt(df["c12"].to_numpy() * df["c12"].to_numpy()[:, np.newaxis])
 
     if molecule_type == "protein":
-        for combination in combinations:
-            (name_1, name_2, factor, constant, shift) = combination
-            # if factor is not None and constant is not None or factor == constant:
-            #    raise RuntimeError("constant and error should be defined and mutualy exclusive")
-            if factor is not None and constant is not None:
-                operation = lambda x: np.minimum(factor * x, constant)
-            elif factor is not None:
-                operation = lambda x: factor * x
-            elif constant is not None:
-                operation = lambda _: constant
-            else:
-                raise ValueError("Either factor or constant must be specified.")
-
-            combined_map = (types[name_1] & types[name_2][:, np.newaxis]) & (resnums + shift == resnums[:, np.newaxis])
-            combined_map = combined_map | combined_map.T
-            c12_map = np.where(combined_map, operation(all_c12), c12_map)
-
-    c12_map = np.where(c12_map == None, all_c12, c12_map)
+        ai, aj, c12 = topology.get_lj14_rule_pairs(df)
+        c12_map[np.concatenate([ai, aj]), np.concatenate([aj, ai])] = np.concatenate([c12, c12])
 
     return c12_map
 
@@ -606,33 +594,19 @@ def main_routine(mol_i, mol_j, topology_mego, topology_ref, molecules_name, pref
         d.update(d_appo)
 
     topology_df_j["c12"] = topology_df_j["mego_type"].map(d)
-    OO_mask = masking.create_matrix_mask(
-        topology_df_i["mego_type"].to_numpy(),
-        topology_df_j["mego_type"].to_numpy(),
-        [("OM", "OM"), ("O", "O"), ("OM", "O")],
-        symmetrize=True,
-    )
-    HH_mask = masking.create_matrix_mask(
-        topology_df_i["mego_type"].to_numpy(),
-        topology_df_j["mego_type"].to_numpy(),
-        [("H", "H")],
-        symmetrize=True,
-    )
-    NN_mask = masking.create_matrix_mask(
+    special_masks = masking.create_rule_masks(
         topology_df_i["mego_type"].to_numpy(),
         topology_df_j["mego_type"].to_numpy(),
-        [("NL", "NL"), ("NZ", "NZ"), ("NL", "NZ")],
-        symmetrize=True,
-    )
-    ON_mask = masking.create_matrix_mask(
-        topology_df_i["mego_type"].to_numpy(),
-        topology_df_j["mego_type"].to_numpy(),
-        [
-            ("O", "N"),
-            ("OM", "N"),
-        ],
+        {
+            "OO": [("OM", "OM"), ("O", "O"), ("OM", "O")],
+            "HH": [("H", "H")],
+            "NN": [("NL", "NL"), ("NZ", "NZ"), ("NL", "NZ")],
+            "ON": [("O", "N"), ("OM", "N")],
+        },
         symmetrize=True,
+        matrix=True,
     )
+    OO_mask, HH_mask, NN_mask, ON_mask = (special_masks[rule] for rule in ["OO", "HH", "NN", "ON"])
 
     if mat_type == "intra":
         first_aminoacid = topology_mego.residues[0].name
@@ -643,8 +617,6 @@ def main_routine(mol_i, mol_j, topology_mego, topology_ref, molecules_name, pref
         else:
             molecule_type = "other"
 
-        types = type_definitions.lj14_generator(topology_df_i)
-
         if molecule_type == "other":
             # read user pairs
             molecule_keys = list(topology_mego.molecules.keys())
@@ -661,7 +633,7 @@ def main_routine(mol_i, mol_j, topology_mego, topology_ref, molecules_name, pref
                 for ai, aj, c12 in user_pairs
             ]
 
-        c12_values = generate_c12_values(topology_df_i, types, type_definitions.atom_type_combinations, molecule_type)
+        c12_values = generate_c12_values(topology_df_i, molecule_type)
 
         # define all cutoff using combination rule values and OO_mask
         c12_cutoff = CUTOFF_FACTOR * np.power(np.where(OO_mask, type_definitions.mg_OO_c12_rep, c12_values), 1.0 / 12.0)
@@ -808,7 +780,8 @@ def main_routine(mol_i, mol_j, topology_mego, topology_ref, molecules_name, pref
     df.index = range(len(df.index))
 
     out_name = args.out_name + "_" if args.out_name else ""
-    output_file = f"{args.out}/{mat_type}mat_{out_name}{mol_i}_{mol_j}.ndx.h5"
+    output_extension = "mm" if args.mm else "h5"
+    output_file = f"{args.out}/{mat_type}mat_{out_name}{mol_i}_{mol_j}.ndx.{output_extension}"
     print(f"Saving output for molecule {mol_i} and {mol_j} in {output_file}")
     write_mat(df, output_file)
 
@@ -872,6 +845,11 @@ if __name__ == "__main__":
         action="store_true",
         help="Read from text file instead of hdf5",
     )
+    parser.add_argument(
+        "--mm",
+        action="store_true",
+        help="Write the output in the memory-mapped dense format (.ndx.mm) instead of hdf5",
+    )
     parser.add_argument(
         "--custom_c12",
         type=str,
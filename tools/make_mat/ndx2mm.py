@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+from multiego import io
+
+import argparse
+
+# Set up argument parser
+parser = argparse.ArgumentParser(description="Read a molecular contact matrix and save it in the memory-mapped dense format.")
+parser.add_argument(
+    "-i",
+    "--input_file",
+    required=True,
+    type=str,
+    help="Path to the input contact matrix file (e.g., 'intramat_1_1.ndx.gz' or 'intramat_1_1.ndx.h5')",
+)
+
+# Add an optional argument for output file name
+parser.add_argument(
+    "-o",
+    "--output_file",
+    type=str,
+    default=None,
+    help="Path to the output file (e.g., 'intramat_1_1.ndx.mm'). Defaults to input file name with the '.mm' extension.",
+)
+
+args = parser.parse_args()
+
+if args.output_file is None:
+    output_file = io.strip_gz_h5_suffix(args.input_file) + ".mm"
+else:
+    output_file = args.output_file
+
+contact_matrix = io.read_contact_matrix_file(args.input_file, args.input_file.endswith(".h5"))
+io.write_dense_contact_matrix(output_file, contact_matrix)
+
+print(f"Data successfully saved to {output_file}")